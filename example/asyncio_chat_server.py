@@ -0,0 +1,220 @@
+"""
+asyncio version of chat_server.py, drop-in compatible on the wire (chat_protocol.py)
+
+Every connection is an asyncio.Protocol: transport.write() does the output
+buffering and pause_writing()/resume_writing() take the place of the
+selector write interest. While a transport is over the high watermark,
+new messages go through the overflow policy:
+
+   drop-oldest  keep at most the low watermark of messages, flushed on resume
+   coalesce     skip messages, send one notice with the count on resume
+   disconnect   close the connection
+
+It runs on uvloop when it is installed.
+
+   $ python3 asyncio_chat_server.py -port 1234 -loop asyncio
+"""
+import argparse
+import asyncio
+import collections
+import signal
+
+import chat_protocol
+from chat_server import HIGH_WATERMARK, LOW_WATERMARK, OVERFLOW_POLICIES, SERVER_NUM_CONNECTIONS, Message, QueueStats
+
+try:
+   import uvloop
+except ImportError:
+   uvloop = None
+
+
+class ChatProtocol(asyncio.Protocol):
+
+   def __init__(self, server):
+       self._server = server
+       self._reader = chat_protocol.FrameReader()
+       self._backlog = collections.deque()  # frames held back while writing is paused
+       self._backlog_bytes = 0
+       self.transport = None
+       self.rooms = set()
+       self.paused = False
+       self.stats = None
+
+   def connection_made(self, transport):
+       self.transport = transport
+       self.stats = QueueStats(transport.get_extra_info('peername'))
+       transport.set_write_buffer_limits(high=self._server.high_watermark, low=self._server.low_watermark)
+       print(f'{self.stats.peer} hello!')
+       self._server.add_connection(self)
+
+   def connection_lost(self, exc):
+       print(f'{self.stats.peer} bye bye!')
+       self._server.remove_connection(self)
+
+   def data_received(self, data):
+       self._reader.feed(data)
+       try:
+           frames = self._reader.frames()
+       except chat_protocol.FrameError as e:
+           print('Error occurred', e)
+           self.transport.close()
+           return
+       # a single read may complete any number of messages
+       for raw_msg in frames:
+           self._server.add_message(self, raw_msg)
+           if self.transport.is_closing():
+               return
+
+   def pause_writing(self):
+       self.paused = True
+       self.stats.max_queued_bytes = max(self.stats.max_queued_bytes, self.queued_bytes())
+
+   def resume_writing(self):
+       self.paused = False
+       if self.stats.skipped:
+           self.transport.write(self._server.coalesce_notice(self.stats))
+       if self._backlog:
+           self.transport.writelines(self._backlog)
+           self._backlog.clear()
+           self._backlog_bytes = 0
+
+   def queued_bytes(self):
+       return self.transport.get_write_buffer_size() + self._backlog_bytes
+
+   def send(self, frame):
+       """Queue ``frame``, returns False if the connection must be closed"""
+       if not self.paused:
+           self.transport.write(frame)
+           return True
+       policy = self._server.policy
+       if policy == 'disconnect':
+           return False
+       if policy == 'coalesce':
+           self.stats.skipped += 1
+           self.stats.dropped += 1
+           return True
+       # drop-oldest
+       self._backlog.append(frame)
+       self._backlog_bytes += len(frame)
+       while self._backlog and self._backlog_bytes > self._server.low_watermark:
+           self._backlog_bytes -= len(self._backlog.popleft())
+           self.stats.dropped += 1
+       self.stats.max_queued_bytes = max(self.stats.max_queued_bytes, self.queued_bytes())
+       return True
+
+
+class ChatServer:
+
+   def __init__(self, **kwargs):
+       self._connections = set()
+       self._rooms = collections.defaultdict(set)  # room -> subscribed protocols
+       self._host = kwargs['host']
+       self._port = kwargs['port']
+       self.high_watermark = kwargs.get('high_watermark') or HIGH_WATERMARK
+       self.low_watermark = kwargs.get('low_watermark') or min(LOW_WATERMARK, self.high_watermark)
+       self.policy = kwargs.get('policy') or OVERFLOW_POLICIES[0]
+       if self.low_watermark > self.high_watermark:
+           raise ValueError('low watermark is above the high watermark')
+       if self.policy not in OVERFLOW_POLICIES:
+           raise ValueError(f'unknown overflow policy {self.policy}')
+
+   def add_connection(self, protocol):
+       self._connections.add(protocol)
+       self._join(protocol, chat_protocol.DEFAULT_ROOM)
+
+   def remove_connection(self, protocol):
+       self._connections.discard(protocol)
+       for room in protocol.rooms:
+           self._leave_room(protocol, room)
+       protocol.rooms.clear()
+
+   def _join(self, protocol, room):
+       protocol.rooms.add(room)
+       self._rooms[room].add(protocol)
+
+   def _leave(self, protocol, room):
+       protocol.rooms.discard(room)
+       self._leave_room(protocol, room)
+
+   def _leave_room(self, protocol, room):
+       subscribers = self._rooms.get(room)
+       if subscribers is not None:
+           subscribers.discard(protocol)
+           if not subscribers:
+               del self._rooms[room]
+
+   def add_message(self, sender, raw_msg):
+       try:
+           msg = chat_protocol.decode(raw_msg)
+       except chat_protocol.MessageError as e:
+           print(f"We got unknown type of message: {raw_msg}; error: {e}")
+           self._send_notice(sender, f'invalid message: {e}')
+           return
+       if 'join' in msg:
+           self._join(sender, str(msg['join']))
+           return
+       if 'leave' in msg:
+           self._leave(sender, str(msg['leave']))
+           return
+       message = Message(msg['user'], msg['text'], msg['room'])
+       print(f"{sender.stats.peer}: [{message.room}] [{msg['user']}] {msg['text']}")
+
+       if message.room not in sender.rooms:
+           print(f"{sender.stats.peer} is not in room {message.room}")
+           return
+
+       # encode once, every transport gets the same immutable frame
+       frame = chat_protocol.encode(message._asdict())
+       overflowed = [protocol for protocol in self._rooms[message.room] if not protocol.send(frame)]
+       for protocol in overflowed:
+           print(f'{protocol.stats}, disconnecting slow consumer')
+           protocol.transport.abort()
+
+   def _send_notice(self, protocol, text):
+       """Queue a message from the server for ``protocol`` alone"""
+       if not protocol.send(chat_protocol.notice(text)):
+           print(f'{protocol.stats}, disconnecting slow consumer')
+           protocol.transport.abort()
+
+   def coalesce_notice(self, stats):
+       notice = chat_protocol.notice(f'{stats.skipped} messages skipped, you are lagging behind')
+       stats.skipped = 0
+       return notice
+
+   def stats(self):
+       """Outbound queue counters of every connection, most backlogged first"""
+       for protocol in self._connections:
+           protocol.stats.queued_bytes = protocol.queued_bytes()
+       return sorted((p.stats for p in self._connections), key=lambda stats: stats.queued_bytes, reverse=True)
+
+   def _print_stats(self):
+       for stats in self.stats():
+           print(stats)
+
+   async def serve(self):
+       loop = asyncio.get_running_loop()
+       # kill -USR1 <pid> prints who is lagging
+       if hasattr(signal, 'SIGUSR1'):
+           loop.add_signal_handler(signal.SIGUSR1, self._print_stats)
+       server = await loop.create_server(lambda: ChatProtocol(self), self._host, self._port,
+                                         backlog=SERVER_NUM_CONNECTIONS)
+       async with server:
+           await server.serve_forever()
+
+
+if __name__ == '__main__':
+   parser = argparse.ArgumentParser(description='asyncio chat server arguments.')
+   parser.add_argument('-host', nargs='?', default='localhost')
+   parser.add_argument('-port', nargs='?', type=int, default=1234)
+   parser.add_argument('-high_watermark', type=int, default=HIGH_WATERMARK, help='per connection queue limit in bytes')
+   parser.add_argument('-low_watermark', type=int, default=LOW_WATERMARK, help='queue size to drain to in bytes')
+   parser.add_argument('-policy', choices=OVERFLOW_POLICIES, default=OVERFLOW_POLICIES[0])
+   parser.add_argument('-loop', choices=('asyncio', 'uvloop'), default='uvloop' if uvloop else 'asyncio')
+   args = parser.parse_args()
+
+   if args.loop == 'uvloop':
+       if uvloop is None:
+           parser.error('uvloop is not installed')
+       uvloop.install()
+   chat = ChatServer(**vars(args))
+   asyncio.run(chat.serve())
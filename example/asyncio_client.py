@@ -1,107 +1,182 @@
 #!/usr/bin/env python3
 
 # copy and modified from https://gist.github.com/dbehnke/9627160
+import argparse
 import asyncio
+import itertools
 import logging
+import time
 
 log = logging.getLogger(__name__)
 
-clients = {}  # task -> (reader, writer)
+TIMEOUT = 10.0
 
+echostrings = ['one', 'two', 'three', 'four', 'five', 'six']
 
-def make_connection(host, port):
 
-    task = asyncio.Task(handle_client(host, port))
+async def readline(client_reader):
+    # give the server a chance to respond, timeout after 10 seconds
+    data = await asyncio.wait_for(client_reader.readline(), timeout=TIMEOUT)
+    return data.decode().rstrip() if data else None
 
-    clients[task] = (host, port)
 
-    def client_done(task):
-        del clients[task]
-        log.info("Client Task Finished")
-        if len(clients) == 0:
-            log.info("clients is empty, stopping loop.")
-            loop = asyncio.get_event_loop()
-            loop.stop()
+async def handshake(client_reader, client_writer):
+    # looking for a hello
+    sdata = await readline(client_reader)
+    if sdata is None:
+        log.warning("Expected HELLO, received None")
+        return False
 
-    log.info("New Client Task")
-    task.add_done_callback(client_done)
+    sdata = sdata.upper()
+    log.info("Received %s", sdata)
+    if sdata != "HELLO":
+        log.warning("Expected HELLO, received '%s'", sdata)
+        return False
 
+    # send back a WORLD
+    client_writer.write("WORLD\n".encode())
 
-@asyncio.coroutine
-def handle_client(host, port):
-    log.info("Connecting to %s %d", host, port)
-    client_reader, client_writer = yield from asyncio.open_connection(host,
-                                                                      port)
-    log.info("Connected to %s %d", host, port)
-    try:
-        # looking for a hello
-        # give client a chance to respond, timeout after 10 seconds
-        data = yield from asyncio.wait_for(client_reader.readline(),
-                                           timeout=10.0)
-
-        if data is None:
-            log.warning("Expected HELLO, received None")
-            return
-
-        sdata = data.decode().rstrip().upper()
-        log.info("Received %s", sdata)
-        if sdata != "HELLO":
-            log.warning("Expected HELLO, received '%s'", sdata)
-            return
-
-        # send back a WORLD
-        client_writer.write("WORLD\n".encode())
+    # wait for a READY
+    sdata = await readline(client_reader)
+    if sdata is None:
+        log.warning("Expected READY, received None")
+        return False
 
-        # wait for a READY
-        data = yield from asyncio.wait_for(client_reader.readline(),
-                                           timeout=10.0)
+    if sdata.upper() != "READY":
+        log.warning("Expected READY, received '%s'", sdata)
+        return False
+    return True
 
-        if data is None:
-            log.warning("Expected READY, received None")
-            return
 
-        sdata = data.decode().rstrip().upper()
-        if sdata != "READY":
-            log.warning("Expected READY, received '%s'", sdata)
+async def handle_client(host, port):
+    log.info("Connecting to %s %d", host, port)
+    client_reader, client_writer = await asyncio.open_connection(host, port)
+    log.info("Connected to %s %d", host, port)
+    try:
+        if not await handshake(client_reader, client_writer):
             return
 
-        echostrings = ['one', 'two', 'three', 'four', 'five', 'six']
-
         for echostring in echostrings:
             # send each string and get a reply, it should be an echo back
             client_writer.write(("%s\n" % echostring).encode())
-            data = yield from asyncio.wait_for(client_reader.readline(),
-                                               timeout=10.0)
-            if data is None:
+            sdata = await readline(client_reader)
+            if sdata is None:
                 log.warning("Echo received None")
                 return
 
-            sdata = data.decode().rstrip()
             log.info(sdata)
 
         # send BYE to disconnect gracefully
         client_writer.write("BYE\n".encode())
 
         # receive BYE confirmation
-        data = yield from asyncio.wait_for(client_reader.readline(),
-                                           timeout=10.0)
-
-        sdata = data.decode().rstrip().upper()
+        sdata = await readline(client_reader)
         log.info("Received '%s'" % sdata)
     finally:
         log.info("Disconnecting from %s %d", host, port)
         client_writer.close()
+        await client_writer.wait_closed()
         log.info("Disconnected from %s %d", host, port)
 
 
-def main():
+async def pipeline_client(host, port, messages, window):
+    """Keep up to ``window`` echo requests in flight, returns their round trip times
+
+    Replies are matched to requests by the ECHO sequence number, which the
+    server counts from 1 for the first line after READY.
+    """
+    client_reader, client_writer = await asyncio.open_connection(host, port)
+    latencies = []
+    try:
+        if not await handshake(client_reader, client_writer):
+            raise ConnectionError("handshake failed")
+        sent_at = {}  # sequence -> send time
+        credit = asyncio.Semaphore(window)
+
+        async def receive():
+            # plain readline, a wait_for per reply would cost a task per message
+            for i in range(messages):
+                data = await client_reader.readline()
+                if not data.startswith(b"ECHO "):
+                    raise ConnectionError("Echo received %r" % data)
+                sequence = int(data[5:data.index(b":")])
+                latencies.append(time.perf_counter() - sent_at.pop(sequence))
+                credit.release()
+
+        async def send():
+            words = itertools.cycle(echostrings)
+            for sequence in range(1, messages + 1):
+                await credit.acquire()
+                sent_at[sequence] = time.perf_counter()
+                client_writer.write(("%s\n" % next(words)).encode())
+                await client_writer.drain()
+
+        # only the receiver releases credit, the sender must not outlive it
+        receiver = asyncio.ensure_future(receive())
+        sender = asyncio.ensure_future(send())
+        try:
+            done, pending = await asyncio.wait([sender, receiver], return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+            if pending:
+                await receiver
+        finally:
+            sender.cancel()
+            receiver.cancel()
+        client_writer.write("BYE\n".encode())
+        await readline(client_reader)
+    finally:
+        client_writer.close()
+    return latencies
+
+
+async def run_pipelined(host, port, clients, messages, windows):
+    """Throughput and latency per window size: with a window of 1 every
+    message pays a full round trip, the gain from larger windows shows how
+    much of that is RTT rather than server processing"""
+    print("%8s %12s %10s %10s %8s" % ("window", "messages/s", "p50 ms", "p99 ms", "failed"))
+    for window in windows:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(pipeline_client(host, port, messages, window) for x in range(clients)),
+                                       return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        failed = [result for result in results if isinstance(result, BaseException)]
+        for result in failed[:1]:
+            log.warning("Client failed: %r", result)
+        latencies = sorted(itertools.chain.from_iterable(
+            result for result in results if not isinstance(result, BaseException)))
+        if latencies:
+            print("%8d %12.0f %10.3f %10.3f %8d" % (
+                window, len(latencies) / elapsed,
+                latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000, len(failed)))
+        else:
+            print("%8d %12s %10s %10s %8d" % (window, "-", "-", "-", len(failed)))
+
+
+async def run_clients(host, port, clients):
     log.info("MAIN begin")
-    loop = asyncio.get_event_loop()
-    for x in range(200):
-        make_connection('localhost', 2991)
-    loop.run_forever()
+    results = await asyncio.gather(*(handle_client(host, port) for x in range(clients)),
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            log.warning("Client failed: %r", result)
     log.info("MAIN end")
 
+
+def main():
+    parser = argparse.ArgumentParser(description="asyncio echo client")
+    parser.add_argument("-host", default="localhost")
+    parser.add_argument("-port", type=int, default=2991)
+    parser.add_argument("-clients", type=int, default=200)
+    parser.add_argument("-window", type=int, nargs="+",
+                        help="pipelined mode, requests in flight per connection (one run per value)")
+    parser.add_argument("-messages", type=int, default=10000, help="messages per connection in pipelined mode")
+    args = parser.parse_args()
+    if args.window:
+        asyncio.run(run_pipelined(args.host, args.port, args.clients, args.messages, args.window))
+    else:
+        asyncio.run(run_clients(args.host, args.port, args.clients))
+
 if __name__ == '__main__':
     log = logging.getLogger("")
     formatter = logging.Formatter("%(asctime)s %(levelname)s " +
@@ -113,4 +188,4 @@ if __name__ == '__main__':
 
     ch.setFormatter(formatter)
     log.addHandler(ch)
-    main()
\ No newline at end of file
+    main()
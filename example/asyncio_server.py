@@ -1,73 +1,225 @@
 #!/usr/bin/env python3
 
 # copy and modified from https://gist.github.com/dbehnke/9627160
+import argparse
 import asyncio
 import logging
+import signal
 
 log = logging.getLogger(__name__)
 
-clients = {}  # task -> (reader, writer)
-
-
-def accept_client(client_reader, client_writer):
-    task = asyncio.Task(handle_client(client_reader, client_writer))
-    clients[task] = (client_reader, client_writer)
-
-    def client_done(task):
-        del clients[task]
-        client_writer.close()
-        log.info("End Connection")
-
-    log.info("New Connection")
-    task.add_done_callback(client_done)
-
-
-@asyncio.coroutine
-def handle_client(client_reader, client_writer):
-    # send a hello to let the client know they are connected
-    client_writer.write("HELLO\n".encode())
-
-    # give client a chance to respond, timeout after 10 seconds
-    data = yield from asyncio.wait_for(client_reader.readline(),
-                                       timeout=10.0)
-
-    if data is None:
-        log.warning("Expected WORLD, received None")
-        return
-
-    sdata = data.decode().rstrip()
-    log.info("Received %s", sdata)
-    if sdata != "WORLD":
-        log.warning("Expected WORLD, received '%s'", sdata)
-        return
-
-    # now be an echo back server until client sends a bye
-    i = 0  # sequence number
-    # let client know we are ready
-    client_writer.write("READY\n".encode())
-    while True:
-        i = i + 1
-        # wait for input from client
-        data = yield from asyncio.wait_for(client_reader.readline(),
-                                           timeout=10.0)
-        if data is None:
-            log.warning("Received no data")
-            # exit echo loop and disconnect
-            return
-
-        sdata = data.decode().rstrip()
-        if sdata.upper() == 'BYE':
-            client_writer.write("BYE\n".encode())
-            break
-        response = ("ECHO %d: %s\n" % (i, sdata))
-        client_writer.write(response.encode())
+MAX_CONNECTIONS = 1000
+IDLE_TIMEOUT = 10.0  # seconds without a line before a client is disconnected
+DRAIN_TIMEOUT = 5.0  # seconds sessions get to finish on shutdown
+READ_SIZE = 64 * 1024
+MAX_LINE = 64 * 1024  # same as the StreamReader default limit
+
+
+class IdleTimer:
+    """Calls ``callback`` once touch() has not been called for ``timeout`` seconds
+
+    A single call_later handle per connection: touch() only records the
+    time and the handle re-arms itself for the remainder when it fires
+    early, instead of a wait_for task or a new handle for every line.
+    """
+
+    def __init__(self, timeout, callback):
+        self._loop = asyncio.get_running_loop()
+        self._timeout = timeout
+        self._callback = callback
+        self._last = self._loop.time()
+        self._handle = self._loop.call_later(timeout, self._expire)
+
+    def touch(self):
+        self._last = self._loop.time()
+
+    def cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _expire(self):
+        remaining = self._last + self._timeout - self._loop.time()
+        if remaining > 0:
+            self._handle = self._loop.call_later(remaining, self._expire)
+        else:
+            self._handle = None
+            self._callback()
+
+
+class Session:
+    """One client connection
+
+    Input is read in chunks and every complete line in the buffer is
+    returned at once; replies are collected by send() and written with
+    one write per batch by flush().
+    """
+
+    def __init__(self, reader, writer, idle_timeout):
+        self.reader = reader
+        self.writer = writer
+        self.sequence = 0  # number of lines received since READY
+        self.done = False
+        self.waiting = False  # for the client to send more
+        self.timer = IdleTimer(idle_timeout, self._idle)
+        self._input = bytearray()
+        self._output = bytearray()
+
+    def _idle(self):
+        log.warning("Idle timeout, disconnecting")
+        self.writer.close()
+
+    async def readlines(self):
+        """every complete line received so far without line endings, waits
+        for at least one, None once the client is gone"""
+        while True:
+            end = self._input.rfind(b"\n")
+            if end >= 0:
+                lines = self._input[:end].decode().split("\n")
+                del self._input[:end + 1]
+                self.timer.touch()
+                return [line.rstrip() for line in lines]
+            if len(self._input) > MAX_LINE:
+                log.warning("Line longer than %d bytes", MAX_LINE)
+                return None
+            self.waiting = True
+            try:
+                data = await self.reader.read(READ_SIZE)
+            except ConnectionError:
+                return None
+            finally:
+                self.waiting = False
+            if not data:
+                return None
+            self._input += data
+
+    def send(self, line):
+        self._output += ("%s\n" % line).encode()
+
+    def bye(self):
+        self.send("BYE")
+        self.done = True
+
+    async def flush(self):
+        if self._output:
+            # the transport may keep a view of what it could not send yet,
+            # so it gets this buffer and replies go to a fresh one
+            self.writer.write(self._output)
+            self._output = bytearray()
+        await self.writer.drain()
+
+
+class EchoServer:
+
+    def __init__(self, host=None, port=2991, max_connections=MAX_CONNECTIONS,
+                 idle_timeout=IDLE_TIMEOUT, drain_timeout=DRAIN_TIMEOUT):
+        self._host = host
+        self._port = port
+        self._idle_timeout = idle_timeout
+        self._drain_timeout = drain_timeout
+        self._connections = asyncio.Semaphore(max_connections)
+        self._tasks = set()
+        self._sessions = set()
+        self._closing = False
+
+    async def accept_client(self, client_reader, client_writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        log.info("New Connection")
+        try:
+            # over the limit, connections wait here before getting their HELLO
+            async with self._connections:
+                if not self._closing:
+                    await self.handle_client(client_reader, client_writer)
+        finally:
+            self._tasks.discard(task)
+            client_writer.close()
+            log.info("End Connection")
+
+    async def handle_client(self, client_reader, client_writer):
+        session = Session(client_reader, client_writer, self._idle_timeout)
+        self._sessions.add(session)
+        try:
+            # send a hello to let the client know they are connected
+            session.send("HELLO")
+            await session.flush()
+
+            # give client a chance to respond, the idle timer disconnects it otherwise
+            lines = await session.readlines()
+            if lines is None:
+                log.warning("Expected WORLD, received None")
+                return
+            sdata = lines.pop(0)
+            log.info("Received %s", sdata)
+            if sdata != "WORLD":
+                log.warning("Expected WORLD, received '%s'", sdata)
+                return
+
+            # let client know we are ready
+            session.send("READY")
+            # now be an echo back server until client sends a bye, answer
+            # every buffered line with one write and wait for the transport to drain
+            while True:
+                for sdata in lines:
+                    session.sequence += 1
+                    if sdata.upper() == "BYE":
+                        session.bye()
+                        break
+                    session.send("ECHO %d: %s" % (session.sequence, sdata))
+                if self._closing and not session.done:
+                    session.bye()
+                await session.flush()
+                if session.done:
+                    break
+                lines = await session.readlines()
+                if lines is None:
+                    if not session.done:  # said BYE while waiting on shutdown
+                        log.warning("Received no data")
+                    return
+        finally:
+            self._sessions.discard(session)
+            session.timer.cancel()
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+
+        server = await asyncio.start_server(self.accept_client, host=self._host, port=self._port)
+        log.info("Serving on %s", ", ".join(str(sock.getsockname()) for sock in server.sockets))
+        await stop.wait()
+        await self.shutdown(server)
+
+    async def shutdown(self, server):
+        """graceful drain: stop accepting, say BYE to sessions waiting for
+        input right away and to the others once they finish their current
+        lines, cancel whatever is left after the drain timeout"""
+        log.info("Shutting down, draining %d connections", len(self._tasks))
+        self._closing = True
+        server.close()
+        for session in self._sessions:
+            if session.waiting:
+                session.done = True
+                session.writer.write(b"BYE\n")
+                session.writer.close()  # ends the pending read
+        if self._tasks:
+            done, pending = await asyncio.wait(self._tasks, timeout=self._drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await server.wait_closed()
 
 
 def main():
-    loop = asyncio.get_event_loop()
-    f = asyncio.start_server(accept_client, host=None, port=2991)
-    loop.run_until_complete(f)
-    loop.run_forever()
+    parser = argparse.ArgumentParser(description="asyncio echo server")
+    parser.add_argument("-host", default=None)
+    parser.add_argument("-port", type=int, default=2991)
+    parser.add_argument("-max_connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("-idle_timeout", type=float, default=IDLE_TIMEOUT)
+    parser.add_argument("-drain_timeout", type=float, default=DRAIN_TIMEOUT)
+    args = parser.parse_args()
+    asyncio.run(EchoServer(**vars(args)).serve())
 
 if __name__ == '__main__':
     log = logging.getLogger("")
@@ -80,4 +232,4 @@ if __name__ == '__main__':
 
     ch.setFormatter(formatter)
     log.addHandler(ch)
-    main()
\ No newline at end of file
+    main()
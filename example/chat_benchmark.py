@@ -0,0 +1,143 @@
+"""
+Fan-out benchmark of chat_server.py (selectors) against asyncio_chat_server.py
+
+N clients connect to the lobby, the first one sends messages stamped with
+time.perf_counter() and every client records how long each delivery took.
+Reports delivered messages/s and the p50/p99 fan-out latency.
+
+   $ python3 chat_benchmark.py -clients 1000 10000 -messages 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import chat_protocol
+
+SERVERS = {
+   'selectors': ['chat_server.py'],
+   'asyncio': ['asyncio_chat_server.py', '-loop', 'asyncio'],
+   'uvloop': ['asyncio_chat_server.py', '-loop', 'uvloop'],
+}
+CONNECT_CONCURRENCY = 500
+
+
+class BenchmarkClient(asyncio.Protocol):
+
+   def __init__(self, run):
+       self._run = run
+       self._reader = chat_protocol.FrameReader()
+       self.transport = None
+
+   def connection_made(self, transport):
+       self.transport = transport
+
+   def data_received(self, data):
+       now = time.perf_counter()
+       self._reader.feed(data)
+       for raw_msg in self._reader.frames():
+           text = json.loads(raw_msg)['text']
+           self._run.delivered(now - float(text[:text.index(' ')]))
+
+
+class BenchmarkRun:
+
+   def __init__(self, expected):
+       self.latencies = []
+       self._expected = expected
+       self.done = asyncio.get_running_loop().create_future()
+
+   def delivered(self, latency):
+       self.latencies.append(latency)
+       if len(self.latencies) == self._expected and not self.done.done():
+           self.done.set_result(time.perf_counter())
+
+
+def free_port():
+   with socket.socket() as sock:
+       sock.bind(('localhost', 0))
+       return sock.getsockname()[1]
+
+
+def percentile(ordered, p):
+   return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else float('nan')
+
+
+async def connect(port, run, clients):
+   loop = asyncio.get_running_loop()
+   semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+   async def one():
+       async with semaphore:
+           transport, protocol = await loop.create_connection(lambda: BenchmarkClient(run), 'localhost', port)
+           return protocol
+
+   for attempt in range(50):  # wait for the server to listen
+       try:
+           first = await one()
+           break
+       except ConnectionRefusedError:
+           await asyncio.sleep(0.1)
+   else:
+       raise RuntimeError(f'server did not start on port {port}')
+   return [first] + list(await asyncio.gather(*(one() for i in range(clients - 1))))
+
+
+async def bench(port, clients, messages, size, rate, timeout):
+   run = BenchmarkRun(clients * messages)
+   protocols = await connect(port, run, clients)
+   await asyncio.sleep(0.5)  # let the server finish registering everyone
+   padding = 'x' * size
+   start = time.perf_counter()
+   for i in range(messages):
+       text = f'{time.perf_counter()!r} {padding}'
+       protocols[0].transport.write(chat_protocol.encode({'user': 'bench', 'text': text}))
+       await asyncio.sleep(1 / rate)
+   try:
+       end = await asyncio.wait_for(run.done, timeout)
+   except asyncio.TimeoutError:
+       end = time.perf_counter()
+   for protocol in protocols:
+       protocol.transport.abort()
+   latencies = sorted(run.latencies)
+   return {
+       'delivered': len(latencies),
+       'lost': clients * messages - len(latencies),
+       'messages/s': len(latencies) / (end - start),
+       'p50 ms': percentile(latencies, 0.5) * 1000,
+       'p99 ms': percentile(latencies, 0.99) * 1000,
+   }
+
+
+def main():
+   parser = argparse.ArgumentParser(description='Chat server fan-out benchmark')
+   parser.add_argument('-servers', nargs='+', choices=SERVERS, default=['selectors', 'asyncio'])
+   parser.add_argument('-clients', nargs='+', type=int, default=[1000, 10000])
+   parser.add_argument('-messages', type=int, default=20, help='messages sent per run')
+   parser.add_argument('-size', type=int, default=100, help='message payload bytes')
+   parser.add_argument('-rate', type=float, default=50, help='messages sent per second')
+   parser.add_argument('-timeout', type=float, default=60, help='seconds to wait for every delivery')
+   args = parser.parse_args()
+
+   here = os.path.dirname(os.path.abspath(__file__))
+   print(f"{'server':<12}{'clients':>8}{'messages/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'lost':>8}")
+   for clients in args.clients:
+       for name in args.servers:
+           port = free_port()
+           command = [sys.executable, os.path.join(here, SERVERS[name][0])] + SERVERS[name][1:] + ['-port', str(port)]
+           server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+           try:
+               result = asyncio.run(bench(port, clients, args.messages, args.size, args.rate, args.timeout))
+           finally:
+               server.terminate()
+               server.wait()
+           print(f"{name:<12}{clients:>8}{result['messages/s']:>12.0f}"
+                 f"{result['p50 ms']:>10.2f}{result['p99 ms']:>10.2f}{result['lost']:>8}")
+
+
+if __name__ == '__main__':
+   main()
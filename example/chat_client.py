@@ -5,10 +5,10 @@ import selectors
 import socket
 import sys
 
+import chat_protocol
 
-BUFFER_SIZE = 1000
 
-Message = collections.namedtuple('Message', ['user', 'text'])
+Message = collections.namedtuple('Message', ['user', 'text', 'room'], defaults=[chat_protocol.DEFAULT_ROOM])
 
 
 class ChatClient:
@@ -16,22 +16,61 @@ class ChatClient:
    def __init__(self, **kwargs):
        self._selector = selectors.DefaultSelector()
        self._sock = None
+       self._reader = chat_protocol.FrameReader()
+       self._outgoing = bytearray()
        self._host = kwargs['host']
        self._port = kwargs['port']
        self._name = kwargs['username'] or input('Enter username:')
+       self._room = chat_protocol.DEFAULT_ROOM
        self._running = True
 
    def _read_stdin(self, input, mask):
        data = sys.stdin.readline().strip()
-       if data:
-           msg = json.dumps({'user': self._name, 'text': data}, ensure_ascii=False).encode('utf8')
-           self._sock.send(msg) # We should wait for selector here, but it will work.
+       # "/join <room>" switches the room messages are sent to, "/leave <room>" unsubscribes
+       command, _, room = data.partition(' ')
+       if command == '/join' and room:
+           self._room = room
+           self._send({'join': room})
+       elif command == '/leave' and room:
+           if room == self._room:
+               self._room = chat_protocol.DEFAULT_ROOM
+           self._send({'leave': room})
+       elif data:
+           self._send({'user': self._name, 'text': data, 'room': self._room})
+
+   def _send(self, message):
+       if not self._outgoing:
+           self._selector.modify(self._sock, selectors.EVENT_READ | selectors.EVENT_WRITE, self._read_write)
+       self._outgoing += chat_protocol.encode(message)
+
+   def _read_write(self, conn, mask):
+       if mask & selectors.EVENT_READ:
+           self._read_msg(conn, mask)
+       if mask & selectors.EVENT_WRITE and self._running:
+           self._write_msg(conn, mask)
+
+   def _write_msg(self, conn, mask):
+       sent = conn.send(self._outgoing)
+       del self._outgoing[:sent]
+       if not self._outgoing:
+           self._selector.modify(conn, selectors.EVENT_READ, self._read_msg)
 
    def _read_msg(self, conn, mask):
-       data = conn.recv(BUFFER_SIZE)  # Should be ready
-       if data:
-           print(data.decode("utf-8"))
-       else:
+       try:
+           received = self._reader.recv_from(conn)  # Should be ready
+           frames = self._reader.frames()
+       except BlockingIOError:
+           return
+       except (ConnectionError, chat_protocol.FrameError):
+           received, frames = 0, ()
+       for raw_msg in frames:
+           try:
+               msg = Message(**json.loads(raw_msg))
+           except (ValueError, TypeError) as e:
+               print(f"We got unknown type of message: {raw_msg}; error: {e}")
+               continue
+           print(f'[{msg.room}] [{msg.user}] {msg.text}')
+       if not received:
            print('Connection to server has failed')
            self._running = False
 
@@ -52,7 +91,7 @@ class ChatClient:
 
 parser = argparse.ArgumentParser(description='Chat client arguments.')
 parser.add_argument('-host', nargs='?', default='localhost')
-parser.add_argument('-port', nargs='?', default=1234)
+parser.add_argument('-port', nargs='?', type=int, default=1234)
 parser.add_argument('-username', nargs='?')
 args = parser.parse_args()
 
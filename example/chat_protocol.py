@@ -0,0 +1,119 @@
+"""
+Wire protocol shared by chat_server.py and chat_client.py
+
+Every message is a 4-byte big-endian length followed by that many bytes of
+UTF-8 JSON, so messages survive TCP segments being coalesced or split.
+
+   {"user": ..., "text": ..., "room": ...}   chat message, room defaults to DEFAULT_ROOM
+   {"join": room} / {"leave": room}         client subscriptions, every
+                                            connection starts in DEFAULT_ROOM
+
+Messages from the server itself come from user "server" in room "*".
+"""
+import json
+import struct
+
+HEADER = struct.Struct('!I')
+BUFFER_SIZE = 64 * 1024
+MAX_MESSAGE_SIZE = 1024 * 1024
+DEFAULT_ROOM = 'lobby'
+
+
+class FrameError(ValueError):
+   pass
+
+
+class MessageError(ValueError):
+   pass
+
+
+def encode(message):
+   payload = json.dumps(message, ensure_ascii=False).encode('utf-8')
+   return HEADER.pack(len(payload)) + payload
+
+
+def notice(text):
+   """Frame of a message from the server itself"""
+   return encode({'user': 'server', 'text': text, 'room': '*'})
+
+
+def decode(payload):
+   """Parse and check the payload of a client frame.
+
+   Returns the JSON object of a join, a leave or a chat message, the room of
+   a chat message filled in with DEFAULT_ROOM. Raises MessageError with the
+   reason the servers send back in their notice.
+   """
+   try:
+       msg = json.loads(payload)
+   except (json.JSONDecodeError, UnicodeDecodeError) as e:
+       raise MessageError(e) from e
+   if not isinstance(msg, dict):
+       raise MessageError(f'expected an object, not {type(msg).__name__}')
+   if 'join' in msg or 'leave' in msg:
+       return msg
+   for key in ('user', 'text'):
+       if key not in msg:
+           raise MessageError(f'{key} is missing')
+   room = msg.setdefault('room', DEFAULT_ROOM)
+   if not isinstance(room, str):
+       raise MessageError(f'room must be a string, not {type(room).__name__}')
+   return msg
+
+
+class FrameReader:
+   """Incremental receive buffer of one connection.
+
+   recv_from() receives straight into a bytearray and frames() cuts the
+   complete frames out of it, so one readable event can yield many
+   messages and a message can span many events.
+   """
+
+   def __init__(self, size=BUFFER_SIZE, max_size=MAX_MESSAGE_SIZE):
+       self._buffer = bytearray(size)
+       self._start = 0
+       self._end = 0
+       self._max_size = max_size
+
+   def _reserve(self, size):
+       # make room for ``size`` more bytes after the unread data
+       if self._end + size <= len(self._buffer):
+           return
+       pending = self._end - self._start
+       if self._start:
+           self._buffer[:pending] = self._buffer[self._start:self._end]
+           self._start, self._end = 0, pending
+       if pending + size > len(self._buffer):
+           self._buffer.extend(bytes(pending + size - len(self._buffer)))
+
+   def recv_from(self, sock):
+       """Receive what is available from ``sock``, returns the byte count."""
+       if self._end == len(self._buffer):
+           self._reserve(BUFFER_SIZE)
+       with memoryview(self._buffer) as view, view[self._end:] as free:
+           received = sock.recv_into(free)
+       self._end += received
+       return received
+
+   def feed(self, data):
+       self._reserve(len(data))
+       self._buffer[self._end:self._end + len(data)] = data
+       self._end += len(data)
+
+   def frames(self):
+       """Return the payloads of every complete frame received so far."""
+       frames = []
+       buffer = self._buffer
+       while self._end - self._start >= HEADER.size:
+           length = HEADER.unpack_from(buffer, self._start)[0]
+           if length > self._max_size:
+               raise FrameError(f'message of {length} bytes exceeds {self._max_size}')
+           end = self._start + HEADER.size + length
+           if end > self._end:
+               self._reserve(end - self._end)
+               break
+           frames.append(bytes(buffer[self._start + HEADER.size:end]))
+           self._start = end
+       if self._start == self._end:
+           self._start = self._end = 0
+       return frames
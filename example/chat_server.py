@@ -1,14 +1,50 @@
 import argparse
 import collections
-import json
+import itertools
+import os
 import selectors
+import signal
 import socket
+import struct
+import sys
+
+import chat_protocol
 
 
 SERVER_NUM_CONNECTIONS = 1000
-BUFFER_SIZE = 1000
+SENDMSG_MAX_BUFFERS = 64  # well below IOV_MAX
+HIGH_WATERMARK = 1024 * 1024
+LOW_WATERMARK = 256 * 1024
+# what to do with a connection whose queue would go over the high watermark,
+# an empty queue always takes the message even if it is larger:
+#   drop-oldest  drop queued messages until it is back under the low watermark
+#   coalesce     skip new messages until it drains to the low watermark, then
+#                send one notice with the number of skipped messages
+#   disconnect   close the connection
+OVERFLOW_POLICIES = ('drop-oldest', 'coalesce', 'disconnect')
+# bus datagram: room length, room, then the encoded frame as sent to clients
+BUS_HEADER = struct.Struct('!H')
+BUS_BUFFER_SIZE = BUS_HEADER.size + 0xFFFF + chat_protocol.HEADER.size + chat_protocol.MAX_MESSAGE_SIZE
+BUS_QUEUE_LIMIT = 16 * 1024 * 1024  # bytes waiting for a busy worker before dropping
+
+Message = collections.namedtuple('Message', ['user', 'text', 'room'])
+
+
+class QueueStats:
+   """Outbound queue counters of one connection"""
+
+   __slots__ = ('peer', 'queued_bytes', 'max_queued_bytes', 'dropped', 'skipped')
+
+   def __init__(self, peer):
+       self.peer = peer
+       self.queued_bytes = 0
+       self.max_queued_bytes = 0
+       self.dropped = 0  # messages never sent to this connection
+       self.skipped = 0  # dropped since the last coalesce notice
 
-Message = collections.namedtuple('Message', ['user', 'text'])
+   def __repr__(self):
+       return (f'{self.peer}: queued {self.queued_bytes} bytes (max {self.max_queued_bytes}), '
+               f'dropped {self.dropped} messages')
 
 
 class ChatServer:
@@ -16,23 +52,53 @@ class ChatServer:
    def __init__(self, **kwargs):
        self._selector = selectors.DefaultSelector()
        self._connections_msg_queue = {}
+       self._readers = {}
+       self._sent_offsets = {}
+       self._rooms = collections.defaultdict(set)  # room -> subscribed connections
+       self._memberships = {}  # connection -> joined rooms
+       self._queue_stats = {}
        self._host = kwargs['host']
        self._port = kwargs['port']
+       self._high_watermark = kwargs.get('high_watermark') or HIGH_WATERMARK
+       self._low_watermark = kwargs.get('low_watermark') or min(LOW_WATERMARK, self._high_watermark)
+       self._policy = kwargs.get('policy') or OVERFLOW_POLICIES[0]
+       if self._low_watermark > self._high_watermark:
+           raise ValueError('low watermark is above the high watermark')
+       if self._policy not in OVERFLOW_POLICIES:
+           raise ValueError(f'unknown overflow policy {self._policy}')
+       self._workers = kwargs.get('workers') or 1
+       if self._workers > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+           raise ValueError('worker processes need fork() and SO_REUSEPORT')
+       self._bus = None  # datagram socket other workers publish to
+       self._bus_peers = []  # sending ends of the other workers' buses
+       self._bus_buffer = None
+       self._bus_limit = 0  # largest datagram the bus takes
+       self._bus_pending = {}  # peer -> datagrams waiting for it to be writable
+       self._bus_pending_bytes = {}
+       self._bus_dropped = 0
+       self._children = []
 
    ##### SELECT FUNCTIONS ########################
 
    def _accept(self, sock, mask):
-       conn, addr = sock.accept()
+       try:
+           conn, addr = sock.accept()
+       except BlockingIOError:
+           return
        self._add_connection(conn)
 
+   # a connection evicted as a slow consumer while handling another one may
+   # still have an event in the same select() batch, it is closed by now
+
    def _read_write(self, conn, mask):
        if mask & selectors.EVENT_READ:
            self._read(conn, mask)
-       if mask & selectors.EVENT_WRITE:
+       if mask & selectors.EVENT_WRITE and conn in self._connections_msg_queue:
            self._write(conn, mask)
 
    def _read(self, conn, mask):
-       self._read_message(conn)
+       if conn in self._connections_msg_queue:
+           self._read_message(conn)
 
    def _write(self, conn, mask):
        self._write_pending_messages(conn)
@@ -43,71 +109,343 @@ class ChatServer:
        # register new client connection for reading (accepting new messages)
        print(f'{conn.getpeername()} hello!')
        self._connections_msg_queue[conn] = collections.deque()
+       self._readers[conn] = chat_protocol.FrameReader()
+       self._sent_offsets[conn] = 0
+       self._memberships[conn] = set()
+       self._queue_stats[conn] = QueueStats(conn.getpeername())
        conn.setblocking(False)
        self._selector.register(conn, selectors.EVENT_READ, self._read)
+       self._join(conn, chat_protocol.DEFAULT_ROOM)
 
    def _remove_connection(self, conn):
-       print(f'{conn.getpeername()} bye bye!')
+       try:
+           print(f'{conn.getpeername()} bye bye!')
+       except OSError:  # peer already gone
+           print(f'{conn} bye bye!')
        self._selector.unregister(conn)
        conn.close()
        del self._connections_msg_queue[conn]
+       del self._readers[conn]
+       del self._sent_offsets[conn]
+       del self._queue_stats[conn]
+       for room in self._memberships.pop(conn):
+           self._leave_room(conn, room)
+
+   def _join(self, conn, room):
+       self._memberships[conn].add(room)
+       self._rooms[room].add(conn)
+
+   def _leave(self, conn, room):
+       self._memberships[conn].discard(room)
+       self._leave_room(conn, room)
+
+   def _leave_room(self, conn, room):
+       subscribers = self._rooms.get(room)
+       if subscribers is not None:
+           subscribers.discard(conn)
+           if not subscribers:
+               del self._rooms[room]
 
    def _read_message(self, conn):
-       data = conn.recv(BUFFER_SIZE)  # Should be ready
-       if data:
-           self._add_message(conn, data)
-       else:
+       reader = self._readers[conn]
+       try:
+           received = reader.recv_from(conn)  # Should be ready
+           frames = reader.frames()
+       except BlockingIOError:
+           return
+       except (ConnectionError, chat_protocol.FrameError) as e:
+           print('Error occurred', e)
+           received, frames = 0, ()
+       # a single read may complete any number of messages
+       for raw_msg in frames:
+           self._add_message(conn, raw_msg)
+           if conn not in self._connections_msg_queue:
+               return  # disconnected as a slow consumer of its own room
+       if not received:
            self._remove_connection(conn)
 
    def _add_message(self, sender_conn, raw_msg):
        try:
-           msg = json.loads(raw_msg)
-           message = Message(msg['user'], msg['text'])
-           print(f"{sender_conn.getpeername()}: [{msg['user']}] {msg['text']}")
-       except (json.JSONDecodeError, KeyError,) as e:
+           msg = chat_protocol.decode(raw_msg)
+       except chat_protocol.MessageError as e:
            print(f"We got unknown type of message: {raw_msg}; error: {e}")
+           self._send_notice(sender_conn, f'invalid message: {e}')
+           return
+       if 'join' in msg:
+           self._join(sender_conn, str(msg['join']))
+           return
+       if 'leave' in msg:
+           self._leave(sender_conn, str(msg['leave']))
            return
+       message = Message(msg['user'], msg['text'], msg['room'])
+       print(f"{sender_conn.getpeername()}: [{message.room}] [{msg['user']}] {msg['text']}")
 
-       # register every client connection for writing (broadcast recent messages)
-       for conn, messages in self._connections_msg_queue.items():
-           conn.setblocking(False)  # not sure if needed
+       if message.room not in self._memberships[sender_conn]:
+           print(f"{sender_conn.getpeername()} is not in room {message.room}")
+           return
+
+       # encode once, every queue shares the same immutable frame
+       frame = chat_protocol.encode(message._asdict())
+       if self._bus_peers:
+           error = self._publish(message.room, frame)
+           if error:
+               self._send_notice(sender_conn, error)
+               return
+       self._broadcast(message.room, frame)
+
+   def _send(self, conn, frame):
+       """Queue ``frame`` for ``conn``, returns False if the connection must be closed"""
+       # write interest is only added when a queue goes from empty to non-empty
+       messages = self._connections_msg_queue[conn]
+       if not messages:
            self._selector.modify(conn, selectors.EVENT_READ | selectors.EVENT_WRITE, self._read_write)
-           messages.append(message)
+       return self._enqueue(conn, messages, frame)
+
+   def _send_notice(self, conn, text):
+       """Queue a message from the server for ``conn`` alone"""
+       if not self._send(conn, chat_protocol.notice(text)):
+           print(f'{self._queue_stats[conn]}, disconnecting slow consumer')
+           self._remove_connection(conn)
+
+   def _broadcast(self, room, frame):
+       # only the room's subscribers are touched
+       overflowed = [conn for conn in self._rooms.get(room, ()) if not self._send(conn, frame)]
+       for conn in overflowed:
+           print(f'{self._queue_stats[conn]}, disconnecting slow consumer')
+           self._remove_connection(conn)
+
+   def _enqueue(self, conn, messages, frame):
+       """Queue ``frame`` for ``conn``, returns False if the connection must be closed"""
+       stats = self._queue_stats[conn]
+       # an empty queue takes any frame, one larger than the high watermark
+       # must not count against every subscriber of the room
+       if stats.skipped or (messages and stats.queued_bytes + len(frame) > self._high_watermark):
+           if self._policy == 'disconnect':
+               return False
+           if self._policy == 'coalesce':
+               stats.skipped += 1
+               stats.dropped += 1
+               if not messages:
+                   # nothing to drain, the notice would never be sent otherwise
+                   notice = self._coalesce_notice(stats)
+                   messages.append(notice)
+                   stats.queued_bytes += len(notice)
+               return True
+           # drop-oldest, a partially sent head has to stay to keep the framing
+           head = messages.popleft() if messages and self._sent_offsets[conn] else None
+           while messages and stats.queued_bytes + len(frame) > self._low_watermark:
+               stats.queued_bytes -= len(messages.popleft())
+               stats.dropped += 1
+           if head is not None:
+               messages.appendleft(head)
+       messages.append(frame)
+       stats.queued_bytes += len(frame)
+       stats.max_queued_bytes = max(stats.max_queued_bytes, stats.queued_bytes)
+       return True
+
+   def _coalesce_notice(self, stats):
+       notice = chat_protocol.notice(f'{stats.skipped} messages skipped, you are lagging behind')
+       stats.skipped = 0
+       return notice
 
    def _write_pending_messages(self, conn):
        messages = self._connections_msg_queue[conn]
+       stats = self._queue_stats[conn]
+       offset = self._sent_offsets[conn]  # bytes of messages[0] already sent
        while messages:
-           msg = messages.popleft()
+           buffers = list(itertools.islice(messages, SENDMSG_MAX_BUFFERS))
+           if offset:
+               buffers[0] = memoryview(buffers[0])[offset:]
            try:
-               conn.send(f'[{msg.user}] {msg.text}'.encode('utf-8'))
+               written = conn.sendmsg(buffers)
+           except BlockingIOError:
+               break
            except Exception as e:
                print('Error occurred', e)
                self._remove_connection(conn)
                return
 
+           partial = written < sum(map(len, buffers))
+           offset += written
+           while messages and offset >= len(messages[0]):
+               sent = len(messages.popleft())
+               offset -= sent
+               stats.queued_bytes -= sent
+           if stats.skipped and stats.queued_bytes <= self._low_watermark:
+               notice = self._coalesce_notice(stats)
+               messages.append(notice)
+               stats.queued_bytes += len(notice)
+           if partial:
+               break
+       self._sent_offsets[conn] = offset
+       if messages:
+           return  # socket buffer is full, wait for the next write event
+
        # if no more message to send, don't listen to available for write
-       conn.setblocking(False)  # not sure if needed
        self._selector.modify(conn, selectors.EVENT_READ, self._read)
 
+   def stats(self):
+       """Outbound queue counters of every connection, most backlogged first"""
+       return sorted(self._queue_stats.values(), key=lambda stats: stats.queued_bytes, reverse=True)
+
+   def bus_stats(self):
+       """Datagrams waiting for, and dropped on the way to, the other workers"""
+       return {
+           'pending': sum(map(len, self._bus_pending.values())),
+           'pending_bytes': sum(self._bus_pending_bytes.values()),
+           'dropped': self._bus_dropped,
+       }
+
+   def _print_stats(self, signum, frame):
+       for stats in self.stats():
+           print(stats)
+       if self._bus_peers:
+           print('bus:', self.bus_stats())
+
+   ##### BUS FUNCTIONS ########################
+
+   def _publish(self, room, frame):
+       """Send ``frame`` to the other workers, returns why it can not be sent, if it can not"""
+       # one datagram per peer worker, they forward it to their own subscribers
+       room = room.encode('utf-8')
+       size = BUS_HEADER.size + len(room) + len(frame)
+       if len(room) > 0xFFFF:
+           return f'room name of {len(room)} bytes is too long'
+       if size > self._bus_limit:
+           return f'message of {size} bytes is too large to reach every worker'
+       datagram = (BUS_HEADER.pack(len(room)), room, frame)
+       for peer in self._bus_peers:
+           pending = self._bus_pending[peer]
+           if not pending:
+               try:
+                   peer.sendmsg(datagram)
+                   continue
+               except BlockingIOError:  # the peer is behind, retry once the bus is writable
+                   self._selector.register(peer, selectors.EVENT_WRITE, self._flush_bus)
+               except OSError:
+                   self._bus_dropped += 1
+                   continue
+           if self._bus_pending_bytes[peer] + size > BUS_QUEUE_LIMIT:
+               self._bus_dropped += 1
+               continue
+           pending.append(datagram)
+           self._bus_pending_bytes[peer] += size
+       return None
+
+   def _flush_bus(self, peer, mask):
+       pending = self._bus_pending[peer]
+       while pending:
+           datagram = pending[0]
+           try:
+               peer.sendmsg(datagram)
+           except BlockingIOError:
+               return
+           except OSError:
+               self._bus_dropped += 1
+           pending.popleft()
+           self._bus_pending_bytes[peer] -= sum(map(len, datagram))
+       self._selector.unregister(peer)
+
+   def _read_bus(self, bus, mask):
+       buffer = self._bus_buffer
+       with memoryview(buffer) as view:
+           while True:
+               try:
+                   size = bus.recv_into(buffer)
+               except BlockingIOError:
+                   return
+               room_end = BUS_HEADER.size + BUS_HEADER.unpack_from(buffer)[0]
+               room = str(view[BUS_HEADER.size:room_end], 'utf-8')
+               self._broadcast(room, bytes(view[room_end:size]))
+
+   def _fork_workers(self):
+       """Fork the other workers, returns the index of the calling one"""
+       buses = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for i in range(self._workers)]
+       # capped by net.core.[rw]mem_max, larger messages fail with EMSGSIZE
+       for inbox, outbox in buses:
+           for sock, option in ((inbox, socket.SO_RCVBUF), (outbox, socket.SO_SNDBUF)):
+               sock.setsockopt(socket.SOL_SOCKET, option, BUS_BUFFER_SIZE)
+       worker = 0
+       for i in range(1, self._workers):
+           pid = os.fork()
+           if pid:
+               self._children.append(pid)
+           else:
+               worker = i
+               self._children = []
+               # an epoll/kqueue instance is shared across fork, each worker needs its own
+               self._selector.close()
+               self._selector = selectors.DefaultSelector()
+               break
+       peers = []
+       for i, (inbox, outbox) in enumerate(buses):
+           if i == worker:
+               bus = inbox
+               outbox.close()
+           else:
+               peers.append(outbox)
+               inbox.close()
+       self._open_bus(bus, peers)
+       return worker
+
+   def _open_bus(self, bus, peers):
+       """Receive from the other workers on ``bus``, publish to them on ``peers``"""
+       self._bus = bus
+       self._bus_peers = peers
+       bus.setblocking(False)
+       for peer in peers:
+           peer.setblocking(False)
+           self._bus_pending[peer] = collections.deque()
+           self._bus_pending_bytes[peer] = 0
+       # Linux reports twice the requested size and keeps 32 bytes of it,
+       # a larger datagram fails with EMSGSIZE
+       sndbuf = min(peer.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF) for peer in peers)
+       self._bus_limit = min(sndbuf - 32, BUS_BUFFER_SIZE)
+       self._bus_buffer = bytearray(BUS_BUFFER_SIZE)
+       self._selector.register(bus, selectors.EVENT_READ, self._read_bus)
+
    def run(self):
+       # kill -USR1 <pid> prints who is lagging
+       if hasattr(signal, 'SIGUSR1'):
+           signal.signal(signal.SIGUSR1, self._print_stats)
+
+       # every worker listens on the same port, the kernel spreads the connections
+       if self._workers > 1:
+           worker = self._fork_workers()
+           print(f'worker {worker} pid {os.getpid()}')
+
        # create and register server socket for reading (accepting new connections)
        server_sock = socket.socket()
+       if self._workers > 1:
+           server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
        server_sock.bind((self._host, self._port))
        server_sock.listen(SERVER_NUM_CONNECTIONS)
        server_sock.setblocking(False)
        self._selector.register(server_sock, selectors.EVENT_READ, self._accept)
 
-       while True:
-           events = self._selector.select()
-           for key, mask in events:
-               callback = key.data
-               callback(key.fileobj, mask)
+       if self._children:
+           # the first worker takes the others down with it
+           signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+       try:
+           while True:
+               events = self._selector.select()
+               for key, mask in events:
+                   callback = key.data
+                   callback(key.fileobj, mask)
+       finally:
+           for pid in self._children:
+               os.kill(pid, signal.SIGTERM)
 
 
-parser = argparse.ArgumentParser(description='Chat server arguments.')
-parser.add_argument('-host', nargs='?', default='localhost')
-parser.add_argument('-port', nargs='?', default=1234)
-args = parser.parse_args()
+if __name__ == '__main__':
+   parser = argparse.ArgumentParser(description='Chat server arguments.')
+   parser.add_argument('-host', nargs='?', default='localhost')
+   parser.add_argument('-port', nargs='?', type=int, default=1234)
+   parser.add_argument('-high_watermark', type=int, default=HIGH_WATERMARK, help='per connection queue limit in bytes')
+   parser.add_argument('-low_watermark', type=int, default=LOW_WATERMARK, help='queue size to drain to in bytes')
+   parser.add_argument('-policy', choices=OVERFLOW_POLICIES, default=OVERFLOW_POLICIES[0])
+   parser.add_argument('-workers', type=int, default=1, help='worker processes sharing the port with SO_REUSEPORT')
+   args = parser.parse_args()
 
-chat = ChatServer(**vars(args))
-chat.run()
\ No newline at end of file
+   chat = ChatServer(**vars(args))
+   chat.run()
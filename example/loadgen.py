@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Load generator for the chat server (chat_server.py, asyncio_chat_server.py)
+and the echo server (asyncio_server.py)
+
+Opens N clients that each send messages of a given size at a fixed rate.
+After a warm-up phase it records the send -> receive latency of every
+message scheduled during the steady-state phase and prints a JSON report
+with throughput, latency percentiles and error counts.
+
+Sending is open loop: latency is measured from the time a message was
+scheduled to go out, so a stalled server is not hidden by clients that
+stop sending while they wait (coordinated omission).
+
+    $ python3 loadgen.py chat -clients 500 -rate 10 -room_size 5 -duration 30
+    $ python3 loadgen.py echo -port 2991 -clients 200 -rate 50 -o echo.json
+"""
+import abc
+import argparse
+import asyncio
+import collections
+import json
+import math
+import random
+import sys
+
+import chat_protocol
+
+DEFAULT_PORTS = {"chat": 1234, "echo": 2991}
+CONNECT_CONCURRENCY = 200
+
+
+class LatencyHistogram:
+    """HDR-style histogram of non-negative integers, e.g. microseconds
+
+    Values below 2**precision are counted exactly. Each power of two range
+    above that is split into 2**(precision - 1) buckets, so the relative
+    error stays under 2**(1 - precision) at any magnitude.
+    """
+
+    def __init__(self, precision: int = 7):
+        self._precision = precision
+        self._half = 1 << (precision - 1)
+        self._counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        if value < (1 << self._precision):
+            return value
+        shift = value.bit_length() - self._precision
+        return (1 << self._precision) + (shift - 1) * self._half + (value >> shift) - self._half
+
+    def _highest_value(self, index: int) -> int:
+        """the highest value counted in bucket ``index``"""
+        if index < (1 << self._precision):
+            return index
+        shift, top = divmod(index - (1 << self._precision), self._half)
+        return ((self._half + top + 1) << (shift + 1)) - 1
+
+    def record(self, value: int):
+        value = max(0, int(value))
+        index = self._index(value)
+        if index >= len(self._counts):
+            self._counts.extend([0] * (index + 1 - len(self._counts)))
+        self._counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        if other._precision != self._precision:
+            raise ValueError("histograms of different precision")
+        if len(other._counts) > len(self._counts):
+            self._counts.extend([0] * (len(other._counts) - len(self._counts)))
+        for index, count in enumerate(other._counts):
+            self._counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentile(self, percent: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(self._highest_value(index), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "min": self.min or 0,
+            "mean": self.total / self.count if self.count else 0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max,
+        }
+
+
+class LoadRun:
+    """Shared state of one run, only steady-state messages are measured"""
+
+    def __init__(self, steady_start: float, steady_end: float):
+        self.steady_start = steady_start
+        self.steady_end = steady_end
+        self.stopping = False
+        self.histogram = LatencyHistogram()
+        self.sent = 0
+        self.expected = 0
+        self.received = 0
+        self.room_sent = collections.Counter()  # measured chat messages per room
+        self.errors = collections.Counter()
+
+    def measured(self, scheduled: float) -> bool:
+        return self.steady_start <= scheduled < self.steady_end
+
+    def sending(self, scheduled: float, deliveries: int):
+        if self.measured(scheduled):
+            self.sent += 1
+            self.expected += deliveries
+
+    def delivered(self, scheduled: float, now: float):
+        if self.measured(scheduled):
+            self.received += 1
+            self.histogram.record((now - scheduled) * 1e6)
+
+
+class LoadClient(abc.ABC):
+    """One connection, sending at ``rate`` messages/s until the run stops"""
+
+    def __init__(self, run, index, args):
+        self.run = run
+        self.index = index
+        self.args = args
+        self.reader = None
+        self.writer = None
+        self.padding = "x" * args.size
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.args.host, self.args.port)
+
+    async def start(self):
+        """protocol handshake before the first message"""
+
+    @abc.abstractmethod
+    def message(self, scheduled: float) -> bytes:
+        """the next message to send, scheduled at ``scheduled``"""
+
+    @abc.abstractmethod
+    async def receive(self):
+        """record the latency of every reply until the run stops and the
+        client is caught_up()"""
+
+    @abc.abstractmethod
+    def caught_up(self) -> bool:
+        """whether every reply the client waits for so far has arrived"""
+
+    async def close(self):
+        self.writer.close()
+
+    async def send(self):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.args.rate
+        # spread the clients over the first interval
+        scheduled = loop.time() + random.random() * interval
+        while not self.run.stopping:
+            await asyncio.sleep(scheduled - loop.time())
+            self.run.sending(scheduled, self.deliveries)
+            self.writer.write(self.message(scheduled))
+            await self.writer.drain()
+            scheduled += interval
+
+    async def main(self):
+        try:
+            receiver = asyncio.ensure_future(self.receive())
+            await self.send()
+            # -drain only bounds the wait for replies still on the way
+            if receiver.done() or not self.caught_up():
+                await asyncio.wait_for(receiver, self.args.drain)
+        except asyncio.TimeoutError:
+            pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.run.errors["disconnect"] += 1
+        except ValueError:
+            self.run.errors["protocol"] += 1
+        finally:
+            receiver.cancel()
+            await self.close()
+
+
+class ChatLoadClient(LoadClient):
+    """Sends to a room of ``room_size`` clients, every member records the latency"""
+
+    def __init__(self, run, index, args):
+        super().__init__(run, index, args)
+        self.room = f"load-{index // args.room_size}"
+        self.deliveries = min(args.room_size, args.clients - index // args.room_size * args.room_size)
+        self.received = 0  # measured messages of the room
+
+    async def start(self):
+        self.writer.write(chat_protocol.encode({"join": self.room}))
+        self.writer.write(chat_protocol.encode({"leave": chat_protocol.DEFAULT_ROOM}))
+
+    def message(self, scheduled):
+        if self.run.measured(scheduled):
+            self.run.room_sent[self.room] += 1
+        return chat_protocol.encode({"user": f"load{self.index}", "text": f"{scheduled!r} {self.padding}", "room": self.room})
+
+    def caught_up(self):
+        return self.received >= self.run.room_sent[self.room]
+
+    async def receive(self):
+        loop = asyncio.get_running_loop()
+        reader = chat_protocol.FrameReader()
+        while not (self.run.stopping and self.caught_up()):
+            data = await self.reader.read(chat_protocol.BUFFER_SIZE)
+            if not data:
+                if not self.run.stopping:
+                    raise ConnectionResetError
+                return
+            now = loop.time()
+            reader.feed(data)
+            for raw_msg in reader.frames():
+                text = json.loads(raw_msg)["text"]
+                scheduled = float(text[:text.index(" ")])
+                if self.run.measured(scheduled):
+                    self.received += 1
+                self.run.delivered(scheduled, now)
+
+
+class EchoLoadClient(LoadClient):
+    """HELLO/WORLD/READY handshake, then every line is answered with ECHO <n>: line"""
+
+    deliveries = 1
+
+    def __init__(self, run, index, args):
+        super().__init__(run, index, args)
+        self.pending = collections.deque()  # scheduled times of unanswered lines
+
+    async def expect(self, line: bytes):
+        data = await asyncio.wait_for(self.reader.readline(), self.args.drain)
+        if data.rstrip().upper() != line:
+            raise ValueError(f"expected {line}, received {data!r}")
+
+    async def start(self):
+        await self.expect(b"HELLO")
+        self.writer.write(b"WORLD\n")
+        await self.expect(b"READY")
+
+    def message(self, scheduled):
+        self.pending.append(scheduled)
+        return f"{self.padding}\n".encode()
+
+    def caught_up(self):
+        return not self.pending
+
+    async def receive(self):
+        loop = asyncio.get_running_loop()
+        while not (self.run.stopping and self.caught_up()):
+            data = await self.reader.readline()
+            if not data:
+                raise ConnectionResetError
+            if not data.startswith(b"ECHO "):
+                raise ValueError(f"unexpected reply {data!r}")
+            self.run.delivered(self.pending.popleft(), loop.time())
+
+    async def close(self):
+        if not self.writer.is_closing():
+            self.writer.write(b"BYE\n")
+        await super().close()
+
+
+CLIENTS = {"chat": ChatLoadClient, "echo": EchoLoadClient}
+
+
+async def connect_all(run, args):
+    semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+    async def connect(index):
+        client = CLIENTS[args.mode](run, index, args)
+        async with semaphore:
+            try:
+                await client.connect()
+                await client.start()
+            except (OSError, asyncio.TimeoutError, ValueError):
+                run.errors["connect"] += 1
+                return None
+        return client
+
+    clients = await asyncio.gather(*(connect(i) for i in range(args.clients)))
+    return [client for client in clients if client is not None]
+
+
+async def generate(args) -> dict:
+    loop = asyncio.get_running_loop()
+    run = LoadRun(0, 0)
+    clients = await connect_all(run, args)
+    run.steady_start = loop.time() + args.warmup
+    run.steady_end = run.steady_start + args.duration
+    tasks = [asyncio.ensure_future(client.main()) for client in clients]
+    await asyncio.sleep(run.steady_end - loop.time())
+    run.stopping = True
+    await asyncio.gather(*tasks)
+
+    run.errors["lost"] = run.expected - run.received
+    return {
+        "mode": args.mode,
+        "clients": args.clients,
+        "connected": len(clients),
+        "rate": args.rate,
+        "size": args.size,
+        "warmup": args.warmup,
+        "duration": args.duration,
+        "sent": run.sent,
+        "received": run.received,
+        "throughput": run.received / args.duration,
+        "latency_us": run.histogram.summary(),
+        "errors": dict(run.errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat and echo server load generator")
+    parser.add_argument("mode", choices=CLIENTS)
+    parser.add_argument("-host", default="localhost")
+    parser.add_argument("-port", type=int, help="defaults to 1234 for chat, 2991 for echo")
+    parser.add_argument("-clients", type=int, default=100, help="concurrent connections")
+    parser.add_argument("-rate", type=float, default=10, help="messages per second per client")
+    parser.add_argument("-size", type=int, default=100, help="payload bytes")
+    parser.add_argument("-room_size", type=int, default=1, help="chat clients per room")
+    parser.add_argument("-warmup", type=float, default=5, help="seconds before measuring")
+    parser.add_argument("-duration", type=float, default=30, help="seconds of steady state")
+    parser.add_argument("-drain", type=float, default=5, help="at most seconds to wait for outstanding replies at the end")
+    parser.add_argument("-o", dest="output", help="write the JSON report to a file")
+    args = parser.parse_args()
+    if args.port is None:
+        args.port = DEFAULT_PORTS[args.mode]
+
+    report = asyncio.run(generate(args))
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
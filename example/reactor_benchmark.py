@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Streaming benchmark for the Transport in reactor_with_transport
+
+A sender writes windows of data over TCP loopback, the receiver counts the
+bytes and sends a byte back for every window, ping-pong style, until the
+whole size went through. Compares the chunked sendmsg / recv_into
+Transport against the original one that concatenates and slices bytes
+and receives 1024 bytes at a time. The original is quadratic in the
+pending output, so it gets a smaller size by default.
+
+    $ python3 reactor_benchmark.py -size 1024 -legacy_size 64
+"""
+import argparse
+import socket
+import time
+
+import reactor_with_transport as rt
+
+MB = 1024 * 1024
+
+
+class LegacyTransport(rt.Transport):
+    """the original buffering: bytes += data, sliced after every send"""
+
+    def __init__(self, reactor, sock, protocol):
+        super().__init__(reactor, sock, protocol)
+        self._buffer = b''
+
+    def do_read(self):
+        data = self._socket.recv(1024)
+        if data:
+            self._protocol.data_received(data)
+        else:
+            self._tear_down(None)
+
+    def do_write(self):
+        if self._buffer:
+            try:
+                written = self._socket.send(self._buffer)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                self._tear_down(e)
+                return
+            self._buffer = self._buffer[written:]
+        if not self._buffer:
+            self._reactor.remove_writer(self)
+            self._on_completion()
+
+    def write(self, data):
+        self._buffer += data
+        self._reactor.add_writer(self)
+        self.do_write()
+
+
+class StreamSender(rt.Protocol):
+    """writes ``size`` bytes, keeping ``in_flight`` windows unacknowledged"""
+
+    def __init__(self, size, window, chunk, in_flight=2):
+        self._chunk = b'x' * chunk
+        self._window = window
+        self._windows = -(-size // window)
+        self._in_flight = in_flight
+        self._sent = 0
+        self._acked = 0
+        self.transport = None
+
+    def _send_window(self):
+        for i in range(self._window // len(self._chunk)):
+            self.transport.write(self._chunk)
+        self._sent += 1
+
+    def make_connection(self, transport):
+        self.transport = transport
+        while self._sent < min(self._in_flight, self._windows):
+            self._send_window()
+
+    def data_received(self, data):
+        self._acked += len(data)
+        if self._acked >= self._windows:
+            self.transport.lose_connection()
+        while self._sent < min(self._acked + self._in_flight, self._windows):
+            self._send_window()
+
+    def connection_lost(self, exception_or_none):
+        pass
+
+
+class StreamReceiver(rt.Protocol):
+    """counts what arrives, answers every complete window with one byte"""
+
+    def __init__(self, window):
+        self._window = window
+        self.received = 0
+        self.transport = None
+
+    def make_connection(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        windows = self.received // self._window
+        self.received += len(data)
+        acks = self.received // self._window - windows
+        if acks:
+            self.transport.write(b'*' * acks)
+
+    def connection_lost(self, exception_or_none):
+        pass
+
+
+def stream(transport_class, size, window, chunk):
+    """seconds and CPU seconds it takes to stream ``size`` bytes"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    client = socket.create_connection(listener.getsockname())
+    server, _ = listener.accept()
+    listener.close()
+
+    reactor = rt.Reactor()
+    size = -(-size // window) * window  # whole windows
+    receiver = StreamReceiver(window)
+    start, cpu = time.perf_counter(), time.process_time()
+    transport_class(reactor, server, receiver).activate()
+    transport_class(reactor, client, StreamSender(size, window, chunk)).activate()
+    reactor.run()
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    assert receiver.received == size, (receiver.received, size)
+    return size, elapsed, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="reactor Transport streaming benchmark")
+    parser.add_argument("-size", type=int, default=1024, help="MB streamed through the chunked transport")
+    parser.add_argument("-legacy_size", type=int, default=64, help="MB streamed through the original one, 0 to skip")
+    parser.add_argument("-window", type=int, default=4 * MB, help="bytes per acknowledged window")
+    parser.add_argument("-chunk", type=int, default=64 * 1024, help="bytes per write() call")
+    args = parser.parse_args()
+
+    cases = [("chunked", rt.Transport, args.size)]
+    if args.legacy_size:
+        cases.insert(0, ("legacy", LegacyTransport, args.legacy_size))
+    print(f"{'transport':<12}{'MB':>8}{'seconds':>10}{'MB/s':>10}{'CPU s':>10}")
+    for name, transport_class, size in cases:
+        size, elapsed, cpu = stream(transport_class, size * MB, args.window, args.chunk)
+        print(f"{name:<12}{size // MB:>8}{elapsed:>10.2f}{size / MB / elapsed:>10.0f}{cpu:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,146 @@
-import errno
-import select
+import argparse
+import collections
+import heapq
+import itertools
+import os
+import selectors
 import socket
+import ssl
+import time
 from abc import ABCMeta, abstractmethod
 
+READ_SIZE = 256 * 1024
+SENDMSG_MAX_BUFFERS = 64  # well below IOV_MAX
+RECV_BATCH = 64  # datagrams read per readable event
 
-class Reactor(object):
-    """Drives the program execution."""
 
-    def __init__(self):
-        self._readers = set()
-        self._writers = set()
+class TimerHandle(object):
+    """A callback scheduled on the reactor, cancel() keeps it from running."""
+
+    __slots__ = ('when', 'callback', 'args', 'cancelled', '_reactor')
+
+    def __init__(self, reactor, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self._reactor = reactor
+
+    def cancel(self):
+        self._reactor.cancel(self)
+
+
+class Reactor(object):
+    """Drives the program execution.
+
+    Interest in each transport is kept as an event mask registered with a
+    selector (epoll/kqueue through selectors.DefaultSelector) and only
+    changed when it changes, so a tick costs O(ready) rather than
+    O(registered) and there is no FD_SETSIZE cap. Pass
+    selectors.SelectSelector() for the old select.select behaviour.
+    Timers live in a heap ordered by deadline.
+    """
+
+    def __init__(self, selector=None):
+        self._selector = selector or selectors.DefaultSelector()
+        self._events = {}   # transport -> registered event mask
+        self._timers = []   # heap of (when, sequence, TimerHandle)
+        self._sequence = itertools.count()  # FIFO order for equal deadlines
+        self._cancelled = 0
+        self._stopping = False
+
+    def _set_events(self, transport, events):
+        registered = self._events.get(transport, 0)
+        if events == registered:
+            return
+        if not events:
+            del self._events[transport]
+            self._selector.unregister(transport)
+        elif registered:
+            self._events[transport] = events
+            self._selector.modify(transport, events)
+        else:
+            self._events[transport] = events
+            self._selector.register(transport, events)
 
     def add_reader(self, transport):
-        self._readers.add(transport)
+        self._set_events(transport, self._events.get(transport, 0) | selectors.EVENT_READ)
 
     def add_writer(self, transport):
-        self._writers.add(transport)
+        self._set_events(transport, self._events.get(transport, 0) | selectors.EVENT_WRITE)
 
     def remove_reader(self, readable):
-        self._readers.discard(readable)
+        self._set_events(readable, self._events.get(readable, 0) & ~selectors.EVENT_READ)
 
     def remove_writer(self, writable):
-        self._writers.discard(writable)
+        self._set_events(writable, self._events.get(writable, 0) & ~selectors.EVENT_WRITE)
+
+    def time(self):
+        return time.monotonic()
+
+    def call_at(self, when, callback, *args):
+        """Run callback(*args) once time() reaches when."""
+        timer = TimerHandle(self, when, callback, args)
+        heapq.heappush(self._timers, (when, next(self._sequence), timer))
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(self.time() + delay, callback, *args)
+
+    def cancel(self, timer):
+        if not timer.cancelled:
+            timer.cancelled = True
+            self._cancelled += 1
+
+    def stop(self):
+        self._stopping = True
+
+    def _next_timeout(self):
+        # drop cancelled timers from the top, rebuild once most are cancelled
+        timers = self._timers
+        if self._cancelled > 64 and self._cancelled * 2 > len(timers):
+            self._timers = timers = [entry for entry in timers if not entry[2].cancelled]
+            heapq.heapify(timers)
+            self._cancelled = 0
+        while timers and timers[0][2].cancelled:
+            heapq.heappop(timers)
+            self._cancelled = max(0, self._cancelled - 1)
+        if not timers:
+            return None
+        return max(0, timers[0][0] - self.time())
+
+    def _run_timers(self):
+        # only what was due when the pass started, timers that callbacks
+        # add meanwhile wait for the next tick even if already due
+        now = self.time()
+        last = next(self._sequence)
+        timers = self._timers
+        while timers and timers[0][0] <= now and timers[0][1] < last:
+            timer = heapq.heappop(timers)[2]
+            if timer.cancelled:
+                self._cancelled = max(0, self._cancelled - 1)
+            else:
+                timer.callback(*timer.args)
 
     def run(self):
-        while self._readers or self._writers:
-            r, w, _ = select.select(self._readers, self._writers, [])
-            for readable in r:
-                readable.do_read()
-            for writable in w:
-                if writable in self._writers:
-                    writable.do_write()
+        self._stopping = False
+        while not self._stopping:
+            timeout = self._next_timeout()
+            if not self._events and timeout is None:
+                break
+            if self._events:
+                ready = self._selector.select(timeout)
+            else:
+                time.sleep(timeout)
+                ready = ()
+            for key, mask in ready:
+                transport = key.fileobj
+                # an earlier callback of this tick may have changed the interest
+                if mask & selectors.EVENT_READ and self._events.get(transport, 0) & selectors.EVENT_READ:
+                    transport.do_read()
+                if mask & selectors.EVENT_WRITE and self._events.get(transport, 0) & selectors.EVENT_WRITE:
+                    transport.do_write()
+            self._run_timers()
 
 
 class Protocol(object):
@@ -44,6 +154,8 @@ class Protocol(object):
 
     @abstractmethod
     def data_received(self, data):
+        """data is a view of the transport's read buffer, only valid
+        until this returns: copy it (bytes(data)) to keep it"""
         pass
 
     @abstractmethod
@@ -78,34 +190,59 @@ class PingPongProtocol(Protocol):
 
 
 class Transport(object):
-    """Dispatching socket events."""
+    """Dispatching socket events.
+
+    Pending output is a deque of chunks flushed with sendmsg scatter-gather;
+    a partly sent chunk is replaced by a memoryview of its rest, so nothing
+    pending is copied again. Input is received into one reusable bytearray.
+    """
 
     def __init__(self, reactor, sock, protocol):
         self._reactor = reactor    # type: Reactor
         self._socket = sock        # type: socket.socket
         self._protocol = protocol  # type: Protocol
-        self._buffer = b''
+        self._buffer = collections.deque()  # chunks waiting to be sent
+        self._read_buffer = bytearray(READ_SIZE)
+        self._read_view = memoryview(self._read_buffer)
         self._on_completion = lambda: None
 
     def do_read(self):
-        data = self._socket.recv(1024)
-        if data:
-            self._protocol.data_received(data)
+        try:
+            received = self._socket.recv_into(self._read_buffer)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._tear_down(e)
+            return
+        if received:
+            self._protocol.data_received(self._read_view[:received])
         else:
             self._tear_down(None)
 
+    def _send(self, chunks):
+        if len(chunks) > 1 and hasattr(self._socket, 'sendmsg'):
+            return self._socket.sendmsg(chunks)
+        return self._socket.send(chunks[0])
+
     def do_write(self):
-        if self._buffer:
+        buffer = self._buffer
+        while buffer:
+            chunks = list(itertools.islice(buffer, SENDMSG_MAX_BUFFERS))
             try:
-                written = self._socket.send(self._buffer)
-            except socket.error as e:
-                if e.errno != errno.EAGAIN:
-                    self._tear_down(e)
+                written = self._send(chunks)
+            except BlockingIOError:
                 return
-            else:
-                print('transport wrote', written, 'bytes')
-                self._buffer = self._buffer[written:]
-        if not self._buffer:
+            except OSError as e:
+                self._tear_down(e)
+                return
+            short = written < sum(map(len, chunks))
+            while buffer and written >= len(buffer[0]):
+                written -= len(buffer.popleft())
+            if written:
+                buffer[0] = memoryview(buffer[0])[written:]
+            if short:  # the socket buffer is full, wait for the next event
+                return
+        if not buffer:
             self._reactor.remove_writer(self)
             self._on_completion()
 
@@ -114,9 +251,24 @@ class Transport(object):
         return self._socket.fileno()
 
     def write(self, data):
-        self._buffer += data
+        if not self._buffer:
+            # try right away, only what the socket does not take gets queued
+            try:
+                written = self._socket.send(data)
+            except BlockingIOError:
+                written = 0
+            except OSError as e:
+                self._tear_down(e)
+                return
+            if written == len(data):
+                return
+            data = memoryview(data)[written:]
+        # bytes are immutable and can be queued as they are, anything else
+        # (a bytearray, a view of a read buffer) may change once we return
+        if not isinstance(data, bytes) and not isinstance(memoryview(data).obj, bytes):
+            data = bytes(data)
+        self._buffer.append(data)
         self._reactor.add_writer(self)
-        self.do_write()
 
     def lose_connection(self):
         if self._buffer:
@@ -127,6 +279,8 @@ class Transport(object):
             self._tear_down(None)
 
     def _tear_down(self, exception_or_none):
+        if self._socket.fileno() == -1:  # already torn down
+            return
         self._reactor.remove_writer(self)
         self._reactor.remove_reader(self)
         self._socket.close()
@@ -139,18 +293,338 @@ class Transport(object):
         self._reactor.add_writer(self)
 
 
+class TLSTransport(Transport):
+    """TLS on a non-blocking socket through ssl.SSLObject and two MemoryBIOs.
+
+    Received bytes are fed to the incoming BIO and the records the
+    SSLObject produces are taken from the outgoing one and sent with
+    Transport.write, so the reactor only ever deals with the raw socket.
+    The protocol gets make_connection once the handshake is done.
+    """
+
+    def __init__(self, reactor, sock, protocol, context, server_side=False, server_hostname=None):
+        super().__init__(reactor, sock, protocol)
+        self._incoming = ssl.MemoryBIO()
+        self._outgoing = ssl.MemoryBIO()
+        self._ssl = context.wrap_bio(self._incoming, self._outgoing, server_side, server_hostname)
+        self._handshaking = True
+
+    def _flush(self):
+        if self._outgoing.pending:
+            Transport.write(self, self._outgoing.read())
+
+    def _handshake(self):
+        try:
+            self._ssl.do_handshake()
+        except ssl.SSLWantReadError:
+            self._flush()
+            return
+        except ssl.SSLError as e:
+            self._flush()  # the alert, if any
+            self._tear_down(e)
+            return
+        self._handshaking = False
+        self._flush()
+        self._protocol.make_connection(self)
+
+    def do_read(self):
+        try:
+            received = self._socket.recv_into(self._read_buffer)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._tear_down(e)
+            return
+        if received:
+            self._incoming.write(self._read_view[:received])
+        else:
+            self._incoming.write_eof()
+        if self._handshaking:
+            self._handshake()
+            if self._handshaking:
+                return
+        # the raw bytes are in the BIO now, so the buffer takes the plaintext
+        while self._socket.fileno() != -1:
+            try:
+                received = self._ssl.read(READ_SIZE, self._read_buffer)
+            except ssl.SSLWantReadError:
+                break
+            except ssl.SSLZeroReturnError:  # the peer sent close_notify
+                self._tear_down(None)
+                return
+            except ssl.SSLError as e:
+                self._tear_down(e)
+                return
+            if not received:
+                self._tear_down(None)
+                return
+            self._protocol.data_received(self._read_view[:received])
+        self._flush()
+
+    def write(self, data):
+        self._ssl.write(data)
+        self._flush()
+
+    def lose_connection(self):
+        if not self._handshaking:
+            try:
+                self._ssl.unwrap()  # queues our close_notify
+            except ssl.SSLError:
+                pass
+            self._flush()
+        super().lose_connection()
+
+    def activate(self):
+        self._socket.setblocking(False)
+        self._reactor.add_reader(self)
+        self._handshake()
+
+
+class DatagramProtocol(object):
+    """Application level handlers for a datagram transport."""
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def make_connection(self, transport):
+        pass
+
+    @abstractmethod
+    def datagram_received(self, data, address):
+        """data is a view of the transport's read buffer, as in
+        Protocol.data_received"""
+        pass
+
+    @abstractmethod
+    def connection_lost(self, exception_or_none):
+        pass
+
+
+class DatagramTransport(Transport):
+    """A UDP socket, one datagram_received per datagram.
+
+    A readable event drains up to RECV_BATCH datagrams; datagrams the socket
+    cannot take right away are queued with their address until it can. A
+    send error (EMSGSIZE, ENOBUFS, an unreachable host) only concerns that
+    datagram, it is dropped and counted in ``dropped``.
+    """
+
+    def __init__(self, reactor, sock, protocol):
+        super().__init__(reactor, sock, protocol)
+        self.dropped = 0
+
+    def do_read(self):
+        for i in range(RECV_BATCH):
+            try:
+                received, address = self._socket.recvfrom_into(self._read_buffer)
+            except BlockingIOError:
+                return
+            except ConnectionRefusedError:  # ICMP unreachable for an earlier send
+                continue
+            except OSError as e:
+                self._tear_down(e)
+                return
+            self._protocol.datagram_received(self._read_view[:received], address)
+            if self._socket.fileno() == -1:
+                return
+
+    def _send(self, data, address):
+        if address is None:  # connected socket
+            return self._socket.send(data)
+        return self._socket.sendto(data, address)
+
+    def do_write(self):
+        buffer = self._buffer
+        while buffer:
+            try:
+                self._send(*buffer[0])
+            except BlockingIOError:
+                return
+            except ConnectionRefusedError:
+                pass
+            except OSError:
+                self.dropped += 1
+            buffer.popleft()
+        self._reactor.remove_writer(self)
+        self._on_completion()
+
+    def write(self, data, address=None):
+        if not self._buffer:
+            try:
+                self._send(data, address)
+                return
+            except BlockingIOError:
+                pass
+            except ConnectionRefusedError:
+                return
+            except OSError:
+                self.dropped += 1
+                return
+        self._buffer.append((bytes(data), address))
+        self._reactor.add_writer(self)
+
+    def activate(self):
+        self._socket.setblocking(False)
+        self._protocol.make_connection(self)
+        self._reactor.add_reader(self)
+
+
 class Listener(Transport):
+    """Accepts connections for protocols made by protocol_factory, as
+    server side TLSTransports when given an ssl context."""
+
+    def __init__(self, reactor, sock, protocol_factory=None, context=None):
+        super().__init__(reactor, sock, None)
+        self._protocol_factory = protocol_factory or (lambda: PingPongProtocol('server'))
+        self._context = context
 
     def activate(self):
         self._reactor.add_reader(self)
 
     def do_read(self):
         server, _ = self._socket.accept()
-        protocol = PingPongProtocol('server')
-        Transport(self._reactor, server, protocol).activate()
+        protocol = self._protocol_factory()
+        if self._context is None:
+            Transport(self._reactor, server, protocol).activate()
+        else:
+            TLSTransport(self._reactor, server, protocol, self._context, server_side=True).activate()
 
+    def lose_connection(self):
+        self._reactor.remove_reader(self)
+        self._socket.close()
 
-def main():
+
+class MediaEcho(DatagramProtocol):
+
+    def make_connection(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.transport.write(data, address)
+
+    def connection_lost(self, exception_or_none):
+        print('media server lost the connection:', exception_or_none)
+
+
+class MediaProbe(DatagramProtocol):
+    """sends ``count`` datagrams, at most ``window`` of them unanswered, and
+    calls ``done`` once all came back or the last ones got no reply for
+    ``timeout`` seconds. Lost datagrams hold their slot of the window, once
+    nothing came back for ``timeout`` the probe starts a fresh window."""
+
+    def __init__(self, reactor, count, done, window=32, timeout=1.0):
+        self._reactor = reactor
+        self._count = count
+        self._done = done
+        self._window = window
+        self._timeout = timeout
+        self._last = None  # time of the last reply
+        self._timer = None
+        self.sent = 0
+        self.received = 0
+        self.transport = None
+
+    def make_connection(self, transport):
+        self.transport = transport
+        self._last = self._reactor.time()
+        self._timer = self._reactor.call_later(self._timeout, self._check)
+        self._send(self._window)
+
+    def _send(self, n):
+        for i in range(min(n, self._count - self.sent)):
+            self.transport.write(b'probe %d' % self.sent)
+            self.sent += 1
+
+    def _check(self):
+        # one timer for the whole run, moved on only when it fires
+        now = self._reactor.time()
+        idle = now - self._last
+        if idle < self._timeout:
+            self._timer = self._reactor.call_later(self._timeout - idle, self._check)
+        elif self.sent < self._count:
+            self._last = now
+            self._timer = self._reactor.call_later(self._timeout, self._check)
+            self._send(self._window)
+        else:
+            self._timer = None
+            self._finish()
+
+    def _finish(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        print('media client got', self.received, 'of', self.sent, 'datagrams back,',
+              self.sent - self.received, 'lost')
+        self.transport.lose_connection()
+        self._done()
+
+    def datagram_received(self, data, address):
+        self.received += 1
+        self._last = self._reactor.time()
+        if self.received == self._count:
+            self._finish()
+        else:
+            self._send(1)
+
+    def connection_lost(self, exception_or_none):
+        print('media client lost the connection:', exception_or_none)
+
+
+class SignallingProtocol(Protocol):
+    """Line based signalling: INVITE is answered with OK <udp port> of a
+    MediaEcho, the client then probes that port and says BYE."""
+
+    def __init__(self, identity, reactor, probes=0, on_lost=lambda: None):
+        self._identity = identity
+        self._reactor = reactor
+        self._probes = probes
+        self._on_lost = on_lost
+        self._input = b''
+        self._media = None
+        self.transport = None
+
+    def make_connection(self, transport):
+        self.transport = transport
+        if self._probes:  # the calling side
+            self.transport.write(b'INVITE\n')
+
+    def data_received(self, data):
+        *lines, self._input = (self._input + bytes(data)).split(b'\n')
+        for line in lines:
+            print(self._identity, 'receives', line)
+            command, _, argument = line.partition(b' ')
+            if command == b'INVITE' and self._media is None:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.bind(('127.0.0.1', 0))
+                self._media = DatagramTransport(self._reactor, sock, MediaEcho())
+                self._media.activate()
+                self.transport.write(b'OK %d\n' % sock.getsockname()[1])
+            elif command == b'OK' and self._media is None:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                try:
+                    sock.connect(('127.0.0.1', int(argument)))
+                except (ValueError, OverflowError, OSError) as e:
+                    print(self._identity, 'cannot reach the media port:', e)
+                    sock.close()
+                    self._hang_up()
+                    continue
+                self._media = DatagramTransport(self._reactor, sock,
+                                                MediaProbe(self._reactor, self._probes, self._hang_up))
+                self._media.activate()
+            elif command == b'BYE':
+                if self._media is not None:
+                    self._media.lose_connection()
+                self.transport.lose_connection()
+
+    def _hang_up(self):
+        self.transport.write(b'BYE\n')
+
+    def connection_lost(self, exception_or_none):
+        print(self._identity, 'lost the connection:', exception_or_none)
+        self._on_lost()
+
+
+def ping_pong():
     listener_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     listener_sock.bind(('127.0.0.1', 0))
     listener_sock.listen(1)
@@ -163,5 +637,37 @@ def main():
     loop.run()
 
 
+def signalling_and_media(probes=10):
+    """TLS signalling and the UDP media it sets up, on one reactor"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_context.load_cert_chain(os.path.join(here, 'localhost.pem'))
+    client_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=os.path.join(here, 'ca.crt'))
+
+    listener_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener_sock.bind(('127.0.0.1', 0))
+    listener_sock.listen(1)
+    client_sock = socket.create_connection(listener_sock.getsockname())
+
+    loop = Reactor()
+    listener = Listener(loop, listener_sock, lambda: SignallingProtocol(
+        'signalling server', loop, on_lost=listener.lose_connection), server_context)
+    listener.activate()
+    TLSTransport(loop, client_sock, SignallingProtocol('signalling client', loop, probes),
+                 client_context, server_hostname='localhost').activate()
+    loop.run()  # returns once both sides hung up and the listener is closed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='reactor demos')
+    parser.add_argument('-demo', choices=('ping-pong', 'tls-udp'), default='ping-pong')
+    parser.add_argument('-probes', type=int, default=10, help='UDP datagrams sent in the tls-udp demo')
+    args = parser.parse_args()
+    if args.demo == 'tls-udp':
+        signalling_and_media(args.probes)
+    else:
+        ping_pong()
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
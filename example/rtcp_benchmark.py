@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the RTCP receiver report codec in aiortc_rtcp_packet
+
+It compares the memoryview / precompiled Struct codec against the original
+slice, format string and concatenation based one, reporting packets/s and
+transient heap usage for RR parse and serialize.
+
+    $ python3 rtcp_benchmark.py -n 20000 -r 31
+"""
+import argparse
+import time
+import tracemalloc
+from struct import pack, unpack
+
+import aiortc_rtcp_packet as aio
+
+
+def legacy_pack_packets_lost(count: int) -> bytes:
+    return pack("!l", count)[1:]
+
+
+def legacy_unpack_packets_lost(d: bytes) -> int:
+    if d[0] & 0x80:
+        d = b"\xff" + d
+    else:
+        d = b"\x00" + d
+    return unpack("!l", d)[0]
+
+
+def legacy_parse(data: bytes):
+    """the original parser, every sub-packet and report block is sliced"""
+    pos = 0
+    packets = []
+    while pos < len(data):
+        v_p_count, packet_type, length = unpack("!BBH", data[pos : pos + 4])
+        count = v_p_count & 0x1F
+        pos += 4
+        end = pos + length * 4
+        payload = data[pos:end]
+        pos = end
+        if packet_type == aio.RTCP_RR:
+            ssrc = unpack("!L", payload[0:4])[0]
+            reports = []
+            for r in range(count):
+                block = payload[4 + 24 * r : 28 + 24 * r]
+                r_ssrc, fraction_lost = unpack("!LB", block[0:5])
+                packets_lost = legacy_unpack_packets_lost(block[5:8])
+                highest_sequence, jitter, lsr, dlsr = unpack("!LLLL", block[8:])
+                reports.append(
+                    aio.RtcpReceiverInfo(
+                        ssrc=r_ssrc,
+                        fraction_lost=fraction_lost,
+                        packets_lost=packets_lost,
+                        highest_sequence=highest_sequence,
+                        jitter=jitter,
+                        lsr=lsr,
+                        dlsr=dlsr,
+                    )
+                )
+            packets.append(aio.RtcpRrPacket(ssrc=ssrc, reports=reports))
+    return packets
+
+
+def legacy_serialize(packet) -> bytes:
+    """the original RR serializer, concatenating every report block"""
+    payload = pack("!L", packet.ssrc)
+    for report in packet.reports:
+        data = pack("!LB", report.ssrc, report.fraction_lost)
+        data += legacy_pack_packets_lost(report.packets_lost)
+        data += pack("!LLLL", report.highest_sequence, report.jitter, report.lsr, report.dlsr)
+        payload += data
+    return pack("!BBH", (2 << 6) | len(packet.reports), aio.RTCP_RR, len(payload) // 4) + payload
+
+
+def make_compound(packets: int, reports: int) -> bytes:
+    data = b""
+    for p in range(packets):
+        rr = aio.RtcpRrPacket(ssrc=0x10000 + p)
+        for r in range(reports):
+            rr.reports.append(
+                aio.RtcpReceiverInfo(
+                    ssrc=0x20000 + r,
+                    fraction_lost=r % 256,
+                    packets_lost=-r,
+                    highest_sequence=1000 + r,
+                    jitter=r * 3,
+                    lsr=r << 16,
+                    dlsr=r << 8,
+                )
+            )
+        data += bytes(rr)
+    return data
+
+
+def measure(func, arg, iterations: int):
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(arg)
+    elapsed = time.perf_counter() - start
+
+    # transient heap: peak usage during one call minus what the result keeps
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    result = func(arg)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed / iterations, peak - current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RTCP receiver report codec benchmark")
+    parser.add_argument("-n", type=int, default=20000, help="iterations")
+    parser.add_argument("-p", type=int, default=2, help="RR packets per compound")
+    parser.add_argument("-r", type=int, default=31, help="report blocks per RR")
+    args = parser.parse_args()
+
+    data = make_compound(args.p, args.r)
+    rr = aio.RtcpPacket.parse(data)[0]
+    buf = bytearray(rr.packed_size())
+    assert legacy_parse(data) == aio.RtcpPacket.parse(data)
+    assert legacy_serialize(rr) == bytes(rr)
+
+    cases = (
+        ("parse", "before", legacy_parse, data, args.p),
+        ("parse", "after", aio.RtcpPacket.parse, data, args.p),
+        ("serialize", "before", legacy_serialize, rr, 1),
+        ("serialize", "after", bytes, rr, 1),
+        ("serialize", "pack_into", lambda packet: packet.pack_into(buf), rr, 1),
+    )
+    print(f"compound packet: {len(data)} bytes, {args.p} RR x {args.r} blocks")
+    print(f"{'operation':<12}{'codec':<12}{'packets/s':>12}{'us/packet':>12}{'transient B':>14}")
+    for operation, name, func, arg, packets in cases:
+        per_call, transient = measure(func, arg, args.n)
+        per_packet = per_call / packets
+        print(
+            f"{operation:<12}{name:<12}{1 / per_packet:>12.0f}"
+            f"{per_packet * 1e6:>12.2f}{transient:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
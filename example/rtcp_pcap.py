@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Extract RTCP packets from pcap / pcapng captures
+
+The capture is memory-mapped and walked in place: record, Ethernet, IP and
+UDP headers are read with unpack_from and only the UDP payloads which look
+like RTCP are handed to RtcpPacket.parse, so multi-GB files are never read
+into memory.
+
+    for capture in iter_rtcp("call.pcapng"):
+        print(capture.timestamp, capture.src, capture.dst, capture.packets)
+
+    $ python3 rtcp_pcap.py call.pcapng --dump
+    $ python3 rtcp_pcap.py big.pcap -j 8 -p 5004 -p 5005
+"""
+import argparse
+import collections
+import mmap
+import multiprocessing
+import socket
+from struct import unpack_from
+from typing import Iterator, List, Optional, Set, Tuple
+
+from aiortc_rtcp_packet import RtcpPacket
+
+PCAP_MAGIC = {
+    # magic read as little-endian -> (byte order, timestamp fraction unit)
+    0xA1B2C3D4: ("<", 1e-6),
+    0xD4C3B2A1: (">", 1e-6),
+    0xA1B23C4D: ("<", 1e-9),
+    0x4D3CB2A1: (">", 1e-9),
+}
+
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_IF_TSRESOL = 9
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+IPPROTO_UDP = 17
+IPV6_EXTENSION_HEADERS = (0, 43, 60)  # hop-by-hop, routing, destination options
+
+RtcpCapture = collections.namedtuple(
+    "RtcpCapture", ["timestamp", "src", "dst", "packets"]
+)
+
+
+class CaptureFormat:
+    """How to read the records of a capture from a given offset on.
+
+    For pcapng the interface table changes as blocks are walked, copy()
+    takes a snapshot so another process can resume from that offset.
+    """
+
+    __slots__ = ("pcapng", "endian", "linktype", "ts_unit", "interfaces")
+
+    def __init__(self, pcapng: bool, endian: str, linktype=None, ts_unit=1e-6):
+        self.pcapng = pcapng
+        self.endian = endian
+        self.linktype = linktype
+        self.ts_unit = ts_unit
+        self.interfaces = []  # pcapng: (linktype, ts_unit) per interface id
+
+    def copy(self) -> "CaptureFormat":
+        fmt = CaptureFormat(self.pcapng, self.endian, self.linktype, self.ts_unit)
+        fmt.interfaces = list(self.interfaces)
+        return fmt
+
+
+def open_capture(buf) -> Tuple[CaptureFormat, int]:
+    """Detect the file format, returns it and the offset of the first record."""
+    if len(buf) < 24:
+        raise ValueError("Capture file is too short")
+    magic = unpack_from("<I", buf, 0)[0]
+    if magic == PCAPNG_SHB:
+        # the section header block itself is handled by iter_frames()
+        return CaptureFormat(True, _pcapng_endian(buf, 0)), 0
+    if magic not in PCAP_MAGIC:
+        raise ValueError("Not a pcap or pcapng file")
+    endian, ts_unit = PCAP_MAGIC[magic]
+    linktype = unpack_from(endian + "I", buf, 20)[0] & 0x0FFFFFFF
+    return CaptureFormat(False, endian, linktype, ts_unit), 24
+
+
+def _pcapng_endian(buf, pos: int) -> str:
+    if unpack_from("<I", buf, pos + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+        return "<"
+    if unpack_from(">I", buf, pos + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+        return ">"
+    raise ValueError("pcapng section header has an invalid byte order magic")
+
+
+def _pcapng_ts_unit(buf, endian: str, pos: int, end: int) -> float:
+    """Timestamp unit from the if_tsresol option of an interface block."""
+    while pos + 4 <= end:
+        code, length = unpack_from(endian + "HH", buf, pos)
+        if code == 0:
+            break
+        if code == PCAPNG_IF_TSRESOL and length >= 1:
+            value = buf[pos + 4]
+            if value & 0x80:
+                return 2.0 ** -(value & 0x7F)
+            return 10.0 ** -value
+        pos += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+
+def iter_frames(buf, fmt: CaptureFormat, pos: int, end: Optional[int] = None):
+    """
+    Walk the records of a capture between ``pos`` and ``end``.
+
+    Yields ``(next_pos, timestamp, linktype, start, stop)`` where
+    ``buf[start:stop]`` is the captured frame and ``next_pos`` the offset
+    of the following record. ``fmt`` is updated by pcapng metadata blocks.
+    """
+    if end is None:
+        end = len(buf)
+    if not fmt.pcapng:
+        record = fmt.endian + "IIII"
+        linktype = fmt.linktype
+        ts_unit = fmt.ts_unit
+        while pos + 16 <= end:
+            ts_sec, ts_frac, caplen, origlen = unpack_from(record, buf, pos)
+            start = pos + 16
+            pos = start + caplen
+            if pos > end:
+                raise ValueError("pcap record is truncated")
+            yield pos, ts_sec + ts_frac * ts_unit, linktype, start, pos
+        return
+
+    while pos + 12 <= end:
+        block_type, block_length = unpack_from(fmt.endian + "II", buf, pos)
+        if block_type == PCAPNG_SHB:
+            fmt.endian = _pcapng_endian(buf, pos)
+            fmt.interfaces = []
+            block_length = unpack_from(fmt.endian + "I", buf, pos + 4)[0]
+        if block_length < 12 or block_length % 4 or pos + block_length > end:
+            raise ValueError("pcapng block length is invalid")
+        block_end = pos + block_length
+
+        if block_type == PCAPNG_EPB or block_type == PCAPNG_PB:
+            if block_type == PCAPNG_EPB:
+                interface, ts_high, ts_low, caplen = unpack_from(
+                    fmt.endian + "IIII", buf, pos + 8
+                )
+            else:
+                interface, ts_high, ts_low, caplen = unpack_from(
+                    fmt.endian + "HxxIII", buf, pos + 8
+                )
+            if interface >= len(fmt.interfaces):
+                raise ValueError("pcapng packet block refers to an unknown interface")
+            linktype, ts_unit = fmt.interfaces[interface]
+            start = pos + 28
+            # the frame can not run past the block's trailing length
+            stop = start + max(0, min(caplen, block_end - 4 - start))
+            yield block_end, ((ts_high << 32) | ts_low) * ts_unit, linktype, start, stop
+        elif block_type == PCAPNG_SPB:
+            if not fmt.interfaces:
+                raise ValueError("pcapng packet block refers to an unknown interface")
+            linktype, ts_unit = fmt.interfaces[0]
+            origlen = unpack_from(fmt.endian + "I", buf, pos + 8)[0]
+            start = pos + 12
+            yield block_end, None, linktype, start, start + min(origlen, block_length - 16)
+        elif block_type == PCAPNG_IDB:
+            linktype = unpack_from(fmt.endian + "H", buf, pos + 8)[0]
+            ts_unit = _pcapng_ts_unit(buf, fmt.endian, pos + 16, block_end - 4)
+            fmt.interfaces.append((linktype, ts_unit))
+        pos = block_end
+
+
+def udp_payload(buf, linktype: int, pos: int, end: int):
+    """
+    Locate the UDP payload of a captured frame.
+
+    Returns ``(family, src_ip, dst_ip, src_port, dst_port, start, stop)``
+    with the addresses given as offsets into ``buf``, or None for anything
+    that is not a whole IPv4/IPv6 UDP datagram.
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        if end - pos < 14:
+            return None
+        ethertype = unpack_from("!H", buf, pos + 12)[0]
+        pos += 14
+        while ethertype in ETHERTYPE_VLAN and end - pos >= 4:
+            ethertype = unpack_from("!H", buf, pos + 2)[0]
+            pos += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if end - pos < 16:
+            return None
+        ethertype = unpack_from("!H", buf, pos + 14)[0]
+        pos += 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        if end - pos < 20:
+            return None
+        ethertype = unpack_from("!H", buf, pos)[0]
+        pos += 20
+    elif linktype == LINKTYPE_NULL:
+        if end - pos < 4:
+            return None
+        # BSD address family, in the byte order of the capturing host
+        family = unpack_from("<I", buf, pos)[0]
+        if family > 0xFFFF:
+            family = unpack_from(">I", buf, pos)[0]
+        ethertype = ETHERTYPE_IPV4 if family == 2 else ETHERTYPE_IPV6
+        pos += 4
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if end - pos < 1:
+            return None
+        ethertype = ETHERTYPE_IPV4 if buf[pos] >> 4 == 4 else ETHERTYPE_IPV6
+    else:
+        return None
+
+    if ethertype == ETHERTYPE_IPV4:
+        if end - pos < 20 or buf[pos] >> 4 != 4:
+            return None
+        header_length = (buf[pos] & 0x0F) * 4
+        flags_fragment = unpack_from("!H", buf, pos + 6)[0]
+        # fragments cannot be decoded without reassembly
+        if buf[pos + 9] != IPPROTO_UDP or flags_fragment & 0x3FFF:
+            return None
+        family = socket.AF_INET
+        src_ip = pos + 12
+        dst_ip = pos + 16
+        pos += header_length
+    elif ethertype == ETHERTYPE_IPV6:
+        if end - pos < 40 or buf[pos] >> 4 != 6:
+            return None
+        next_header = buf[pos + 6]
+        family = socket.AF_INET6
+        src_ip = pos + 8
+        dst_ip = pos + 24
+        pos += 40
+        while next_header in IPV6_EXTENSION_HEADERS and end - pos >= 8:
+            next_header, length = buf[pos], buf[pos + 1]
+            pos += (length + 1) * 8
+        if next_header != IPPROTO_UDP:
+            return None
+    else:
+        return None
+
+    if end - pos < 8:
+        return None
+    src_port, dst_port, length = unpack_from("!HHH", buf, pos)
+    if length < 8 or pos + length > end:
+        return None
+    return family, src_ip, dst_ip, src_port, dst_port, pos + 8, pos + length
+
+
+def _looks_like_rtcp(buf, start: int, stop: int) -> bool:
+    # version 2 and a packet type in the RTCP range (RFC 5761)
+    return stop - start >= 8 and buf[start] >> 6 == 2 and 192 <= buf[start + 1] <= 223
+
+
+def _format_address(buf, family: int, pos: int, port: int):
+    size = 4 if family == socket.AF_INET else 16
+    return socket.inet_ntop(family, buf[pos : pos + size].tobytes()), port
+
+
+def iter_rtcp_mapped(
+    buf, fmt: CaptureFormat, pos: int, end: Optional[int] = None,
+    ports: Optional[Set[int]] = None, errors: Optional[collections.Counter] = None,
+) -> Iterator[RtcpCapture]:
+    """Yield the RTCP packets of the records in ``buf[pos:end]``."""
+    with memoryview(buf) as view:
+        for next_pos, timestamp, linktype, start, stop in iter_frames(view, fmt, pos, end):
+            udp = udp_payload(view, linktype, start, stop)
+            if udp is None:
+                continue
+            family, src_ip, dst_ip, src_port, dst_port, start, stop = udp
+            if ports is not None and src_port not in ports and dst_port not in ports:
+                continue
+            if not _looks_like_rtcp(view, start, stop):
+                continue
+            with view[start:stop] as payload:
+                try:
+                    packets = RtcpPacket.parse(payload)
+                except ValueError:
+                    if errors is not None:
+                        errors["invalid"] += 1
+                    continue
+            yield RtcpCapture(
+                timestamp,
+                _format_address(view, family, src_ip, src_port),
+                _format_address(view, family, dst_ip, dst_port),
+                packets,
+            )
+
+
+def iter_rtcp(
+    path: str, ports: Optional[Set[int]] = None, errors: Optional[collections.Counter] = None
+) -> Iterator[RtcpCapture]:
+    """Memory-map the capture at ``path`` and yield its RTCP packets."""
+    with open(path, "rb") as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if hasattr(buf, "madvise"):
+                buf.madvise(mmap.MADV_SEQUENTIAL)
+            fmt, pos = open_capture(buf)
+            yield from iter_rtcp_mapped(buf, fmt, pos, ports=ports, errors=errors)
+
+
+def split_capture(path: str, parts: int) -> List[tuple]:
+    """
+    Cut the capture at record boundaries into ``parts`` similar byte ranges.
+
+    Returns ``(fmt, start, end)`` tuples, each with the format state needed
+    to resume reading at ``start``. Only record headers are read.
+    """
+    with open(path, "rb") as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            fmt, pos = open_capture(buf)
+            size = len(buf)
+            chunks = []
+            start, start_fmt = pos, fmt.copy()
+            target = start + (size - start) // parts
+            for next_pos, timestamp, linktype, frame_start, frame_stop in iter_frames(buf, fmt, pos):
+                if next_pos >= target and len(chunks) < parts - 1:
+                    chunks.append((start_fmt, start, next_pos))
+                    start, start_fmt = next_pos, fmt.copy()
+                    target = start + (size - start) // (parts - len(chunks))
+            chunks.append((start_fmt, start, size))
+            return chunks
+
+
+def summarize(captures: Iterator[RtcpCapture], summary: collections.Counter) -> collections.Counter:
+    for capture in captures:
+        summary["compound"] += 1
+        for packet in capture.packets:
+            summary[type(packet).__name__] += 1
+            summary["report blocks"] += len(getattr(packet, "reports", ()))
+    return summary
+
+
+def _summarize_chunk(args) -> collections.Counter:
+    path, fmt, start, end, ports = args
+    summary = collections.Counter()
+    with open(path, "rb") as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if hasattr(buf, "madvise"):
+                buf.madvise(mmap.MADV_SEQUENTIAL)
+            captures = iter_rtcp_mapped(buf, fmt, start, end, ports, summary)
+            summarize(captures, summary)
+            captures.close()
+    return summary
+
+
+def summarize_parallel(path: str, processes: int, ports: Optional[Set[int]] = None):
+    """Summarize a capture with one worker process per record range."""
+    chunks = [(path, fmt, start, end, ports) for fmt, start, end in split_capture(path, processes)]
+    summary = collections.Counter()
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap_unordered(_summarize_chunk, chunks):
+            summary.update(result)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract RTCP packets from a pcap/pcapng file")
+    parser.add_argument("path", help="pcap or pcapng capture file")
+    parser.add_argument("-p", "--port", type=int, action="append",
+                        help="only consider UDP datagrams from/to this port, may be repeated")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="worker processes for the summary, split at record boundaries")
+    parser.add_argument("--dump", action="store_true", help="print every RTCP packet")
+    args = parser.parse_args()
+    ports = set(args.port) if args.port else None
+
+    if args.dump:
+        for capture in iter_rtcp(args.path, ports):
+            print(f"{capture.timestamp} {capture.src} -> {capture.dst}")
+            for packet in capture.packets:
+                print(f"    {packet}")
+        return
+
+    if args.jobs > 1:
+        summary = summarize_parallel(args.path, args.jobs, ports)
+    else:
+        summary = collections.Counter()
+        captures = iter_rtcp(args.path, ports, summary)
+        summarize(captures, summary)
+    for name, count in sorted(summary.items()):
+        print(f"{name:<20}{count:>12}")
+
+
+if __name__ == "__main__":
+    main()
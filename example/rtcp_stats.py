@@ -0,0 +1,219 @@
+"""
+Per-SSRC RTCP statistics: loss, jitter and round-trip time
+
+    tracker = RtcpStatsTracker()
+    tracker.ingest(RtcpPacket.parse(data))
+    tracker.loss_rate(ssrc), tracker.jitter_percentile(ssrc, 0.95), tracker.rtt(ssrc)
+
+Reports are kept in fixed capacity ring buffers with running sums and a
+sorted copy of the window, so every query is O(1) and the memory per SSRC
+is bounded by the window size.
+"""
+import time
+from bisect import bisect_left, insort
+from typing import Iterable, Optional
+
+from aiortc_rtcp_packet import AnyRtcpPacket, RtcpSrPacket
+
+NTP_EPOCH_OFFSET = 2208988800  # seconds from 1900-01-01 to 1970-01-01
+
+
+def ntp_middle32(timestamp: float) -> int:
+    """Middle 32 bits of the NTP time of a unix ``timestamp``, as LSR/DLSR use."""
+    ntp = timestamp + NTP_EPOCH_OFFSET
+    seconds = int(ntp)
+    return ((seconds & 0xFFFF) << 16) | int((ntp - seconds) * 65536)
+
+
+class RingBuffer:
+    """Fixed capacity ring of numbers with a running sum.
+
+    With ``ordered=True`` a sorted copy of the window is maintained as
+    well, making percentile() an index lookup.
+    """
+
+    __slots__ = ("_values", "_pos", "_count", "total", "_sorted")
+
+    def __init__(self, capacity: int, ordered: bool = False):
+        self._values = [0] * capacity
+        self._pos = 0
+        self._count = 0
+        self.total = 0
+        self._sorted = [] if ordered else None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value) -> None:
+        values = self._values
+        if self._count == len(values):
+            evicted = values[self._pos]
+            self.total -= evicted
+            if self._sorted is not None:
+                del self._sorted[bisect_left(self._sorted, evicted)]
+        else:
+            self._count += 1
+        values[self._pos] = value
+        self._pos = (self._pos + 1) % len(values)
+        self.total += value
+        if self._sorted is not None:
+            insort(self._sorted, value)
+
+    def latest(self):
+        if not self._count:
+            return None
+        return self._values[self._pos - 1]
+
+    def mean(self) -> Optional[float]:
+        if not self._count:
+            return None
+        return self.total / self._count
+
+    def percentile(self, p: float):
+        """Nearest-rank percentile of the window, ``p`` in [0, 1]."""
+        if not self._count:
+            return None
+        return self._sorted[min(int(p * self._count), self._count - 1)]
+
+
+class SsrcStats:
+    """Rolling aggregates for the reports about one media source."""
+
+    __slots__ = (
+        "ssrc",
+        "fraction_lost",
+        "packets_lost",
+        "highest_sequence",
+        "jitter",
+        "rtt",
+        "updated",
+        "lost_deltas",
+        "expected_deltas",
+        "jitters",
+        "rtts",
+    )
+
+    def __init__(self, ssrc: int, window: int):
+        self.ssrc = ssrc
+        self.fraction_lost = 0
+        self.packets_lost = None
+        self.highest_sequence = None
+        self.jitter = None
+        self.rtt = None
+        self.updated = None
+        self.lost_deltas = RingBuffer(window)
+        self.expected_deltas = RingBuffer(window)
+        self.jitters = RingBuffer(window, ordered=True)
+        self.rtts = RingBuffer(window, ordered=True)
+
+    def update(self, report, arrival_ntp: int, arrival_time: float) -> None:
+        if self.highest_sequence is not None:
+            expected = (report.highest_sequence - self.highest_sequence) & 0xFFFFFFFF
+            # ignore duplicated, reordered or reset reports
+            if 0 < expected < 0x80000000:
+                self.expected_deltas.append(expected)
+                self.lost_deltas.append(report.packets_lost - self.packets_lost)
+        self.fraction_lost = report.fraction_lost
+        self.packets_lost = report.packets_lost
+        self.highest_sequence = report.highest_sequence
+        self.jitter = report.jitter
+        self.jitters.append(report.jitter)
+        self.updated = arrival_time
+
+        if report.lsr:
+            # RFC 3550 section 6.4.1, in units of 1/65536 seconds
+            rtt = (arrival_ntp - report.lsr - report.dlsr) & 0xFFFFFFFF
+            if rtt < 0x80000000:
+                self.rtt = rtt / 65536
+                self.rtts.append(self.rtt)
+
+    def loss_rate(self) -> float:
+        """Fraction of packets lost over the window, falls back to the last report."""
+        expected = self.expected_deltas.total
+        if expected <= 0:
+            return self.fraction_lost / 256
+        return min(max(self.lost_deltas.total / expected, 0.0), 1.0)
+
+
+class RtcpStatsTracker:
+    """Tracks per-SSRC loss, jitter and RTT from parsed RTCP packets."""
+
+    def __init__(self, window: int = 32, clock=time.time):
+        self._window = window
+        self._clock = clock
+        self._stats = {}
+        self._last_sr = {}  # sender ssrc -> (middle 32 bits of NTP, arrival time)
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def __contains__(self, ssrc: int) -> bool:
+        return ssrc in self._stats
+
+    def ingest(
+        self, packets: Iterable[AnyRtcpPacket], arrival_time: Optional[float] = None
+    ) -> None:
+        """Account the report blocks of ``packets`` received at ``arrival_time``."""
+        if arrival_time is None:
+            arrival_time = self._clock()
+        arrival_ntp = ntp_middle32(arrival_time)
+        stats = self._stats
+        for packet in packets:
+            if isinstance(packet, RtcpSrPacket):
+                self._last_sr[packet.ssrc] = (
+                    (packet.sender_info.ntp_timestamp >> 16) & 0xFFFFFFFF,
+                    arrival_time,
+                )
+            reports = getattr(packet, "reports", None)
+            if not reports:
+                continue
+            for report in reports:
+                ssrc = report.ssrc
+                ssrc_stats = stats.get(ssrc)
+                if ssrc_stats is None:
+                    ssrc_stats = stats[ssrc] = SsrcStats(ssrc, self._window)
+                ssrc_stats.update(report, arrival_ntp, arrival_time)
+
+    def stats(self, ssrc: int) -> Optional[SsrcStats]:
+        return self._stats.get(ssrc)
+
+    def remove(self, ssrc: int) -> None:
+        self._stats.pop(ssrc, None)
+        self._last_sr.pop(ssrc, None)
+
+    def expire(self, timeout: float, now: Optional[float] = None) -> int:
+        """Forget sources without a report for ``timeout`` seconds."""
+        if now is None:
+            now = self._clock()
+        stale = [s for s, st in self._stats.items() if now - st.updated > timeout]
+        for ssrc in stale:
+            self.remove(ssrc)
+        return len(stale)
+
+    def loss_rate(self, ssrc: int) -> Optional[float]:
+        stats = self._stats.get(ssrc)
+        return None if stats is None else stats.loss_rate()
+
+    def jitter_percentile(self, ssrc: int, p: float) -> Optional[int]:
+        """Jitter percentile over the window, in RTP timestamp units."""
+        stats = self._stats.get(ssrc)
+        return None if stats is None else stats.jitters.percentile(p)
+
+    def rtt(self, ssrc: int) -> Optional[float]:
+        """Last round-trip time in seconds."""
+        stats = self._stats.get(ssrc)
+        return None if stats is None else stats.rtt
+
+    def rtt_percentile(self, ssrc: int, p: float) -> Optional[float]:
+        stats = self._stats.get(ssrc)
+        return None if stats is None else stats.rtts.percentile(p)
+
+    def lsr_dlsr(self, ssrc: int, now: Optional[float] = None):
+        """LSR and DLSR to put in our report block about ``ssrc``."""
+        last_sr = self._last_sr.get(ssrc)
+        if last_sr is None:
+            return 0, 0
+        if now is None:
+            now = self._clock()
+        lsr, arrival_time = last_sr
+        return lsr, int((now - arrival_time) * 65536) & 0xFFFFFFFF
@@ -1,28 +1,183 @@
-import time
+#!/usr/bin/env python3
+"""
+UDP latency and loss prober, for udp_server.py or any UDP echo
+
+Sends sequence numbered, timestamped probes at a fixed rate on one socket
+and matches the echoes by sequence number, in whatever order they come
+back. Every -interval seconds it prints the RTT percentiles of that
+interval, the loss of probes older than -timeout, reordering, duplicates
+and the RFC 3550 interarrival jitter of the round trip times, then a total
+line at the end.
+
+    $ python3 udp_client.py -host 10.0.0.2 -port 12000 -rate 20000 -duration 30
+"""
+import argparse
+import asyncio
 import socket
+import struct
+import time
+
+from loadgen import LatencyHistogram
+
+PROBE = struct.Struct('!IQ')  # sequence number, send time in ns
+BATCH = 64  # replies read per wakeup
+
+
+class ProbeStats:
+    """Replies to ``count`` probes, RTTs are recorded in microseconds"""
+
+    def __init__(self, count):
+        self.replied = bytearray(count)  # 1 once the probe came back
+        self.histogram = LatencyHistogram()  # RTTs since the last report
+        self.sent = 0
+        self.received = 0
+        self.duplicates = 0
+        self.reordered = 0  # arrived after a probe sent later
+        self.lost = 0       # of the probes up to expired
+        self.late = 0       # counted as lost first, replied after all
+        self.errors = 0
+        self.expired = 0
+        self.jitter = 0.0   # ns
+        self._highest = -1
+        self._last_rtt = None
+
+    def reply(self, sequence, sent_ns, now_ns):
+        if sequence >= len(self.replied) or self.replied[sequence]:
+            self.duplicates += 1
+            return
+        self.replied[sequence] = 1
+        self.received += 1
+        if sequence < self.expired:
+            self.late += 1
+            self.lost -= 1
+        if sequence < self._highest:
+            self.reordered += 1
+        else:
+            self._highest = sequence
+        rtt = now_ns - sent_ns
+        self.histogram.record(rtt // 1000)
+        # RFC 3550 6.4.1 with the RTT as transit time: J += (|D| - J) / 16
+        if self._last_rtt is not None:
+            self.jitter += (abs(rtt - self._last_rtt) - self.jitter) / 16
+        self._last_rtt = rtt
+
+    def expire(self, sequence):
+        """probes before ``sequence`` without a reply by now are lost"""
+        if sequence > self.expired:
+            self.lost += self.replied.count(0, self.expired, sequence)
+            self.expired = sequence
+
+    def take_histogram(self):
+        histogram, self.histogram = self.histogram, LatencyHistogram()
+        return histogram
+
+
+class Prober(asyncio.DatagramProtocol):
+    """The transport reads the first reply of a wakeup, the others queued on
+    the socket are drained here, only their header is read"""
+
+    def __init__(self, sock, stats):
+        self._sock = sock
+        self._header = bytearray(PROBE.size)
+        self.stats = stats
+
+    def _reply(self, data):
+        sequence, sent_ns = PROBE.unpack_from(data)
+        self.stats.reply(sequence, sent_ns, time.monotonic_ns())
+
+    def datagram_received(self, data, address):
+        if len(data) >= PROBE.size:
+            self._reply(data)
+        recv_into = self._sock.recv_into
+        for i in range(BATCH - 1):
+            try:
+                size = recv_into(self._header)
+            except OSError:  # drained, errors are left to the transport's next read
+                break
+            if size == PROBE.size:
+                self._reply(self._header)
+
+    def error_received(self, exc):
+        self.stats.errors += 1  # ICMP unreachable, nobody listens on the port
+
+
+async def send_probes(transport, stats, count, rate, size):
+    """``count`` probes, every one sent once it is due at ``rate``/s: a
+    wakeup that comes late sends everything that got due meanwhile"""
+    loop = asyncio.get_running_loop()
+    packet = bytearray(max(size, PROBE.size))
+    start = loop.time()
+    sequence = 0
+    while sequence < count:
+        due = min(count, int((loop.time() - start) * rate) + 1)
+        while sequence < due:
+            PROBE.pack_into(packet, 0, sequence, time.monotonic_ns())
+            transport.sendto(packet)  # copied if it has to be queued
+            sequence += 1
+        stats.sent = sequence
+        await asyncio.sleep(start + sequence / rate - loop.time())
+    return start
+
+
+def print_header():
+    print(f"{'seconds':>8}{'sent':>10}{'received':>10}{'loss %':>8}{'late':>6}{'reordered':>10}{'dup':>6}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'jitter ms':>10}")
+
+
+def print_line(label, stats, histogram):
+    loss = 100 * stats.lost / stats.expired if stats.expired else 0
+    print(f'{label:>8}{stats.sent:>10}{stats.received:>10}{loss:>8.2f}{stats.late:>6}{stats.reordered:>10}'
+          f'{stats.duplicates:>6}{histogram.percentile(50) / 1000:>9.3f}{histogram.percentile(99) / 1000:>9.3f}'
+          f'{histogram.max / 1000:>9.3f}{stats.jitter / 1e6:>10.3f}', flush=True)
+
+
+async def probe(host, port, count, rate, size=64, timeout=1.0, interval=1.0, report=True):
+    """Probe host:port and return the ProbeStats and the RTT histogram of the whole run"""
+    loop = asyncio.get_running_loop()
+    stats = ProbeStats(count)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    await loop.sock_connect(sock, (host, port))
+    transport, protocol = await loop.create_datagram_endpoint(lambda: Prober(sock, stats), sock=sock)
+    total = LatencyHistogram()
+    try:
+        sender = asyncio.ensure_future(send_probes(transport, stats, count, rate, size))
+        if report:
+            print_header()
+        begin = loop.time()
+        while not sender.done():
+            await asyncio.wait([sender], timeout=interval)
+            # probes sent more than timeout ago had their chance
+            stats.expire(min(stats.sent, int((loop.time() - timeout - begin) * rate)))
+            histogram = stats.take_histogram()
+            total.merge(histogram)
+            if report:
+                print_line(f'{loop.time() - begin:.0f}', stats, histogram)
+        await sender
+        await asyncio.sleep(timeout)
+        stats.expire(stats.sent)
+        total.merge(stats.take_histogram())
+        if report:
+            print_line('total', stats, total)
+    finally:
+        transport.close()
+    return stats, total
 
-def send_packets(port=12000):
 
-    for pings in range(10):
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        client_socket.settimeout(1.0)
-        message = b'test'
-        addr = ("127.0.0.1", 12000)
+def send_packets(args):
+    count = args.count or int(args.rate * args.duration)
+    asyncio.run(probe(args.host, args.port, count, args.rate, args.size, args.timeout, args.interval))
 
-        start = time.time()
-        client_socket.sendto(message, addr)
-        try:
-            data, server = client_socket.recvfrom(1024)
-            end = time.time()
-            elapsed = end - start
-            print(f'{data} {pings} {elapsed}')
-        except socket.timeout:
-            print('REQUEST TIMED OUT')
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='UDP Server arguments.')
-    parser.add_argument('-host', nargs='?', default='localhost')
-    parser.add_argument('-port', nargs='?', default=1234)
-    parser.add_argument('-message', nargs='?')
-    parser.add_argument('-count', nargs='?')
-    args = parser.parse_args()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='UDP Client arguments.')
+    parser.add_argument('-host', default='localhost')
+    parser.add_argument('-port', type=int, default=12000)
+    parser.add_argument('-rate', type=float, default=1000, help='probes per second')
+    parser.add_argument('-duration', type=float, default=10, help='seconds of probing')
+    parser.add_argument('-count', type=int, help='probes to send, instead of rate * duration')
+    parser.add_argument('-size', type=int, default=64, help='probe bytes, at least %d' % PROBE.size)
+    parser.add_argument('-timeout', type=float, default=1.0, help='seconds before a probe counts as lost')
+    parser.add_argument('-interval', type=float, default=1.0, help='seconds between report lines')
+    args = parser.parse_args()
+    send_packets(args)
@@ -1,23 +1,176 @@
+#!/usr/bin/env python3
+"""
+UDP probe responder: echoes every datagram back to its sender
+
+Each wakeup drains up to -batch datagrams into preallocated buffers with
+recvmsg_into instead of one recvfrom per wakeup. With -workers N, N
+processes bind the same port with SO_REUSEPORT and the kernel spreads the
+senders over them. Every -interval seconds each worker prints packets/s
+and its drops: datagrams the kernel dropped because the receive queue was
+full (SO_RXQ_OVFL, Linux only), replies dropped because the send buffer
+was full, and the -loss it was asked to simulate.
+
+    $ python3 udp_server.py -port 12000 -workers 4 -rcvbuf 4194304
+"""
+import argparse
+import asyncio
+import os
 import random
+import signal
 import socket
-import argparse
+import struct
+import sys
+
+BATCH = 64
+MAX_DATAGRAM = 2048
+# cumulative count of datagrams dropped on the socket, as ancillary data
+SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40 if sys.platform.startswith('linux') else None)
+DROPS = struct.Struct('=I')
+
+
+class ResponderStats:
+    """Counters of one worker since it started"""
+
+    __slots__ = ('received', 'replied', 'kernel_drops', 'send_drops', 'lost', 'truncated')
+
+    def __init__(self):
+        self.received = 0
+        self.replied = 0
+        self.kernel_drops = 0
+        self.send_drops = 0
+        self.lost = 0
+        self.truncated = 0
+
+
+class ProbeResponder(asyncio.DatagramProtocol):
+    """Echoes every datagram back, draining up to ``batch`` per wakeup
+
+    The asyncio transport reads the first datagram of a wakeup and hands it
+    to datagram_received, whatever else is queued on the socket is then read
+    here with recvmsg_into into preallocated buffers. Replies are sent
+    straight on the socket: one that does not fit into the send buffer is
+    dropped and counted rather than queued. Datagrams longer than
+    ``max_size`` are counted as truncated and not answered, whichever of the
+    two reads they came from.
+    """
 
-def receive_packets(port=12000):
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    server_socket.bind(('', port))
-    packet_count = 0
+    def __init__(self, sock, stats, batch=BATCH, max_size=MAX_DATAGRAM, loss=0.0):
+        self._sock = sock
+        self.stats = stats
+        self._max_size = max_size
+        self._views = [memoryview(bytearray(max_size)) for i in range(batch - 1)]
+        self._ancbufsize = socket.CMSG_SPACE(DROPS.size) if SO_RXQ_OVFL else 0
+        self._loss = loss
+
+    def _reply(self, data, address):
+        if self._loss and random.random() < self._loss:
+            self.stats.lost += 1
+            return
+        try:
+            self._sock.sendto(data, address)
+        except OSError:
+            self.stats.send_drops += 1
+        else:
+            self.stats.replied += 1
+
+    def datagram_received(self, data, address):
+        stats = self.stats
+        stats.received += 1
+        if len(data) > self._max_size:
+            stats.truncated += 1
+        else:
+            self._reply(data, address)
+        recvmsg_into = self._sock.recvmsg_into
+        received = []
+        for view in self._views:
+            try:
+                size, ancdata, flags, address = recvmsg_into([view], self._ancbufsize)
+            except OSError:  # drained, errors are left to the transport's next read
+                break
+            stats.received += 1
+            if ancdata:
+                stats.kernel_drops = DROPS.unpack_from(ancdata[-1][2])[0]
+            if flags & socket.MSG_TRUNC:
+                stats.truncated += 1
+            else:
+                received.append((view[:size], address))
+        for data, address in received:
+            self._reply(data, address)
+
+    def error_received(self, exc):
+        # ICMP errors for earlier replies, the prober is gone
+        pass
+
+
+async def start_responder(host, port, batch=BATCH, max_size=MAX_DATAGRAM, loss=0.0, rcvbuf=0, reuse_port=False):
+    """Bind the socket and start answering, returns (transport, protocol)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    if SO_RXQ_OVFL:
+        sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+    sock.bind((host, port))
+    sock.setblocking(False)
+    stats = ResponderStats()
+    return await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: ProbeResponder(sock, stats, batch, max_size, loss), sock=sock)
+
+
+async def report(stats, interval):
+    last = ResponderStats()
+    print(f"{'pid':>8}{'packets/s':>12}{'replies/s':>12}{'kernel drops':>14}{'send drops':>12}{'lost':>10}{'truncated':>10}")
     while True:
-        rand = random.randint(0, 10)
-        message, address = server_socket.recvfrom(1024)
-        message = message.upper()
-        packet_count = packet_count + 1
-        if rand >= 4:
-            server_socket.sendto(message, address)
+        await asyncio.sleep(interval)
+        print(f'{os.getpid():>8}{(stats.received - last.received) / interval:>12.0f}'
+              f'{(stats.replied - last.replied) / interval:>12.0f}{stats.kernel_drops:>14}'
+              f'{stats.send_drops:>12}{stats.lost:>10}{stats.truncated:>10}', flush=True)
+        for name in ResponderStats.__slots__:
+            setattr(last, name, getattr(stats, name))
+
+
+async def serve(args, reuse_port):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    transport, protocol = await start_responder(args.host, args.port, args.batch, args.max_size,
+                                                args.loss, args.rcvbuf, reuse_port)
+    reporter = asyncio.ensure_future(report(protocol.stats, args.interval))
+    await stop.wait()
+    reporter.cancel()
+    transport.close()
+
+
+def receive_packets(args):
+    if args.workers > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        raise ValueError('worker processes need fork() and SO_REUSEPORT')
+    # every worker binds the same port, the kernel spreads the senders
+    children = []
+    for i in range(1, args.workers):
+        pid = os.fork()
+        if not pid:
+            children = []
+            break
+        children.append(pid)
+    try:
+        asyncio.run(serve(args, args.workers > 1))
+    finally:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='UDP Server arguments.')
-    parser.add_argument('-host', nargs='?', default='localhost')
-    parser.add_argument('-port', nargs='?', default=1234)
-    parser.add_argument('-message', nargs='?')
-    parser.add_argument('-count', nargs='?')
-    args = parser.parse_args()
\ No newline at end of file
+    parser.add_argument('-host', default='0.0.0.0')
+    parser.add_argument('-port', type=int, default=12000)
+    parser.add_argument('-workers', type=int, default=1, help='worker processes sharing the port with SO_REUSEPORT')
+    parser.add_argument('-batch', type=int, default=BATCH, help='datagrams read per wakeup')
+    parser.add_argument('-max_size', type=int, default=MAX_DATAGRAM, help='largest datagram echoed in full')
+    parser.add_argument('-rcvbuf', type=int, default=0, help='SO_RCVBUF bytes, capped by net.core.rmem_max')
+    parser.add_argument('-loss', type=float, default=0.0, help='fraction of replies dropped on purpose')
+    parser.add_argument('-interval', type=float, default=1.0, help='seconds between stats lines')
+    args = parser.parse_args()
+    receive_packets(args)
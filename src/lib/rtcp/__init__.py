@@ -0,0 +1,61 @@
+"""
+RTP/RTCP codec
+
+Packet classes derived from aiortc, with an offset based parser over
+memoryviews, in place serialization and lazy / batch decoders.
+
+    from src.lib.rtcp import RtcpPacket
+    packets = RtcpPacket.parse(datagram)
+"""
+from .packet import (
+    PACKETS_LOST_MAX,
+    PACKETS_LOST_MIN,
+    RTCP_BYE,
+    RTCP_HEADER_LENGTH,
+    RTCP_PACKET_CLASSES,
+    RTCP_PSFB,
+    RTCP_PSFB_APP,
+    RTCP_PSFB_FIR,
+    RTCP_PSFB_PLI,
+    RTCP_PSFB_SLI,
+    RTCP_RR,
+    RTCP_RTPFB,
+    RTCP_RTPFB_NACK,
+    RTCP_SDES,
+    RTCP_SDES_CNAME,
+    RTCP_SR,
+    RTP_EXTENSION_ONE_BYTE,
+    RTP_EXTENSION_TWO_BYTE,
+    RTP_HEADER_LENGTH,
+    RTP_MAX_PACKET_SIZE,
+    AnyRtcpPacket,
+    RtcpByePacket,
+    RtcpCompoundBuilder,
+    RtcpPacket,
+    RtcpPsfbPacket,
+    RtcpReceiverInfo,
+    RtcpReceiverInfoView,
+    RtcpRrPacket,
+    RtcpRrPacketView,
+    RtcpRtpfbPacket,
+    RtcpSdesPacket,
+    RtcpSenderInfo,
+    RtcpSourceInfo,
+    RtcpSrPacket,
+    RtpPacket,
+    RtpPacketPool,
+    is_rtcp,
+    iter_rtcp_packets,
+    pack_fir_fci,
+    pack_nack_fci,
+    pack_packets_lost,
+    pack_remb_fci,
+    pack_rtcp_header_into,
+    pack_rtcp_packet,
+    sign_extend_24,
+    unpack_fir_fci,
+    unpack_header_extensions,
+    unpack_nack_fci,
+    unpack_packets_lost,
+    unpack_remb_fci,
+)
@@ -0,0 +1,1220 @@
+"""
+RTP and RTCP packets
+
+example from https://github.com/aiortc/aiortc/blob/main/src/aiortc/rtp.py
+"""
+from dataclasses import dataclass, field
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+from .structs import (
+    FEEDBACK_SSRCS,
+    FIR_ENTRY,
+    NACK_ITEM,
+    REMB_BITRATE,
+    REPORT_BLOCK,
+    REPORT_BLOCK_PACK,
+    RTCP_HEADER,
+    RTP_EXTENSION_HEADER,
+    RTP_HEADER,
+    SENDER_INFO,
+    UINT8,
+    UINT8_PAIR,
+    UINT32,
+    uint32_array,
+)
+
+try:
+    import numpy as np
+except ImportError:  # only needed by RtcpPacket.parse_report_blocks
+    np = None
+
+
+RTP_HEADER_LENGTH = 12
+RTP_MAX_PACKET_SIZE = 1500
+RTCP_HEADER_LENGTH = 4
+
+PACKETS_LOST_MIN = -(1 << 23)
+PACKETS_LOST_MAX = (1 << 23) - 1
+
+RTCP_SR = 200
+RTCP_RR = 201
+RTCP_SDES = 202
+RTCP_BYE = 203
+RTCP_RTPFB = 205
+RTCP_PSFB = 206
+
+RTCP_RTPFB_NACK = 1
+
+RTCP_PSFB_PLI = 1
+RTCP_PSFB_SLI = 2
+RTCP_PSFB_FIR = 4
+RTCP_PSFB_APP = 15
+
+RTCP_SDES_CNAME = 1
+
+RTP_EXTENSION_ONE_BYTE = 0xBEDE
+RTP_EXTENSION_TWO_BYTE = 0x1000
+
+if np is not None:
+    # a report block as laid out on the wire
+    _REPORT_BLOCK_DTYPE = np.dtype(
+        [
+            ("ssrc", ">u4"),
+            ("fraction_lost", "u1"),
+            ("packets_lost", "u1", (3,)),
+            ("highest_sequence", ">u4"),
+            ("jitter", ">u4"),
+            ("lsr", ">u4"),
+            ("dlsr", ">u4"),
+        ]
+    )
+
+    # decoded report blocks, see RtcpPacket.parse_report_blocks()
+    RECEIVER_INFO_DTYPE = np.dtype(
+        [
+            ("ssrc", "u4"),
+            ("fraction_lost", "u1"),
+            ("packets_lost", "i4"),
+            ("highest_sequence", "u4"),
+            ("jitter", "u4"),
+            ("lsr", "u4"),
+            ("dlsr", "u4"),
+        ]
+    )
+
+
+def pack_rtcp_packet(packet_type: int, count: int, payload: bytes) -> bytes:
+    assert len(payload) % 4 == 0
+    return RTCP_HEADER.pack((2 << 6) | count, packet_type, len(payload) // 4) + payload
+
+
+def pack_rtcp_header_into(
+    buf: bytearray, offset: int, packet_type: int, count: int, size: int
+) -> None:
+    """Write the header of a ``size`` bytes RTCP packet, header included."""
+    assert size % 4 == 0
+    RTCP_HEADER.pack_into(buf, offset, (2 << 6) | count, packet_type, size // 4 - 1)
+
+
+_PADDING = (b"", b"\x00", b"\x00" * 2, b"\x00" * 3, b"\x00" * 4)
+
+
+def _check_room(buf: bytearray, offset: int, size: int) -> None:
+    if len(buf) < offset + size:
+        raise ValueError("Buffer is too small for the RTCP packet")
+
+
+def _packet_bytes(packet) -> bytes:
+    buf = bytearray(packet.packed_size())
+    packet.pack_into(buf, 0)
+    return bytes(buf)
+
+
+def pack_packets_lost(count: int) -> bytes:
+    return (count & 0xFFFFFF).to_bytes(3, "big")
+
+
+def unpack_packets_lost(d: bytes) -> int:
+    return sign_extend_24((d[0] << 16) | (d[1] << 8) | d[2])
+
+
+def sign_extend_24(value: int) -> int:
+    """Two's complement value of the low 24 bits of ``value``."""
+    return ((value & 0xFFFFFF) ^ 0x800000) - 0x800000
+
+
+def _nack_pairs(lost: List[int]) -> Iterator[Tuple[int, int]]:
+    """Group ascending lost sequence numbers into generic NACK (PID, BLP) pairs."""
+    if lost:
+        pid = lost[0]
+        blp = 0
+        for p in lost[1:]:
+            d = (p - pid - 1) & 0xFFFF
+            if d < 16:
+                blp |= 1 << d
+            else:
+                yield pid, blp
+                pid = p
+                blp = 0
+        yield pid, blp
+
+
+def pack_nack_fci(lost: List[int]) -> bytes:
+    """Encode ascending lost sequence numbers as generic NACK (PID, BLP) pairs."""
+    return b"".join([NACK_ITEM.pack(pid, blp) for pid, blp in _nack_pairs(lost)])
+
+
+def unpack_nack_fci(data: bytes, pos: int, end: int) -> List[int]:
+    if (end - pos) % 4:
+        raise ValueError("RTCP generic NACK length is invalid")
+    lost = []
+    for offset in range(pos, end, 4):
+        pid, blp = NACK_ITEM.unpack_from(data, offset)
+        lost.append(pid)
+        for d in range(0, 16):
+            if (blp >> d) & 1:
+                lost.append((pid + d + 1) & 0xFFFF)
+    return lost
+
+
+def pack_fir_fci(requests: List[Tuple[int, int]]) -> bytes:
+    """Encode (ssrc, sequence number) Full Intra Request entries (RFC 5104)."""
+    return b"".join([FIR_ENTRY.pack(ssrc, seq & 0xFF) for ssrc, seq in requests])
+
+
+def unpack_fir_fci(data: bytes) -> List[Tuple[int, int]]:
+    if len(data) % 8:
+        raise ValueError("RTCP FIR length is invalid")
+    return [FIR_ENTRY.unpack_from(data, pos) for pos in range(0, len(data), 8)]
+
+
+def pack_remb_fci(bitrate: int, ssrcs: List[int]) -> bytes:
+    """
+    Pack the FCI for a Receiver Estimated Maximum Bitrate report.
+
+    https://tools.ietf.org/html/draft-alvestrand-rmcat-remb-03
+    """
+    data = b"REMB"
+    exponent = 0
+    mantissa = bitrate
+    while mantissa > 0x3FFFF:
+        mantissa >>= 1
+        exponent += 1
+    data += REMB_BITRATE.pack(
+        len(ssrcs), (exponent << 2) | (mantissa >> 16), (mantissa & 0xFFFF)
+    )
+    data += uint32_array(len(ssrcs)).pack(*ssrcs)
+    return data
+
+
+def unpack_remb_fci(data: bytes) -> Tuple[int, List[int]]:
+    """
+    Unpack the FCI for a Receiver Estimated Maximum Bitrate report.
+
+    https://tools.ietf.org/html/draft-alvestrand-rmcat-remb-03
+    """
+    if len(data) < 8 or data[0:4] != b"REMB":
+        raise ValueError("Invalid REMB prefix")
+    if len(data) != 8 + 4 * data[4]:
+        raise ValueError("REMB length is invalid")
+
+    exponent = (data[5] & 0xFC) >> 2
+    mantissa = ((data[5] & 0x03) << 16) | (data[6] << 8) | data[7]
+    bitrate = mantissa << exponent
+    ssrcs = list(uint32_array(data[4]).unpack_from(data, 8))
+    return (bitrate, ssrcs)
+
+
+@dataclass
+class RtcpReceiverInfo:
+    ssrc: int
+    fraction_lost: int
+    packets_lost: int
+    highest_sequence: int
+    jitter: int
+    lsr: int
+    dlsr: int
+
+    def __bytes__(self) -> bytes:
+        buf = bytearray(24)
+        self.pack_into(buf, 0)
+        return bytes(buf)
+
+    def pack_into(self, buf: bytearray, offset: int = 0) -> int:
+        """Write the 24-byte report block at ``buf[offset]``, returns the end offset."""
+        packets_lost = self.packets_lost & 0xFFFFFF
+        REPORT_BLOCK_PACK.pack_into(
+            buf,
+            offset,
+            self.ssrc,
+            self.fraction_lost,
+            packets_lost >> 16,
+            packets_lost & 0xFFFF,
+            self.highest_sequence,
+            self.jitter,
+            self.lsr,
+            self.dlsr,
+        )
+        return offset + 24
+
+    @classmethod
+    def parse(cls, data: bytes, pos: int = 0):
+        """Decode one 24-byte report block starting at ``data[pos]``.
+
+        ``data`` may be any buffer (bytes, bytearray or memoryview), the
+        fields are read in place with ``unpack_from`` so no slice is made.
+        """
+        ssrc, lost, highest_sequence, jitter, lsr, dlsr = REPORT_BLOCK.unpack_from(data, pos)
+        # positional arguments, this runs once per report block
+        return cls(
+            ssrc,
+            lost >> 24,
+            ((lost & 0xFFFFFF) ^ 0x800000) - 0x800000,
+            highest_sequence,
+            jitter,
+            lsr,
+            dlsr,
+        )
+
+
+@dataclass
+class RtcpRrPacket:
+    ssrc: int
+    reports: List[RtcpReceiverInfo] = field(default_factory=list)
+
+    def __bytes__(self) -> bytes:
+        return _packet_bytes(self)
+
+    def packed_size(self) -> int:
+        return 8 + 24 * len(self.reports)
+
+    def pack_into(self, buf: bytearray, offset: int = 0) -> int:
+        """Serialize into ``buf`` at ``offset``, returns the end offset."""
+        size = self.packed_size()
+        _check_room(buf, offset, size)
+        pack_rtcp_header_into(buf, offset, RTCP_RR, len(self.reports), size)
+        UINT32.pack_into(buf, offset + 4, self.ssrc)
+        pos = offset + 8
+        for report in self.reports:
+            pos = report.pack_into(buf, pos)
+        return pos
+
+    @classmethod
+    def parse(cls, data: bytes, count: int, pos: int = 0, end: Optional[int] = None):
+        """Decode a receiver report whose payload is ``data[pos:end]``."""
+        if end is None:
+            end = len(data)
+        if end - pos != 4 + 24 * count:
+            raise ValueError("RTCP receiver report length is invalid")
+
+        ssrc = UINT32.unpack_from(data, pos)[0]
+        pos += 4
+        reports = []
+        for r in range(count):
+            reports.append(RtcpReceiverInfo.parse(data, pos))
+            pos += 24
+        return cls(ssrc=ssrc, reports=reports)
+
+
+@dataclass
+class RtcpSenderInfo:
+    ntp_timestamp: int
+    rtp_timestamp: int
+    packet_count: int
+    octet_count: int
+
+    def __bytes__(self) -> bytes:
+        buf = bytearray(20)
+        self.pack_into(buf, 0)
+        return bytes(buf)
+
+    def pack_into(self, buf: bytearray, offset: int = 0) -> int:
+        SENDER_INFO.pack_into(
+            buf,
+            offset,
+            self.ntp_timestamp,
+            self.rtp_timestamp,
+            self.packet_count,
+            self.octet_count,
+        )
+        return offset + 20
+
+    @classmethod
+    def parse(cls, data: bytes, pos: int = 0):
+        ntp_timestamp, rtp_timestamp, packet_count, octet_count = SENDER_INFO.unpack_from(
+            data, pos
+        )
+        return cls(
+            ntp_timestamp=ntp_timestamp,
+            rtp_timestamp=rtp_timestamp,
+            packet_count=packet_count,
+            octet_count=octet_count,
+        )
+
+
+@dataclass
+class RtcpSourceInfo:
+    ssrc: int
+    items: List[Tuple[Any, bytes]]
+
+
+@dataclass
+class RtcpByePacket:
+    sources: List[int] = field(default_factory=list)
+    reason: bytes = b""
+
+    def __bytes__(self) -> bytes:
+        return _packet_bytes(self)
+
+    def packed_size(self) -> int:
+        size = 4 + 4 * len(self.sources)
+        if self.reason:
+            size += (len(self.reason) + 4) & ~3
+        return size
+
+    def pack_into(self, buf: bytearray, offset: int = 0) -> int:
+        """Serialize into ``buf`` at ``offset``, returns the end offset."""
+        size = self.packed_size()
+        _check_room(buf, offset, size)
+        count = len(self.sources)
+        pack_rtcp_header_into(buf, offset, RTCP_BYE, count, size)
+        uint32_array(count).pack_into(buf, offset + 4, *self.sources)
+        if self.reason:
+            pos = offset + 4 + 4 * count
+            UINT8.pack_into(buf, pos, len(self.reason))
+            pos += 1
+            buf[pos : pos + len(self.reason)] = self.reason
+            pos += len(self.reason)
+            buf[pos : offset + size] = _PADDING[offset + size - pos]
+        return offset + size
+
+    @classmethod
+    def parse(cls, data: bytes, count: int, pos: int = 0, end: Optional[int] = None):
+        if end is None:
+            end = len(data)
+        if end - pos < 4 * count:
+            raise ValueError("RTCP bye length is invalid")
+
+        sources = list(uint32_array(count).unpack_from(data, pos))
+        pos += 4 * count
+        reason = b""
+        if pos < end:
+            reason_length = data[pos]
+            pos += 1
+            if end - pos < reason_length:
+                raise ValueError("RTCP bye reason is truncated")
+            reason = bytes(data[pos : pos + reason_length])
+        return cls(sources=sources, reason=reason)
+
+
+@dataclass
+class RtcpPsfbPacket:
+    """
+    Payload-Specific Feedback Message (RFC 4585).
+
+    The FCI is kept as raw bytes, see pack_fir_fci() and pack_remb_fci()
+    for the FIR and REMB encodings. A PLI carries no FCI.
+    """
+
+    fmt: int
+    ssrc: int
+    media_ssrc: int
+    fci: bytes = b""
+
+    def __bytes__(self) -> bytes:
+        return _packet_bytes(self)
+
+    def packed_size(self) -> int:
+        return 12 + len(self.fci)
+
+    def pack_into(self, buf: bytearray, offset: int = 0) -> int:
+        """Serialize into ``buf`` at ``offset``, returns the end offset."""
+        size = self.packed_size()
+        _check_room(buf, offset, size)
+        pack_rtcp_header_into(buf, offset, RTCP_PSFB, self.fmt, size)
+        FEEDBACK_SSRCS.pack_into(buf, offset + 4, self.ssrc, self.media_ssrc)
+        buf[offset + 12 : offset + size] = self.fci
+        return offset + size
+
+    @classmethod
+    def parse(cls, data: bytes, fmt: int, pos: int = 0, end: Optional[int] = None):
+        if end is None:
+            end = len(data)
+        if end - pos < 8:
+            raise ValueError("RTCP payload-specific feedback length is invalid")
+
+        ssrc, media_ssrc = FEEDBACK_SSRCS.unpack_from(data, pos)
+        fci = bytes(data[pos + 8 : end])
+        return cls(fmt=fmt, ssrc=ssrc, media_ssrc=media_ssrc, fci=fci)
+
+
+@dataclass
+class RtcpRtpfbPacket:
+    """
+    Generic RTP Feedback Message (RFC 4585).
+
+    Generic NACKs are decoded into the ``lost`` sequence numbers, the FCI
+    of any other feedback format is kept as raw bytes.
+    """
+
+    fmt: int
+    ssrc: int
+    media_ssrc: int
+
+    # generic NACK
+    lost: List[int] = field(default_factory=list)
+    fci: bytes = b""
+
+    def __bytes__(self) -> bytes:
+        return _packet_bytes(self)
+
+    def packed_size(self) -> int:
+        if self.fmt == RTCP_RTPFB_NACK:
+            return 12 + NACK_ITEM.size * sum(1 for pair in _nack_pairs(self.lost))
+        return 12 + len(self.fci)
+
+    def pack_into(self, buf: bytearray, offset: int = 0) -> int:
+        """Serialize into ``buf`` at ``offset``, returns the end offset."""
+        if self.fmt == RTCP_RTPFB_NACK:
+            pairs = list(_nack_pairs(self.lost))
+            size = 12 + NACK_ITEM.size * len(pairs)
+        else:
+            size = 12 + len(self.fci)
+        _check_room(buf, offset, size)
+        pack_rtcp_header_into(buf, offset, RTCP_RTPFB, self.fmt, size)
+        FEEDBACK_SSRCS.pack_into(buf, offset + 4, self.ssrc, self.media_ssrc)
+        if self.fmt == RTCP_RTPFB_NACK:
+            for i, (pid, blp) in enumerate(pairs):
+                NACK_ITEM.pack_into(buf, offset + 12 + NACK_ITEM.size * i, pid, blp)
+        else:
+            buf[offset + 12 : offset + size] = self.fci
+        return offset + size
+
+    @classmethod
+    def parse(cls, data: bytes, fmt: int, pos: int = 0, end: Optional[int] = None):
+        if end is None:
+            end = len(data)
+        if end - pos < 8:
+            raise ValueError("RTCP RTP feedback length is invalid")
+
+        ssrc, media_ssrc = FEEDBACK_SSRCS.unpack_from(data, pos)
+        packet = cls(fmt=fmt, ssrc=ssrc, media_ssrc=media_ssrc)
+        if fmt == RTCP_RTPFB_NACK:
+            packet.lost = unpack_nack_fci(data, pos + 8, end)
+        else:
+            packet.fci = bytes(data[pos + 8 : end])
+        return packet
+
+
+@dataclass
+class RtcpSdesPacket:
+    chunks: List[RtcpSourceInfo] = field(default_factory=list)
+
+    def __bytes__(self) -> bytes:
+        return _packet_bytes(self)
+
+    def packed_size(self) -> int:
+        size = 4
+        for chunk in self.chunks:
+            length = 4
+            for d_type, d_value in chunk.items:
+                length += 2 + len(d_value)
+            # the item list ends with a null octet, padded to 32 bits
+            size += (length + 4) & ~3
+        return size
+
+    def pack_into(self, buf: bytearray, offset: int = 0) -> int:
+        """Serialize into ``buf`` at ``offset``, returns the end offset."""
+        size = self.packed_size()
+        _check_room(buf, offset, size)
+        pack_rtcp_header_into(buf, offset, RTCP_SDES, len(self.chunks), size)
+        pos = offset + 4
+        for chunk in self.chunks:
+            start = pos
+            UINT32.pack_into(buf, pos, chunk.ssrc)
+            pos += 4
+            for d_type, d_value in chunk.items:
+                UINT8_PAIR.pack_into(buf, pos, d_type, len(d_value))
+                pos += 2
+                buf[pos : pos + len(d_value)] = d_value
+                pos += len(d_value)
+            padding = 4 - (pos - start) % 4
+            buf[pos : pos + padding] = _PADDING[padding]
+            pos += padding
+        return pos
+
+    @classmethod
+    def parse(cls, data: bytes, count: int, pos: int = 0, end: Optional[int] = None):
+        if end is None:
+            end = len(data)
+        start = pos
+        chunks = []
+        for r in range(count):
+            if end < pos + 4:
+                raise ValueError("RTCP SDES source is truncated")
+            ssrc = UINT32.unpack_from(data, pos)[0]
+            pos += 4
+
+            items = []
+            while pos < end:
+                d_type = data[pos]
+                if d_type == 0:
+                    # skip the terminating null octet and the padding
+                    pos += 4 - (pos - start) % 4
+                    break
+                if end < pos + 2:
+                    raise ValueError("RTCP SDES item is truncated")
+                d_length = data[pos + 1]
+                pos += 2
+                if end < pos + d_length:
+                    raise ValueError("RTCP SDES item is truncated")
+                items.append((d_type, bytes(data[pos : pos + d_length])))
+                pos += d_length
+            chunks.append(RtcpSourceInfo(ssrc=ssrc, items=items))
+        return cls(chunks=chunks)
+
+
+@dataclass
+class RtcpSrPacket:
+    ssrc: int
+    sender_info: RtcpSenderInfo
+    reports: List[RtcpReceiverInfo] = field(default_factory=list)
+
+    def __bytes__(self) -> bytes:
+        return _packet_bytes(self)
+
+    def packed_size(self) -> int:
+        return 28 + 24 * len(self.reports)
+
+    def pack_into(self, buf: bytearray, offset: int = 0) -> int:
+        """Serialize into ``buf`` at ``offset``, returns the end offset."""
+        size = self.packed_size()
+        _check_room(buf, offset, size)
+        pack_rtcp_header_into(buf, offset, RTCP_SR, len(self.reports), size)
+        UINT32.pack_into(buf, offset + 4, self.ssrc)
+        pos = self.sender_info.pack_into(buf, offset + 8)
+        for report in self.reports:
+            pos = report.pack_into(buf, pos)
+        return pos
+
+    @classmethod
+    def parse(cls, data: bytes, count: int, pos: int = 0, end: Optional[int] = None):
+        if end is None:
+            end = len(data)
+        if end - pos != 24 + 24 * count:
+            raise ValueError("RTCP sender report length is invalid")
+
+        ssrc = UINT32.unpack_from(data, pos)[0]
+        sender_info = RtcpSenderInfo.parse(data, pos + 4)
+        pos += 24
+        reports = []
+        for r in range(count):
+            reports.append(RtcpReceiverInfo.parse(data, pos))
+            pos += 24
+        return cls(ssrc=ssrc, sender_info=sender_info, reports=reports)
+
+
+def _lazy_field(index: int, decode):
+    """A field of a lazily decoded record, see RtcpReceiverInfoView."""
+
+    def fget(self):
+        if self._values is None:
+            return decode(self._buffer, self._offset)
+        return self._values[index]
+
+    def fset(self, value):
+        if self._values is None:
+            self._values = list(self._astuple())
+        self._values[index] = value
+
+    return property(fget, fset)
+
+
+class RtcpReceiverInfoView:
+    """
+    Slotted, lazily decoded counterpart of RtcpReceiverInfo.
+
+    Only the backing buffer and the offset of the report block are kept,
+    each field is unpacked when it is read. The first assignment decodes
+    the block into a private list and the view stops using the buffer.
+    The buffer must not be modified while the view refers to it.
+    """
+
+    __slots__ = ("_buffer", "_offset", "_values")
+
+    def __init__(self, buffer: bytes, offset: int = 0):
+        self._buffer = buffer
+        self._offset = offset
+        self._values = None
+
+    ssrc = _lazy_field(0, lambda data, pos: UINT32.unpack_from(data, pos)[0])
+    fraction_lost = _lazy_field(1, lambda data, pos: data[pos + 4])
+    packets_lost = _lazy_field(
+        2, lambda data, pos: sign_extend_24(UINT32.unpack_from(data, pos + 4)[0])
+    )
+    highest_sequence = _lazy_field(3, lambda data, pos: UINT32.unpack_from(data, pos + 8)[0])
+    jitter = _lazy_field(4, lambda data, pos: UINT32.unpack_from(data, pos + 12)[0])
+    lsr = _lazy_field(5, lambda data, pos: UINT32.unpack_from(data, pos + 16)[0])
+    dlsr = _lazy_field(6, lambda data, pos: UINT32.unpack_from(data, pos + 20)[0])
+
+    @property
+    def modified(self) -> bool:
+        return self._values is not None
+
+    def _astuple(self) -> tuple:
+        if self._values is not None:
+            return tuple(self._values)
+        info = RtcpReceiverInfo.parse(self._buffer, self._offset)
+        return (
+            info.ssrc,
+            info.fraction_lost,
+            info.packets_lost,
+            info.highest_sequence,
+            info.jitter,
+            info.lsr,
+            info.dlsr,
+        )
+
+    def to_info(self) -> RtcpReceiverInfo:
+        return RtcpReceiverInfo(*self._astuple())
+
+    def __bytes__(self) -> bytes:
+        if self._values is None:
+            return bytes(self._buffer[self._offset : self._offset + 24])
+        return bytes(self.to_info())
+
+    def pack_into(self, buf: bytearray, offset: int = 0) -> int:
+        if self._values is None:
+            with memoryview(self._buffer) as view:
+                buf[offset : offset + 24] = view[self._offset : self._offset + 24]
+            return offset + 24
+        return self.to_info().pack_into(buf, offset)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RtcpReceiverInfoView):
+            return self._astuple() == other._astuple()
+        if isinstance(other, RtcpReceiverInfo):
+            return self.to_info() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(self.to_info()).replace("RtcpReceiverInfo", type(self).__name__, 1)
+
+    @classmethod
+    def parse(cls, data: bytes, pos: int = 0):
+        if len(data) < pos + 24:
+            raise ValueError("RTCP report block is truncated")
+        return cls(data, pos)
+
+
+class RtcpRrPacketView:
+    """
+    Slotted, lazily decoded counterpart of RtcpRrPacket.
+
+    The report blocks are RtcpReceiverInfoView objects, created on first
+    access to ``reports``. bytes() returns the original packet as long as
+    neither the sender SSRC nor any report was changed.
+    """
+
+    __slots__ = ("_buffer", "_offset", "_count", "_ssrc", "_reports")
+
+    def __init__(self, buffer: bytes, offset: int, count: int):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+        self._ssrc = None
+        self._reports = None
+
+    @property
+    def ssrc(self) -> int:
+        if self._ssrc is None:
+            return UINT32.unpack_from(self._buffer, self._offset)[0]
+        return self._ssrc
+
+    @ssrc.setter
+    def ssrc(self, value: int) -> None:
+        self._ssrc = value
+
+    @property
+    def reports(self) -> List[RtcpReceiverInfoView]:
+        if self._reports is None:
+            pos = self._offset + 4
+            self._reports = [
+                RtcpReceiverInfoView(self._buffer, pos + 24 * r)
+                for r in range(self._count)
+            ]
+        return self._reports
+
+    @reports.setter
+    def reports(self, value: List[RtcpReceiverInfoView]) -> None:
+        self._reports = value
+
+    @property
+    def modified(self) -> bool:
+        if self._ssrc is not None:
+            return True
+        if self._reports is None:
+            return False
+        if len(self._reports) != self._count:
+            return True
+        pos = self._offset + 4
+        for r, report in enumerate(self._reports):
+            if (
+                not isinstance(report, RtcpReceiverInfoView)
+                or report._values is not None
+                or report._buffer is not self._buffer
+                or report._offset != pos + 24 * r
+            ):
+                return True
+        return False
+
+    def to_packet(self) -> RtcpRrPacket:
+        return RtcpRrPacket(
+            ssrc=self.ssrc,
+            reports=[
+                r.to_info() if isinstance(r, RtcpReceiverInfoView) else r
+                for r in self.reports
+            ],
+        )
+
+    def __bytes__(self) -> bytes:
+        header = self._offset - RTCP_HEADER_LENGTH
+        if not self.modified and not self._buffer[header] & 0x20:
+            return bytes(self._buffer[header : self._offset + 4 + 24 * self._count])
+        return bytes(self.to_packet())
+
+    def packed_size(self) -> int:
+        count = self._count if self._reports is None else len(self._reports)
+        return 8 + 24 * count
+
+    def pack_into(self, buf: bytearray, offset: int = 0) -> int:
+        """Serialize into ``buf`` at ``offset``, returns the end offset."""
+        header = self._offset - RTCP_HEADER_LENGTH
+        if not self.modified and not self._buffer[header] & 0x20:
+            size = self.packed_size()
+            _check_room(buf, offset, size)
+            with memoryview(self._buffer) as view:
+                buf[offset : offset + size] = view[header : header + size]
+            return offset + size
+        return self.to_packet().pack_into(buf, offset)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (RtcpRrPacketView, RtcpRrPacket)):
+            return self.ssrc == other.ssrc and self.reports == other.reports
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(ssrc={self.ssrc!r}, reports={self.reports!r})"
+
+    @classmethod
+    def parse(cls, data: bytes, count: int, pos: int = 0, end: Optional[int] = None):
+        """Wrap the receiver report whose payload is ``data[pos:end]``.
+
+        ``pos`` must follow the 4-byte RTCP header in ``data``.
+        """
+        if end is None:
+            end = len(data)
+        if end - pos != 4 + 24 * count:
+            raise ValueError("RTCP receiver report length is invalid")
+        return cls(data, pos, count)
+
+
+AnyRtcpPacket = Union[
+    RtcpByePacket,
+    RtcpPsfbPacket,
+    RtcpRrPacket,
+    RtcpRtpfbPacket,
+    RtcpSdesPacket,
+    RtcpSrPacket,
+    RtcpRrPacketView,
+]
+
+RTCP_PACKET_CLASSES = {
+    RTCP_SR: RtcpSrPacket,
+    RTCP_RR: RtcpRrPacket,
+    RTCP_SDES: RtcpSdesPacket,
+    RTCP_BYE: RtcpByePacket,
+    RTCP_RTPFB: RtcpRtpfbPacket,
+    RTCP_PSFB: RtcpPsfbPacket,
+}
+
+# parse methods indexed by packet type, None for types we do not decode
+_RTCP_PARSERS = tuple(
+    RTCP_PACKET_CLASSES[t].parse if t in RTCP_PACKET_CLASSES else None
+    for t in range(256)
+)
+
+# same table, with receiver reports decoded lazily from the original buffer
+_RTCP_LAZY_PARSERS = tuple(
+    RtcpRrPacketView.parse if t == RTCP_RR else parser
+    for t, parser in enumerate(_RTCP_PARSERS)
+)
+
+
+def iter_rtcp_packets(data: bytes) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Walk the headers of a compound RTCP packet.
+
+    Yields ``(packet_type, count, start, end)`` for each packet, where
+    ``data[start:end]`` is its payload with any padding removed.
+    """
+    pos = 0
+    data_len = len(data)
+
+    while pos < data_len:
+        if data_len < pos + RTCP_HEADER_LENGTH:
+            raise ValueError(
+                f"RTCP packet length is less than {RTCP_HEADER_LENGTH} bytes"
+            )
+
+        v_p_count, packet_type, length = RTCP_HEADER.unpack_from(data, pos)
+        version = v_p_count >> 6
+        padding = (v_p_count >> 5) & 1
+        count = v_p_count & 0x1F
+        if version != 2:
+            raise ValueError("RTCP packet has invalid version")
+        pos += 4
+
+        end = pos + length * 4
+        if data_len < end:
+            raise ValueError("RTCP packet is truncated")
+        start = pos
+        pos = end
+
+        if padding:
+            padding_length = data[end - 1] if end > start else 0
+            if not padding_length or padding_length > end - start:
+                raise ValueError("RTCP packet padding length is invalid")
+            end -= padding_length
+
+        yield packet_type, count, start, end
+
+
+class RtcpPacket:
+    @classmethod
+    def parse(cls, data: bytes, lazy: bool = False) -> List[AnyRtcpPacket]:
+        """
+        Decode a compound RTCP packet.
+
+        With ``lazy=True`` receiver reports are returned as RtcpRrPacketView
+        objects which keep a reference to ``data`` and decode on access.
+        """
+        # walk the compound packet with offsets over a single memoryview,
+        # sub-packet payloads are never copied out of ``data``
+        with memoryview(data) as view:
+            packets = []
+            if lazy:
+                parsers = _RTCP_LAZY_PARSERS
+                source = data
+            else:
+                parsers = _RTCP_PARSERS
+                source = view
+            for packet_type, count, start, end in iter_rtcp_packets(view):
+                parser = parsers[packet_type]
+                if parser is not None:
+                    packets.append(parser(source, count, start, end))
+            return packets
+
+    @classmethod
+    def parse_report_blocks(cls, data: bytes) -> "np.ndarray":
+        """
+        Decode every report block of the SR and RR packets in ``data``.
+
+        ``data`` may hold any number of concatenated RTCP packets. The
+        blocks are returned as one structured array of RECEIVER_INFO_DTYPE,
+        with the same values RtcpReceiverInfo.parse would produce, without
+        creating a Python object per block. Requires numpy.
+        """
+        if np is None:
+            raise RuntimeError("numpy is required to batch decode report blocks")
+
+        # a zero-copy view of each packet's blocks, one copy to join them
+        parts = []
+        for packet_type, count, start, end in iter_rtcp_packets(data):
+            if packet_type == RTCP_RR:
+                if end - start != 4 + 24 * count:
+                    raise ValueError("RTCP receiver report length is invalid")
+                offset = start + 4
+            elif packet_type == RTCP_SR:
+                if end - start != 24 + 24 * count:
+                    raise ValueError("RTCP sender report length is invalid")
+                offset = start + 24
+            else:
+                continue
+            if count:
+                parts.append(np.frombuffer(data, _REPORT_BLOCK_DTYPE, count=count, offset=offset))
+        if parts:
+            blocks = np.concatenate(parts)
+        else:
+            blocks = np.empty(0, dtype=_REPORT_BLOCK_DTYPE)
+        total = len(blocks)
+
+        lost = blocks["packets_lost"].astype(np.int32)
+        packets_lost = (lost[:, 0] << 16) | (lost[:, 1] << 8) | lost[:, 2]
+        packets_lost -= (packets_lost & 0x800000) << 1
+
+        reports = np.empty(total, dtype=RECEIVER_INFO_DTYPE)
+        for name in ("ssrc", "fraction_lost", "highest_sequence", "jitter", "lsr", "dlsr"):
+            reports[name] = blocks[name]
+        reports["packets_lost"] = packets_lost
+        return reports
+
+
+class RtcpCompoundBuilder:
+    """
+    Serializes compound RTCP packets into one reusable bytearray.
+
+        builder = RtcpCompoundBuilder()
+        builder.add(sr, rr, sdes)
+        sock.send(builder.getbuffer())
+        builder.clear()
+
+    The buffer grows when a packet does not fit and is then kept for the
+    next compound packet, so a steady send path does not allocate.
+    """
+
+    def __init__(self, size: int = 1500):
+        self._buffer = bytearray(size)
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bytes__(self) -> bytes:
+        return bytes(self._buffer[: self._length])
+
+    def add(self, *packets: AnyRtcpPacket) -> "RtcpCompoundBuilder":
+        for packet in packets:
+            end = self._length + packet.packed_size()
+            if end > len(self._buffer):
+                self._buffer.extend(bytes(max(end, 2 * len(self._buffer)) - len(self._buffer)))
+            self._length = packet.pack_into(self._buffer, self._length)
+        return self
+
+    def getbuffer(self) -> memoryview:
+        """A view of the packets added so far, release it before the next add()."""
+        return memoryview(self._buffer)[: self._length]
+
+    def clear(self) -> None:
+        self._length = 0
+
+
+def is_rtcp(data: bytes) -> bool:
+    """
+    Tell RTCP from RTP on a multiplexed port (RFC 5761).
+
+    The second octet of RTCP is a packet type in 192-223, RTP payload types
+    are kept out of the matching 64-95 range.
+    """
+    return len(data) >= 2 and 192 <= data[1] <= 223
+
+
+def unpack_header_extensions(data: bytes, profile: int, pos: int, end: int) -> List[Tuple[int, bytes]]:
+    """
+    Parse one-byte or two-byte header extension elements (RFC 8285).
+
+    Unknown profiles are returned as a single element with id 0.
+    """
+    extensions = []
+    if profile == RTP_EXTENSION_ONE_BYTE:
+        while pos < end:
+            x_id = data[pos] >> 4
+            if x_id == 0:
+                # padding
+                pos += 1
+                continue
+            if x_id == 15:
+                break
+            x_length = (data[pos] & 0x0F) + 1
+            pos += 1
+            if end < pos + x_length:
+                raise ValueError("RTP one-byte header extension value is truncated")
+            extensions.append((x_id, bytes(data[pos : pos + x_length])))
+            pos += x_length
+    elif profile & 0xFFF0 == RTP_EXTENSION_TWO_BYTE:
+        while pos < end:
+            x_id = data[pos]
+            if x_id == 0:
+                pos += 1
+                continue
+            if end < pos + 2:
+                raise ValueError("RTP two-byte header extension is truncated")
+            x_length = data[pos + 1]
+            pos += 2
+            if end < pos + x_length:
+                raise ValueError("RTP two-byte header extension value is truncated")
+            extensions.append((x_id, bytes(data[pos : pos + x_length])))
+            pos += x_length
+    else:
+        extensions.append((0, bytes(data[pos:end])))
+    return extensions
+
+
+class RtpPacket:
+    """
+    RTP packet (RFC 3550) decoded in place from a reusable buffer.
+
+    Only the fixed header is decoded by parse_buffer(), the CSRC list,
+    header extensions and payload are read from the buffer on access.
+    Packets normally come from a RtpPacketPool:
+
+        packet = pool.recv(sock)
+        handle(packet.sequence_number, packet.payload)
+        packet.release()
+    """
+
+    __slots__ = (
+        "buffer",
+        "length",
+        "marker",
+        "payload_type",
+        "sequence_number",
+        "timestamp",
+        "ssrc",
+        "csrc_count",
+        "extension_profile",
+        "extension_offset",
+        "extension_length",
+        "payload_offset",
+        "padding_size",
+        "_pool",
+        "_free",
+    )
+
+    def __init__(self, size: int = RTP_MAX_PACKET_SIZE, pool=None):
+        self.buffer = bytearray(size)
+        self.length = 0
+        self.marker = 0
+        self.payload_type = 0
+        self.sequence_number = 0
+        self.timestamp = 0
+        self.ssrc = 0
+        self.csrc_count = 0
+        self.extension_profile = None
+        self.extension_offset = 0
+        self.extension_length = 0
+        self.payload_offset = RTP_HEADER_LENGTH
+        self.padding_size = 0
+        self._pool = pool
+        self._free = pool is not None  # on the pool's free list
+
+    def __repr__(self) -> str:
+        return (
+            f"RtpPacket(seq={self.sequence_number}, ts={self.timestamp}, "
+            f"marker={self.marker}, payload={self.payload_length}, ssrc={self.ssrc})"
+        )
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.buffer[: self.length])
+
+    @classmethod
+    def parse(cls, data: bytes) -> "RtpPacket":
+        """Decode a standalone packet, copying ``data`` into a new buffer."""
+        packet = cls(len(data))
+        packet.buffer[:] = data
+        packet.parse_buffer(len(data))
+        return packet
+
+    def parse_buffer(self, length: int) -> "RtpPacket":
+        """Decode the header of the ``length`` bytes received into ``buffer``."""
+        data = self.buffer
+        if length < RTP_HEADER_LENGTH:
+            raise ValueError(
+                f"RTP packet length is less than {RTP_HEADER_LENGTH} bytes"
+            )
+
+        v_p_x_cc, m_pt, sequence_number, timestamp, ssrc = RTP_HEADER.unpack_from(data, 0)
+        version = v_p_x_cc >> 6
+        padding = (v_p_x_cc >> 5) & 1
+        extension = (v_p_x_cc >> 4) & 1
+        cc = v_p_x_cc & 0x0F
+        if version != 2:
+            raise ValueError("RTP packet has invalid version")
+        pos = RTP_HEADER_LENGTH + 4 * cc
+        if length < pos:
+            raise ValueError("RTP packet has truncated CSRC")
+
+        self.extension_profile = None
+        self.extension_offset = self.extension_length = 0
+        if extension:
+            if length < pos + 4:
+                raise ValueError("RTP packet has truncated extension profile / length")
+            extension_profile, extension_length = RTP_EXTENSION_HEADER.unpack_from(data, pos)
+            extension_length *= 4
+            pos += 4
+            if length < pos + extension_length:
+                raise ValueError("RTP packet has truncated extension value")
+            self.extension_profile = extension_profile
+            self.extension_offset = pos
+            self.extension_length = extension_length
+            pos += extension_length
+
+        padding_size = 0
+        if padding:
+            padding_size = data[length - 1]
+            if not padding_size or length < pos + padding_size:
+                raise ValueError("RTP packet padding length is invalid")
+
+        self.length = length
+        self.marker = m_pt >> 7
+        self.payload_type = m_pt & 0x7F
+        self.sequence_number = sequence_number
+        self.timestamp = timestamp
+        self.ssrc = ssrc
+        self.csrc_count = cc
+        self.payload_offset = pos
+        self.padding_size = padding_size
+        return self
+
+    @property
+    def csrc(self) -> List[int]:
+        return list(uint32_array(self.csrc_count).unpack_from(self.buffer, RTP_HEADER_LENGTH))
+
+    @property
+    def extensions(self) -> List[Tuple[int, bytes]]:
+        if self.extension_profile is None:
+            return []
+        return unpack_header_extensions(
+            self.buffer,
+            self.extension_profile,
+            self.extension_offset,
+            self.extension_offset + self.extension_length,
+        )
+
+    @property
+    def payload_length(self) -> int:
+        return self.length - self.padding_size - self.payload_offset
+
+    @property
+    def payload(self) -> memoryview:
+        """The payload as a view of ``buffer``, valid until the packet is released."""
+        return memoryview(self.buffer)[
+            self.payload_offset : self.length - self.padding_size
+        ]
+
+    def release(self) -> None:
+        """Hand the packet back to the pool it was acquired from."""
+        if self._pool is not None:
+            self._pool.release(self)
+
+
+class RtpPacketPool:
+    """
+    Free list of preallocated RtpPacket buffers for a receive loop.
+
+    recv() receives straight into a pooled buffer with recv_into, so the
+    steady state of a loop which releases its packets does not allocate
+    packet buffers. The pool grows when every packet is in use.
+    """
+
+    def __init__(self, count: int = 64, size: int = RTP_MAX_PACKET_SIZE):
+        self._size = size
+        self._free = [RtpPacket(size, self) for i in range(count)]
+        self.allocated = count
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+    def acquire(self) -> RtpPacket:
+        if self._free:
+            packet = self._free.pop()
+        else:
+            self.allocated += 1
+            packet = RtpPacket(self._size, self)
+        packet._free = False
+        return packet
+
+    def release(self, packet: RtpPacket) -> None:
+        if packet._free:
+            raise ValueError("RTP packet was released twice")
+        packet._free = True
+        self._free.append(packet)
+
+    def recv(self, sock) -> RtpPacket:
+        """Receive and decode one RTP packet, invalid packets are released and raise ValueError."""
+        packet = self.acquire()
+        try:
+            return packet.parse_buffer(sock.recv_into(packet.buffer))
+        except BaseException:
+            self.release(packet)
+            raise
@@ -0,0 +1,52 @@
+"""
+Precompiled struct.Struct objects for the RTCP codec
+
+``struct.unpack("!BBH", ...)`` looks the format up in the struct module
+cache on every call; binding the compiled Struct once skips that lookup
+on the per-packet path.
+
+There is no switch to turn this off: a compiled Struct packs and unpacks
+exactly like the format string it was built from, so turning it off would
+only bring back the lookup. uint32_array() is the only real cache, bounded
+at 64 formats.
+"""
+from functools import lru_cache
+from struct import Struct
+
+# V/P/count, packet type, length in 32-bit words minus one
+RTCP_HEADER = Struct("!BBH")
+
+# SSRC, fraction lost << 24 | packets lost, highest sequence, jitter, LSR, DLSR
+REPORT_BLOCK = Struct("!LLLLLL")
+REPORT_BLOCK_PACK = Struct("!LBBHLLLL")
+
+# NTP timestamp, RTP timestamp, packet count, octet count
+SENDER_INFO = Struct("!QLLL")
+
+# sender SSRC, media source SSRC of a feedback message
+FEEDBACK_SSRCS = Struct("!LL")
+
+# generic NACK packet id and bitmask of following lost packets
+NACK_ITEM = Struct("!HH")
+
+# SSRC, command sequence number, reserved
+FIR_ENTRY = Struct("!LBxxx")
+
+# number of SSRCs, exponent and mantissa of the bitrate
+REMB_BITRATE = Struct("!BBH")
+
+# V/P/X/CC, M/PT, sequence number, timestamp, SSRC
+RTP_HEADER = Struct("!BBHLL")
+
+# extension profile and length in 32-bit words
+RTP_EXTENSION_HEADER = Struct("!HH")
+
+UINT8 = Struct("!B")
+UINT8_PAIR = Struct("!BB")
+UINT32 = Struct("!L")
+
+
+@lru_cache(maxsize=64)
+def uint32_array(count: int) -> Struct:
+    """Struct for ``count`` consecutive SSRCs (BYE sources, CSRC, REMB)."""
+    return Struct("!%dL" % count)
@@ -0,0 +1,62 @@
+"""
+pytest-benchmark suite for the RTCP codec in src/lib/rtcp
+
+Compares the packaged codec with the original slice / concatenation
+based implementation kept in example/rtcp_benchmark.py.
+
+    $ pytest test/bench_rtcp.py --benchmark-group-by=group
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+# the repository root for src.lib.rtcp, example/ for the legacy implementation
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
+
+import rtcp_benchmark
+from src.lib import rtcp
+
+COMPOUND = rtcp_benchmark.make_compound(2, 31)
+RR = rtcp.RtcpPacket.parse(COMPOUND)[0]
+
+
+@pytest.mark.benchmark(group="rr-parse")
+def test_parse_legacy(benchmark):
+    assert benchmark(rtcp_benchmark.legacy_parse, COMPOUND)[0] == RR
+
+
+@pytest.mark.benchmark(group="rr-parse")
+def test_parse(benchmark):
+    assert benchmark(rtcp.RtcpPacket.parse, COMPOUND)[0] == RR
+
+
+@pytest.mark.benchmark(group="rr-parse")
+def test_parse_lazy(benchmark):
+    assert benchmark(rtcp.RtcpPacket.parse, COMPOUND, lazy=True)[0] == RR
+
+
+@pytest.mark.benchmark(group="rr-parse")
+def test_parse_report_blocks(benchmark):
+    pytest.importorskip("numpy")
+    assert len(benchmark(rtcp.RtcpPacket.parse_report_blocks, COMPOUND)) == 62
+
+
+@pytest.mark.benchmark(group="rr-serialize")
+def test_serialize_legacy(benchmark):
+    assert benchmark(rtcp_benchmark.legacy_serialize, RR) == bytes(RR)
+
+
+@pytest.mark.benchmark(group="rr-serialize")
+def test_serialize(benchmark):
+    assert benchmark(bytes, RR) == COMPOUND[: RR.packed_size()]
+
+
+@pytest.mark.benchmark(group="rr-serialize")
+def test_serialize_pack_into(benchmark):
+    buf = bytearray(RR.packed_size())
+    benchmark(RR.pack_into, buf, 0)
+    assert buf == bytes(RR)
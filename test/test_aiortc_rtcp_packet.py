@@ -2,7 +2,7 @@ import unittest
 import sys
 import os
 
-sys.path.append("../example")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
 
 import aiortc_rtcp_packet as aio
 
@@ -29,5 +29,239 @@ class RtcpPacketTest(unittest.TestCase):
         self.assertEqual(packet.reports[0].dlsr, 0)
         self.assertEqual(bytes(packet), data)
 
+    def test_rr_memoryview(self):
+        data = load("rtcp_rr.bin")
+        self.assertEqual(aio.RtcpPacket.parse(memoryview(data)), aio.RtcpPacket.parse(data))
+        self.assertEqual(aio.RtcpPacket.parse(bytearray(data)), aio.RtcpPacket.parse(data))
+
+    def test_rr_packets_lost_negative(self):
+        report = aio.RtcpReceiverInfo(
+            ssrc=1, fraction_lost=255, packets_lost=aio.PACKETS_LOST_MIN,
+            highest_sequence=2, jitter=3, lsr=4, dlsr=5)
+        packet = aio.RtcpRrPacket(ssrc=6, reports=[report])
+        self.assertEqual(aio.RtcpPacket.parse(bytes(packet)), [packet])
+
+    def test_rr_padding(self):
+        data = load("rtcp_rr.bin")
+        padded = bytes([data[0] | 0x20, data[1]]) + (len(data) // 4).to_bytes(2, "big")
+        padded += data[4:] + b"\x00\x00\x00\x04"
+        self.assertEqual(aio.RtcpPacket.parse(padded), aio.RtcpPacket.parse(data))
+
+    def test_truncated(self):
+        data = load("rtcp_rr.bin")
+        with self.assertRaises(ValueError):
+            aio.RtcpPacket.parse(data[:-1])
+
+    def test_sr(self):
+        packet = aio.RtcpSrPacket(
+            ssrc=1831097322,
+            sender_info=aio.RtcpSenderInfo(
+                ntp_timestamp=16016567581311369308,
+                rtp_timestamp=1722342718,
+                packet_count=269,
+                octet_count=13557,
+            ),
+            reports=[aio.RtcpReceiverInfo(
+                ssrc=2398654957, fraction_lost=0, packets_lost=-3,
+                highest_sequence=246, jitter=127, lsr=0, dlsr=0)],
+        )
+        data = bytes(packet)
+        self.assertEqual(len(data), 52)
+        self.assertEqual(aio.RtcpPacket.parse(data), [packet])
+
+    def test_sdes(self):
+        packet = aio.RtcpSdesPacket(chunks=[
+            aio.RtcpSourceInfo(ssrc=1, items=[(aio.RTCP_SDES_CNAME, b"{63f459ea}")]),
+            aio.RtcpSourceInfo(ssrc=2, items=[(aio.RTCP_SDES_CNAME, b"ab"), (2, b"name")]),
+        ])
+        data = bytes(packet)
+        self.assertEqual(len(data) % 4, 0)
+        self.assertEqual(aio.RtcpPacket.parse(data), [packet])
+
+    def test_bye(self):
+        for packet in (aio.RtcpByePacket(sources=[2924645187]),
+                       aio.RtcpByePacket(sources=[1, 2], reason=b"shutdown")):
+            self.assertEqual(aio.RtcpPacket.parse(bytes(packet)), [packet])
+
+    def test_rtpfb_nack(self):
+        packet = aio.RtcpRtpfbPacket(
+            fmt=aio.RTCP_RTPFB_NACK, ssrc=2336520123, media_ssrc=4145934052,
+            lost=[12, 32, 39, 54, 76, 110, 123, 142, 183, 187, 223, 236, 271, 292, 65535, 3])
+        data = bytes(packet)
+        self.assertEqual(aio.RtcpPacket.parse(data), [packet])
+
+    def test_psfb(self):
+        pli = aio.RtcpPsfbPacket(fmt=aio.RTCP_PSFB_PLI, ssrc=1414554213, media_ssrc=587284409)
+        fir = aio.RtcpPsfbPacket(fmt=aio.RTCP_PSFB_FIR, ssrc=1, media_ssrc=0,
+                                 fci=aio.pack_fir_fci([(587284409, 7)]))
+        remb = aio.RtcpPsfbPacket(fmt=aio.RTCP_PSFB_APP, ssrc=1, media_ssrc=0,
+                                  fci=aio.pack_remb_fci(4160000, [1215622422]))
+        data = bytes(pli) + bytes(fir) + bytes(remb)
+        packets = aio.RtcpPacket.parse(data)
+        self.assertEqual(packets, [pli, fir, remb])
+        self.assertEqual(aio.unpack_fir_fci(packets[1].fci), [(587284409, 7)])
+        self.assertEqual(aio.unpack_remb_fci(packets[2].fci), (4160000, [1215622422]))
+
+    def test_compound(self):
+        data = load("rtcp_rr.bin")
+        bye = aio.RtcpByePacket(sources=[817267719])
+        unknown = aio.pack_rtcp_packet(204, 0, b"\x00" * 8)
+        packets = aio.RtcpPacket.parse(data + unknown + bytes(bye))
+        self.assertEqual(len(packets), 2)
+        self.assertIsInstance(packets[0], aio.RtcpRrPacket)
+        self.assertEqual(packets[1], bye)
+
+    @unittest.skipIf(aio.np is None, "numpy is not installed")
+    def test_parse_report_blocks(self):
+        rr = aio.RtcpPacket.parse(load("rtcp_rr.bin"))[0]
+        reports = [
+            aio.RtcpReceiverInfo(
+                ssrc=0xFFFFFFF0 + i, fraction_lost=i * 40, packets_lost=lost,
+                highest_sequence=70000 + i, jitter=i, lsr=0xFFFFFFFF - i, dlsr=i << 16)
+            for i, lost in enumerate([0, -1, 5, aio.PACKETS_LOST_MIN, aio.PACKETS_LOST_MAX])
+        ]
+        sr = aio.RtcpSrPacket(
+            ssrc=1, sender_info=aio.RtcpSenderInfo(1, 2, 3, 4), reports=reports[:2])
+        data = bytes(rr) + bytes(aio.RtcpByePacket(sources=[1])) + bytes(sr)
+        data += bytes(aio.RtcpRrPacket(ssrc=2, reports=reports[2:])) + bytes(aio.RtcpRrPacket(ssrc=3))
+
+        expected = [r for p in aio.RtcpPacket.parse(data) if hasattr(p, "reports") for r in p.reports]
+        blocks = aio.RtcpPacket.parse_report_blocks(data)
+        self.assertEqual(blocks.dtype, aio.RECEIVER_INFO_DTYPE)
+        self.assertEqual(len(blocks), 6)
+        for block, report in zip(blocks, expected):
+            self.assertEqual(aio.RtcpReceiverInfo(*block.tolist()), report)
+        self.assertEqual(len(aio.RtcpPacket.parse_report_blocks(b"")), 0)
+
+    def test_rr_lazy(self):
+        data = load("rtcp_rr.bin")
+        packets = aio.RtcpPacket.parse(data, lazy=True)
+        packet = packets[0]
+        self.assertIsInstance(packet, aio.RtcpRrPacketView)
+        self.assertFalse(hasattr(packet, "__dict__"))
+        self.assertFalse(hasattr(packet.reports[0], "__dict__"))
+        self.assertEqual(packets, aio.RtcpPacket.parse(data))
+        self.assertEqual(packet.reports[0].jitter, 1906)
+        self.assertEqual(bytes(packet), data)
+        self.assertFalse(packet.modified)
+
+        packet.reports[0].packets_lost = -2
+        self.assertTrue(packet.modified)
+        self.assertEqual(packet.reports[0].jitter, 1906)
+        expected = aio.RtcpPacket.parse(data)[0]
+        expected.reports[0].packets_lost = -2
+        self.assertEqual(bytes(packet), bytes(expected))
+        self.assertEqual(aio.RtcpPacket.parse(bytes(packet)), [expected])
+
+    def test_rr_lazy_invalid(self):
+        data = load("rtcp_rr.bin")
+        with self.assertRaises(ValueError):
+            aio.RtcpRrPacketView.parse(data, 2, 4)
+
+    def test_pack_into(self):
+        packets = [
+            aio.RtcpPacket.parse(load("rtcp_rr.bin"))[0],
+            aio.RtcpSrPacket(ssrc=1, sender_info=aio.RtcpSenderInfo(1, 2, 3, 4)),
+            aio.RtcpSdesPacket(chunks=[aio.RtcpSourceInfo(ssrc=1, items=[(1, b"abc")])]),
+            aio.RtcpByePacket(sources=[1], reason=b"bye"),
+            aio.RtcpRtpfbPacket(fmt=aio.RTCP_RTPFB_NACK, ssrc=1, media_ssrc=2, lost=[1, 3]),
+            aio.RtcpPsfbPacket(fmt=aio.RTCP_PSFB_PLI, ssrc=1, media_ssrc=2),
+            aio.RtcpPacket.parse(load("rtcp_rr.bin"), lazy=True)[0],
+        ]
+        for packet in packets:
+            buf = bytearray(b"\xff" * (packet.packed_size() + 6))
+            self.assertEqual(packet.pack_into(buf, 3), 3 + packet.packed_size())
+            self.assertEqual(buf[3:-3], bytes(packet))
+            self.assertEqual(buf[:3] + buf[-3:], b"\xff" * 6)
+            with self.assertRaises(ValueError):
+                packet.pack_into(bytearray(packet.packed_size() - 1))
+
+    def test_compound_builder(self):
+        rr = aio.RtcpPacket.parse(load("rtcp_rr.bin"))[0]
+        sr = aio.RtcpSrPacket(ssrc=1, sender_info=aio.RtcpSenderInfo(1, 2, 3, 4), reports=rr.reports)
+        sdes = aio.RtcpSdesPacket(chunks=[aio.RtcpSourceInfo(ssrc=1, items=[(1, b"cname")])])
+        builder = aio.RtcpCompoundBuilder(size=16)
+        builder.add(sr, rr, sdes)
+        self.assertEqual(bytes(builder), bytes(sr) + bytes(rr) + bytes(sdes))
+        with builder.getbuffer() as view:
+            self.assertEqual(aio.RtcpPacket.parse(view), [sr, rr, sdes])
+
+        builder.clear()
+        builder.add(rr)
+        self.assertEqual(bytes(builder), bytes(rr))
+        self.assertEqual(len(builder), rr.packed_size())
+
+
+class RtpPacketTest(unittest.TestCase):
+    def test_rtp(self):
+        data = bytes([0x80, 0xE0, 0x01, 0x02]) + (1000).to_bytes(4, "big")
+        data += (0x12345678).to_bytes(4, "big") + b"payload"
+        packet = aio.RtpPacket.parse(data)
+        self.assertEqual(packet.marker, 1)
+        self.assertEqual(packet.payload_type, 96)
+        self.assertEqual(packet.sequence_number, 258)
+        self.assertEqual(packet.timestamp, 1000)
+        self.assertEqual(packet.ssrc, 0x12345678)
+        self.assertEqual(packet.csrc, [])
+        self.assertEqual(packet.extensions, [])
+        self.assertEqual(bytes(packet.payload), b"payload")
+        self.assertEqual(bytes(packet), data)
+
+    def test_rtp_csrc_extensions_padding(self):
+        one_byte = bytes([0x10, 0xAA, 0x00, 0x21, 0xBB, 0xCC])
+        one_byte += b"\x00" * (-len(one_byte) % 4)
+        data = bytes([0xB2, 0x6F, 0, 1]) + bytes(8)
+        data += (1).to_bytes(4, "big") + (2).to_bytes(4, "big")
+        data += bytes([0xBE, 0xDE, 0, len(one_byte) // 4]) + one_byte
+        data += b"abc" + bytes([0, 0, 3])
+        packet = aio.RtpPacket.parse(data)
+        self.assertEqual(packet.csrc, [1, 2])
+        self.assertEqual(packet.extensions, [(1, b"\xaa"), (2, b"\xbb\xcc")])
+        self.assertEqual(bytes(packet.payload), b"abc")
+        self.assertEqual(packet.padding_size, 3)
+
+        two_byte = bytes([0x10, 0x00, 0x03, 0x02, 0x01, 0x02])
+        two_byte += b"\x00" * (-len(two_byte) % 4)
+        data = bytes([0x90, 0x6F, 0, 1]) + bytes(8)
+        data += bytes([0x10, 0x00, 0, len(two_byte) // 4]) + two_byte + b"x"
+        packet = aio.RtpPacket.parse(data)
+        self.assertEqual(packet.extensions, [(0x10, b""), (3, b"\x01\x02")])
+        self.assertEqual(bytes(packet.payload), b"x")
+
+    def test_rtp_invalid(self):
+        for data in (b"\x80" * 11, b"\x40" + bytes(11), b"\x81" + bytes(11),
+                     b"\xa0" + bytes(10) + b"\x00"):
+            with self.assertRaises(ValueError):
+                aio.RtpPacket.parse(data)
+
+    def test_pool(self):
+        import socket
+        pool = aio.RtpPacketPool(count=2)
+        a, b = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        with a, b:
+            rtp = bytes([0x80, 96]) + bytes(10) + b"media"
+            rtcp = load("rtcp_rr.bin")
+            self.assertFalse(aio.is_rtcp(rtp))
+            self.assertTrue(aio.is_rtcp(rtcp))
+            for i in range(4):
+                a.send(rtp)
+                packet = pool.recv(b)
+                self.assertEqual(bytes(packet.payload), b"media")
+                packet.release()
+            self.assertEqual(pool.allocated, 2)
+            self.assertEqual(len(pool), 2)
+
+            a.send(b"short")
+            with self.assertRaises(ValueError):
+                pool.recv(b)
+            self.assertEqual(len(pool), 2)
+
+            packet = pool.acquire()
+            packet.release()
+            with self.assertRaises(ValueError):
+                packet.release()
+            self.assertIsNot(pool.acquire(), pool.acquire())
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
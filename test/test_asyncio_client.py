@@ -0,0 +1,91 @@
+import unittest
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
+
+import asyncio_client
+import asyncio_server
+
+
+async def hang_up_after_ready(reader, writer):
+    """a server that takes the handshake and closes on the first echo request"""
+    writer.write(b"HELLO\n")
+    await reader.readline()
+    writer.write(b"READY\n")
+    await reader.readline()
+    writer.close()
+
+
+class BatchReverser:
+    """waits for a full window of requests, checks that no more come
+    without credit, then answers the window in reverse order"""
+
+    def __init__(self, window):
+        self.window = window
+        self.windows = []  # requests seen before each batch of replies
+        self.overrun = False
+
+    async def __call__(self, reader, writer):
+        writer.write(b"HELLO\n")
+        await reader.readline()
+        writer.write(b"READY\n")
+        sequence = 0
+        while True:
+            batch = []
+            while len(batch) < self.window:
+                line = await reader.readline()
+                if not line or line == b"BYE\n":
+                    writer.write(b"BYE\n" if line else b"")
+                    writer.close()
+                    return
+                sequence += 1
+                batch.append(b"ECHO %d: %s" % (sequence, line))
+            try:
+                await asyncio.wait_for(reader.readline(), 0.05)
+                self.overrun = True
+            except asyncio.TimeoutError:
+                pass
+            self.windows.append(len(batch))
+            writer.writelines(reversed(batch))
+
+
+class PipelineClientTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_pipelined(self):
+        echo_server = asyncio_server.EchoServer()
+        server = await asyncio.start_server(echo_server.accept_client, "localhost", 0)
+        try:
+            port = server.sockets[0].getsockname()[1]
+            latencies = await asyncio.wait_for(asyncio_client.pipeline_client("localhost", port, 500, 16), 5)
+        finally:
+            server.close()
+        self.assertEqual(len(latencies), 500)
+
+    async def test_window_and_reordered_replies(self):
+        reverser = BatchReverser(4)
+        server = await asyncio.start_server(reverser, "localhost", 0)
+        try:
+            port = server.sockets[0].getsockname()[1]
+            latencies = await asyncio.wait_for(asyncio_client.pipeline_client("localhost", port, 12, 4), 5)
+        finally:
+            server.close()
+        self.assertEqual(len(latencies), 12)
+        self.assertEqual(reverser.windows, [4, 4, 4])
+        self.assertFalse(reverser.overrun)
+
+    async def test_server_hangs_up(self):
+        server = await asyncio.start_server(hang_up_after_ready, "localhost", 0)
+        try:
+            port = server.sockets[0].getsockname()[1]
+            with self.assertRaises(ConnectionError):
+                await asyncio.wait_for(asyncio_client.pipeline_client("localhost", port, 500, 4), 2)
+            # no replies at all, still a report line
+            await asyncio.wait_for(asyncio_client.run_pipelined("localhost", port, 2, 100, [4]), 2)
+        finally:
+            server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
+
+import asyncio_server
+
+
+async def session(port, lines):
+    reader, writer = await asyncio.open_connection("localhost", port)
+    replies = [await reader.readline()]
+    for line in lines:
+        writer.write(line)
+        replies.append(await reader.readline())
+    writer.close()
+    return replies
+
+
+class EchoServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.echo_server = asyncio_server.EchoServer(idle_timeout=0.2)
+        self.server = await asyncio.start_server(self.echo_server.accept_client, "localhost", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+
+    async def test_protocol(self):
+        replies = await session(self.port, [b"WORLD\n", b"one\n", b"bye now\n", b"bye\n"])
+        self.assertEqual(replies, [b"HELLO\n", b"READY\n", b"ECHO 1: one\n", b"ECHO 2: bye now\n", b"BYE\n"])
+
+    async def test_pipelined_batch(self):
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        lines = b"".join(b"line %d\n" % i for i in range(1000))
+        writer.write(b"WORLD\n" + lines + b"BYE\n")
+        replies = (await reader.read()).splitlines()
+        self.assertEqual(replies[:3], [b"HELLO", b"READY", b"ECHO 1: line 0"])
+        self.assertEqual(replies[-2:], [b"ECHO 1000: line 999", b"BYE"])
+        writer.close()
+
+    async def test_idle_timeout(self):
+        reader, writer = await asyncio.open_connection("localhost", self.port)
+        self.assertEqual(await reader.readline(), b"HELLO\n")
+        self.assertEqual(await asyncio.wait_for(reader.read(), 2), b"")
+        writer.close()
+
+    async def test_shutdown_says_bye_to_idle_sessions(self):
+        self.echo_server = asyncio_server.EchoServer(idle_timeout=10, drain_timeout=2)
+        server = await asyncio.start_server(self.echo_server.accept_client, "localhost", 0)
+        reader, writer = await asyncio.open_connection("localhost", server.sockets[0].getsockname()[1])
+        writer.write(b"WORLD\none\n")
+        self.assertEqual([await reader.readline() for i in range(3)], [b"HELLO\n", b"READY\n", b"ECHO 1: one\n"])
+        start = asyncio.get_running_loop().time()
+        await self.echo_server.shutdown(server)
+        self.assertLess(asyncio.get_running_loop().time() - start, 1)
+        self.assertEqual(await asyncio.wait_for(reader.read(), 2), b"BYE\n")
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
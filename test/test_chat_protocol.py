@@ -0,0 +1,32 @@
+import unittest
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
+
+import chat_protocol
+
+
+class FrameReaderTest(unittest.TestCase):
+
+    def test_split_and_coalesced_frames(self):
+        messages = [{"user": "a", "text": "hi"}, {"user": "b", "text": "x" * 100000}, {"user": "c", "text": ""}]
+        data = b"".join(chat_protocol.encode(m) for m in messages)
+        reader = chat_protocol.FrameReader(size=16)
+        frames = []
+        for i in range(0, len(data), 999):
+            reader.feed(data[i:i + 999])
+            frames += reader.frames()
+        self.assertEqual([json.loads(f) for f in frames], messages)
+        self.assertEqual(reader.frames(), [])
+
+    def test_oversized_frame(self):
+        reader = chat_protocol.FrameReader(max_size=10)
+        reader.feed(chat_protocol.encode({"text": "too long"}))
+        with self.assertRaises(chat_protocol.FrameError):
+            reader.frames()
+
+
+if __name__ == '__main__':
+    unittest.main()
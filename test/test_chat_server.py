@@ -0,0 +1,267 @@
+import unittest
+import asyncio
+import itertools
+import json
+import os
+import selectors
+import socket
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
+
+import asyncio_chat_server
+import chat_protocol
+import chat_server
+
+# payloads both servers answer with an invalid message notice, and stay connected
+MALFORMED = [
+    b"not json",
+    b"\xff",
+    b"[]",
+    b'"join"',
+    b'{"user": "a"}',
+    b'{"user": "a", "text": "hi", "room": []}',
+    b'{"user": "a", "text": "hi", "room": {"x": 1}}',
+]
+VALID = {"user": "a", "text": "hi", "room": "lobby"}
+
+
+class ShortWrites:
+    """a connection whose sendmsg takes at most the next of ``limits`` bytes"""
+
+    def __init__(self, sock, limits):
+        self._sock = sock
+        self._limits = itertools.cycle(limits)
+        self.sent = bytearray()
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+    def sendmsg(self, buffers):
+        data = b"".join(buffers)[:next(self._limits)]
+        self.sent += data
+        return len(data)
+
+
+class ChatServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = chat_server.ChatServer(host="localhost", port=0)
+        self.addCleanup(self.server._selector.close)
+
+    def connect(self, server=None):
+        conn, client = socket.socketpair()
+        self.addCleanup(conn.close)
+        self.addCleanup(client.close)
+        (server or self.server)._add_connection(conn)
+        client.setblocking(False)
+        return conn, client
+
+    def received(self, conn, client, server=None):
+        """every frame queued for ``conn``, as the client decodes it"""
+        (server or self.server)._write_pending_messages(conn)
+        reader = chat_protocol.FrameReader()
+        try:
+            while reader.recv_from(client):
+                pass
+        except BlockingIOError:
+            pass
+        return [json.loads(frame) for frame in reader.frames()]
+
+    def test_partial_writes(self):
+        conn, client = socket.socketpair()
+        self.addCleanup(conn.close)
+        self.addCleanup(client.close)
+        conn = ShortWrites(conn, [7, 1, 300, 50, 100000])
+        self.server._add_connection(conn)
+        frames = [chat_protocol.encode({"user": "a", "text": "x" * n}) for n in (10, 200, 0, 33, 500, 1)]
+        frames += [chat_protocol.encode({"user": "b", "text": str(i)}) for i in range(150)]
+        for frame in frames:
+            self.server._send(conn, frame)
+        messages = self.server._connections_msg_queue[conn]
+        stats = self.server._queue_stats[conn]
+        while messages:
+            self.server._write_pending_messages(conn)
+            # a frame counts until its last byte is sent
+            self.assertEqual(stats.queued_bytes, sum(map(len, messages)))
+        self.assertEqual(bytes(conn.sent), b"".join(frames))
+        self.assertEqual((stats.queued_bytes, self.server._sent_offsets[conn]), (0, 0))
+
+    def test_malformed_messages(self):
+        conn, client = self.connect()
+        for payload in MALFORMED + [json.dumps(VALID).encode()]:
+            self.server._add_message(conn, payload)
+        replies = self.received(conn, client)
+        self.assertEqual([reply["user"] for reply in replies[:-1]], ["server"] * len(MALFORMED))
+        self.assertTrue(all(reply["text"].startswith("invalid message: ") for reply in replies[:-1]))
+        self.assertEqual(replies[-1], VALID)
+
+    def message(self, conn, payload):
+        self.server._add_message(conn, json.dumps(payload).encode())
+
+    def test_join_leave(self):
+        a, a_client = self.connect()
+        b, b_client = self.connect()
+        self.message(b, {"join": "dev"})
+        self.message(b, {"leave": "lobby"})
+        self.message(a, {"user": "a", "text": "to the lobby"})
+        self.message(a, {"user": "a", "text": "not a member", "room": "dev"})
+        self.message(a, {"join": "dev"})
+        self.message(a, {"user": "a", "text": "to dev", "room": "dev"})
+        self.assertEqual([reply["text"] for reply in self.received(a, a_client)], ["to the lobby", "to dev"])
+        self.assertEqual(self.received(b, b_client), [{"user": "a", "text": "to dev", "room": "dev"}])
+        self.assertEqual(self.server._rooms, {"lobby": {a}, "dev": {a, b}})
+
+        # an empty room is forgotten, so is everything of a closed connection
+        self.message(a, {"leave": "dev"})
+        self.server._remove_connection(b)
+        self.assertEqual(self.server._rooms, {"lobby": {a}})
+        self.assertNotIn(b, self.server._memberships)
+
+    def test_invalid_room(self):
+        conn, client = self.connect()
+        self.server._add_message(conn, json.dumps({"user": "a", "text": "hi", "room": []}).encode())
+        replies = self.received(conn, client)
+        self.assertEqual(len(replies), 1)
+        self.assertEqual(replies[0]["user"], "server")
+        self.assertIn("room must be a string", replies[0]["text"])
+        self.assertIn(conn, self.server._connections_msg_queue)
+
+    def server_with_policy(self, policy):
+        self.server = chat_server.ChatServer(host="localhost", port=0, high_watermark=200,
+                                             low_watermark=100, policy=policy)
+        self.addCleanup(self.server._selector.close)
+
+    def test_oversized_frame(self):
+        # larger than the high watermark, still taken by an empty queue
+        big = chat_protocol.encode({"user": "a", "text": "x" * 300, "room": "lobby"})
+        for policy in chat_server.OVERFLOW_POLICIES:
+            self.server_with_policy(policy)
+            conn, client = self.connect()
+            self.server._broadcast("lobby", big)
+            self.assertIn(conn, self.server._connections_msg_queue)
+            self.assertEqual([reply["text"] for reply in self.received(conn, client)], ["x" * 300])
+
+    def test_coalesce_behind_oversized_frame(self):
+        self.server_with_policy("coalesce")
+        conn, client = self.connect()
+        big = chat_protocol.encode({"user": "a", "text": "x" * 300, "room": "lobby"})
+        small = chat_protocol.encode({"user": "a", "text": "hi", "room": "lobby"})
+        self.server._broadcast("lobby", big)
+        self.server._broadcast("lobby", small)
+        replies = self.received(conn, client)
+        self.assertEqual([reply["text"] for reply in replies],
+                         ["x" * 300, "1 messages skipped, you are lagging behind"])
+        self.assertEqual(self.server._queue_stats[conn].skipped, 0)
+        self.server._broadcast("lobby", small)
+        self.assertEqual([reply["text"] for reply in self.received(conn, client)], ["hi"])
+
+    def test_evicted_in_the_same_batch(self):
+        # A's message disconnects the slow B, whose own read event is next in the batch
+        self.server_with_policy("disconnect")
+        a, a_client = self.connect()
+        b, b_client = self.connect()
+        self.server._send(b, chat_protocol.encode({"user": "b", "text": "y" * 120, "room": "lobby"}))
+        a_client.sendall(chat_protocol.encode({"user": "a", "text": "z" * 60}))
+        b_client.sendall(chat_protocol.encode({"user": "b", "text": "hi"}))
+        self.server._read(a, selectors.EVENT_READ)
+        self.assertNotIn(b, self.server._connections_msg_queue)
+        self.server._read_write(b, selectors.EVENT_READ | selectors.EVENT_WRITE)
+        self.server._read(b, selectors.EVENT_READ)
+        self.assertEqual([reply["text"] for reply in self.received(a, a_client)], ["z" * 60])
+
+    def test_bus_delivery(self):
+        # two workers, each publishes on the other's bus
+        other = chat_server.ChatServer(host="localhost", port=0, high_watermark=200,
+                                       low_watermark=100, policy="disconnect")
+        self.addCleanup(other._selector.close)
+        inbox, outbox = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        other_inbox, other_outbox = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        for sock in (inbox, outbox, other_inbox, other_outbox):
+            self.addCleanup(sock.close)
+        self.server._open_bus(inbox, [other_outbox])
+        other._open_bus(other_inbox, [outbox])
+        a, a_client = self.connect()
+        b, b_client = self.connect(other)
+        c, c_client = self.connect(other)
+        other._add_message(c, json.dumps({"join": "dev"}).encode())
+
+        self.message(a, {"user": "a", "text": "hi"})
+        self.message(a, {"join": "dev"})
+        self.message(a, {"user": "a", "text": "dev only", "room": "dev"})
+        other._read_bus(other_inbox, selectors.EVENT_READ)
+        self.assertEqual([reply["text"] for reply in self.received(b, b_client, other)], ["hi"])
+        self.assertEqual([reply["text"] for reply in self.received(c, c_client, other)], ["hi", "dev only"])
+
+        # a bus message disconnects the slow b, whose own read event is next in the batch
+        other._send(b, chat_protocol.encode({"user": "x", "text": "y" * 150, "room": "lobby"}))
+        b_client.sendall(chat_protocol.encode({"user": "b", "text": "hi"}))
+        self.message(a, {"user": "a", "text": "z" * 60})
+        other._read_bus(other_inbox, selectors.EVENT_READ)
+        self.assertNotIn(b, other._connections_msg_queue)
+        other._read_write(b, selectors.EVENT_READ | selectors.EVENT_WRITE)
+        self.assertEqual([reply["text"] for reply in self.received(c, c_client, other)], ["z" * 60])
+
+    def test_bus_backlog(self):
+        inbox, bus = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        peer_inbox, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        for sock in (inbox, bus, peer_inbox, peer):
+            self.addCleanup(sock.close)
+        peer.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 64 * 1024)
+        self.server._open_bus(bus, [peer])
+        conn, client = self.connect()
+
+        # the other worker does not read, failed sends wait for the bus
+        for i in range(2000):
+            self.server._add_message(conn, json.dumps({"user": "a", "text": str(i)}).encode())
+        self.assertGreater(self.server.bus_stats()["pending"], 0)
+        texts = []
+        peer_inbox.setblocking(False)
+        while len(texts) < 2000:
+            try:
+                datagram = peer_inbox.recv(chat_server.BUS_BUFFER_SIZE)
+            except BlockingIOError:
+                self.server._flush_bus(peer, 0)
+                continue
+            room_end = chat_server.BUS_HEADER.size + chat_server.BUS_HEADER.unpack_from(datagram)[0]
+            texts.append(json.loads(datagram[room_end + chat_protocol.HEADER.size:])["text"])
+        self.assertEqual(texts, [str(i) for i in range(2000)])
+        self.assertEqual(self.server.bus_stats(), {"pending": 0, "pending_bytes": 0, "dropped": 0})
+
+        # above the datagram limit the sender gets a notice, nobody gets the message
+        self.received(conn, client)
+        text = "x" * self.server._bus_limit
+        self.server._add_message(conn, json.dumps({"user": "a", "text": text}).encode())
+        replies = self.received(conn, client)
+        self.assertEqual([reply["user"] for reply in replies], ["server"])
+        self.assertIn("too large", replies[0]["text"])
+
+
+class AsyncioChatServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_malformed_messages(self):
+        chat = asyncio_chat_server.ChatServer(host="localhost", port=0)
+        server = await asyncio.get_running_loop().create_server(
+            lambda: asyncio_chat_server.ChatProtocol(chat), "localhost", 0)
+        reader, writer = await asyncio.open_connection("localhost", server.sockets[0].getsockname()[1])
+        try:
+            for payload in MALFORMED + [json.dumps(VALID).encode()]:
+                writer.write(chat_protocol.HEADER.pack(len(payload)) + payload)
+            frames = chat_protocol.FrameReader()
+            replies = []
+            while len(replies) <= len(MALFORMED):
+                data = await asyncio.wait_for(reader.read(65536), 5)
+                if not data:
+                    break  # the server hung up
+                frames.feed(data)
+                replies += [json.loads(frame) for frame in frames.frames()]
+        finally:
+            writer.close()
+            server.close()
+        self.assertEqual([reply["user"] for reply in replies[:-1]], ["server"] * len(MALFORMED))
+        self.assertTrue(all(reply["text"].startswith("invalid message: ") for reply in replies[:-1]))
+        self.assertEqual(replies[-1], VALID)
+
+
+if __name__ == '__main__':
+    unittest.main()
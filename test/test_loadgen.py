@@ -0,0 +1,85 @@
+import unittest
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
+
+import asyncio_chat_server
+import asyncio_server
+import loadgen
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_percentiles_within_precision(self):
+        values = [int(random.lognormvariate(8, 2)) for i in range(20000)]
+        histogram = loadgen.LatencyHistogram(precision=7)
+        for value in values:
+            histogram.record(value)
+        values.sort()
+        for percent in (50, 90, 99, 99.9):
+            exact = values[max(0, math.ceil(len(values) * percent / 100) - 1)]
+            self.assertGreaterEqual(histogram.percentile(percent), exact)
+            self.assertLessEqual(histogram.percentile(percent), exact * (1 + 2 ** -6) + 1)
+        self.assertEqual((histogram.min, histogram.max), (values[0], values[-1]))
+
+    def test_merge(self):
+        a, b, both = (loadgen.LatencyHistogram() for i in range(3))
+        for value in range(0, 100000, 7):
+            (a if value % 2 else b).record(value)
+            both.record(value)
+        a.merge(b)
+        self.assertEqual(a.summary(), both.summary())
+
+
+class LoadClientTest(unittest.TestCase):
+
+    def test_abstract(self):
+        class Incomplete(loadgen.LoadClient):
+            def message(self, scheduled):
+                return b""
+
+        with self.assertRaises(TypeError):
+            Incomplete(None, 0, None)
+
+
+class GenerateTest(unittest.IsolatedAsyncioTestCase):
+
+    async def generate(self, mode, port):
+        args = argparse.Namespace(mode=mode, host="localhost", port=port, clients=6, rate=50, size=10,
+                                  room_size=3, warmup=0.1, duration=0.3, drain=5)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        report = await loadgen.generate(args)
+        # done once every reply is in, not after the -drain upper bound
+        self.assertLess(loop.time() - start, 2)
+        return report
+
+    async def test_chat(self):
+        chat = asyncio_chat_server.ChatServer(host="localhost", port=0)
+        server = await asyncio.get_running_loop().create_server(
+            lambda: asyncio_chat_server.ChatProtocol(chat), "localhost", 0)
+        try:
+            report = await self.generate("chat", server.sockets[0].getsockname()[1])
+        finally:
+            server.close()
+        self.assertGreater(report["sent"], 0)
+        self.assertEqual(report["received"], report["sent"] * 3)
+        self.assertEqual(report["errors"], {"lost": 0})
+
+    async def test_echo(self):
+        server = await asyncio.start_server(asyncio_server.EchoServer().accept_client, "localhost", 0)
+        try:
+            report = await self.generate("echo", server.sockets[0].getsockname()[1])
+        finally:
+            server.close()
+        self.assertEqual(report["received"], report["sent"])
+        self.assertEqual(report["errors"], {"lost": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import unittest
+import os
+import selectors
+import socket
+import ssl
+import sys
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example")
+sys.path.append(EXAMPLE_DIR)
+
+import reactor_with_transport as rt
+
+
+class Collector(rt.Protocol):
+
+    def __init__(self, payload=None):
+        self.payload = payload
+        self.received = bytearray()
+        self.lost = False
+
+    def make_connection(self, transport):
+        if self.payload is not None:
+            transport.write(self.payload)
+            # whatever the socket did not take must have been copied
+            self.payload[:] = bytes(len(self.payload))
+            transport.lose_connection()  # only once everything is sent
+
+    def data_received(self, data):
+        self.received += data
+
+    def connection_lost(self, exception_or_none):
+        self.lost = True
+
+
+class LossyEcho(rt.MediaEcho):
+    """does not answer probes whose number ends in 7"""
+
+    def datagram_received(self, data, address):
+        if not bytes(data).endswith(b"7"):
+            super().datagram_received(data, address)
+
+
+class ReactorTest(unittest.TestCase):
+
+    def test_timers(self):
+        reactor = rt.Reactor()
+        calls = []
+        now = reactor.time()
+        reactor.call_at(now + 0.02, calls.append, "at")
+        reactor.call_later(0.01, calls.append, "later")
+        reactor.call_later(0.01, calls.append, "later again")
+        reactor.cancel(reactor.call_later(0, calls.append, "cancelled"))
+        reactor.run()  # returns once nothing is registered or scheduled
+        self.assertEqual(calls, ["later", "later again", "at"])
+
+    def test_timer_handle_cancel(self):
+        reactor = rt.Reactor()
+        calls = []
+        timer = reactor.call_later(0, calls.append, "cancelled")
+        timer.cancel()
+        timer.cancel()
+        reactor.cancel(timer)
+        self.assertEqual(reactor._cancelled, 1)
+        reactor.run()
+        self.assertEqual((calls, reactor._cancelled), ([], 0))
+
+    def test_timers_added_while_running(self):
+        reactor = rt.Reactor()
+        calls = []
+
+        def again(n):
+            calls.append(n)
+            if n < 3:
+                reactor.call_later(0, again, n + 1)
+
+        reactor.call_later(0, again, 1)
+        reactor._run_timers()
+        self.assertEqual(calls, [1])  # the timer it added waits for the next pass
+        reactor._run_timers()
+        self.assertEqual(calls, [1, 2])
+        reactor.run()
+        self.assertEqual(calls, [1, 2, 3])
+
+    def test_ping_pong(self):
+        for selector in (selectors.DefaultSelector(), selectors.SelectSelector()):
+            reactor = rt.Reactor(selector)
+            left, right = socket.socketpair()
+            client = rt.PingPongProtocol("client", maximum=10)
+            server = rt.PingPongProtocol("server")
+            rt.Transport(reactor, left, client).activate()
+            rt.Transport(reactor, right, server).activate()
+            reactor.run()
+            self.assertGreaterEqual(client._received, 10)
+            self.assertEqual((left.fileno(), right.fileno()), (-1, -1))
+
+    def test_stream(self):
+        reactor = rt.Reactor()
+        left, right = socket.socketpair()
+        payload = bytearray(os.urandom(4 * 1024 * 1024))
+        expected = bytes(payload)
+        sender, receiver = Collector(payload), Collector()
+        rt.Transport(reactor, left, sender).activate()
+        rt.Transport(reactor, right, receiver).activate()
+        reactor.run()
+        self.assertEqual(bytes(receiver.received), expected)
+        self.assertTrue(sender.lost and receiver.lost)
+
+    def test_tls_stream(self):
+        server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_context.load_cert_chain(os.path.join(EXAMPLE_DIR, "localhost.pem"))
+        client_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH,
+                                                    cafile=os.path.join(EXAMPLE_DIR, "ca.crt"))
+        reactor = rt.Reactor()
+        left, right = socket.socketpair()
+        payload = bytearray(os.urandom(1024 * 1024))
+        expected = bytes(payload)
+        sender, receiver = Collector(payload), Collector()
+        rt.TLSTransport(reactor, left, sender, client_context, server_hostname="localhost").activate()
+        rt.TLSTransport(reactor, right, receiver, server_context, server_side=True).activate()
+        reactor.run()
+        self.assertEqual(bytes(receiver.received), expected)
+        self.assertTrue(sender.lost and receiver.lost)
+
+    def test_datagram_echo(self):
+        reactor = rt.Reactor()
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client.connect(server.getsockname())
+        echo = rt.DatagramTransport(reactor, server, rt.MediaEcho())
+        echo.activate()
+        probe = rt.MediaProbe(reactor, 100, echo.lose_connection)
+        rt.DatagramTransport(reactor, client, probe).activate()
+        reactor.run()
+        self.assertEqual(probe.received, 100)
+        self.assertEqual((server.fileno(), client.fileno()), (-1, -1))
+
+    def test_datagram_loss(self):
+        reactor = rt.Reactor()
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client.connect(server.getsockname())
+        echo = rt.DatagramTransport(reactor, server, LossyEcho())
+        echo.activate()
+        # a datagram too large for UDP is dropped, the socket stays usable
+        echo.write(bytes(70000), client.getsockname())
+        self.assertEqual(echo.dropped, 1)
+        probe = rt.MediaProbe(reactor, 100, echo.lose_connection, window=8, timeout=0.1)
+        rt.DatagramTransport(reactor, client, probe).activate()
+        reactor.run()  # gives up on the lost ones instead of waiting forever
+        self.assertEqual(probe.sent, 100)
+        self.assertEqual(probe.received, 90)
+        self.assertEqual((server.fileno(), client.fileno()), (-1, -1))
+
+    def test_signalling_out_of_order(self):
+        reactor = rt.Reactor()
+        left, right = socket.socketpair()
+        self.addCleanup(right.close)
+        right.sendall(b"BYE\n")
+        rt.Transport(reactor, left, rt.SignallingProtocol("server", reactor)).activate()
+        reactor.run()
+        self.assertEqual(left.fileno(), -1)
+
+        left, right = socket.socketpair()
+        self.addCleanup(right.close)
+        right.sendall(b"OK nope\nOK 70000\n")
+        right.shutdown(socket.SHUT_WR)
+        rt.Transport(reactor, left, rt.SignallingProtocol("client", reactor, probes=5)).activate()
+        reactor.run()
+        self.assertEqual(right.recv(100), b"INVITE\nBYE\nBYE\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import collections
+import os
+import struct
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
+
+import aiortc_rtcp_packet as aio
+import rtcp_pcap
+
+
+def load(name: str) -> bytes:
+    path = os.path.join(os.path.dirname(__file__), name)
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+def ethernet_udp(payload: bytes, sport=5005, dport=6005, vlan=False) -> bytes:
+    udp = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0,
+                     bytes([10, 0, 0, 1]), bytes([10, 0, 0, 2])) + udp
+    eth = b"\x00" * 12
+    if vlan:
+        eth += struct.pack("!HH", 0x8100, 7)
+    return eth + struct.pack("!H", 0x0800) + ip
+
+
+def pcap(frames) -> bytes:
+    data = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+    for i, frame in enumerate(frames):
+        data += struct.pack("<IIII", 1000 + i, 500000, len(frame), len(frame)) + frame
+    return data
+
+
+def block(block_type, body):
+    body += b"\x00" * (-len(body) % 4)
+    length = 12 + len(body)
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+def pcapng(frames) -> bytes:
+    data = block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    # interface with if_tsresol = 10^-3
+    data += block(1, struct.pack("<HHI", 1, 0, 65535) + struct.pack("<HHB3x", 9, 1, 3) + b"\x00" * 4)
+    for i, frame in enumerate(frames):
+        ts = 1000000 + i
+        data += block(6, struct.pack("<IIIII", 0, ts >> 32, ts & 0xFFFFFFFF, len(frame), len(frame)) + frame)
+    return data
+
+
+class RtcpPcapTest(unittest.TestCase):
+    def setUp(self):
+        self.rtcp = load("rtcp_rr.bin")
+        self.bye = bytes(aio.RtcpByePacket(sources=[1]))
+        rtp = bytes([0x80, 96]) + b"\x00" * 10
+        self.frames = [
+            ethernet_udp(self.rtcp),
+            ethernet_udp(rtp),
+            ethernet_udp(self.bye, sport=7000, dport=7001, vlan=True),
+        ]
+
+    def write(self, data: bytes) -> str:
+        fd, path = tempfile.mkstemp(suffix=".pcap")
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        self.addCleanup(os.unlink, path)
+        return path
+
+    def test_pcap(self):
+        captures = list(rtcp_pcap.iter_rtcp(self.write(pcap(self.frames))))
+        self.assertEqual(len(captures), 2)
+        self.assertEqual(captures[0].timestamp, 1000.5)
+        self.assertEqual(captures[0].src, ("10.0.0.1", 5005))
+        self.assertEqual(captures[0].dst, ("10.0.0.2", 6005))
+        self.assertEqual(captures[0].packets, aio.RtcpPacket.parse(self.rtcp))
+        self.assertEqual(captures[1].packets, aio.RtcpPacket.parse(self.bye))
+
+    def test_pcapng(self):
+        path = self.write(pcapng(self.frames))
+        captures = list(rtcp_pcap.iter_rtcp(path, ports={7001}))
+        self.assertEqual(len(captures), 1)
+        self.assertAlmostEqual(captures[0].timestamp, 1000.002)
+        self.assertEqual(captures[0].packets, aio.RtcpPacket.parse(self.bye))
+
+    def test_pcapng_invalid_epb(self):
+        header = pcapng([])
+        frame = self.frames[0]
+        # captured length beyond the block end is clamped to the block
+        data = header + block(6, struct.pack("<IIIII", 0, 0, 0, 1 << 20, len(frame)) + frame)
+        records = list(rtcp_pcap.iter_frames(data, *rtcp_pcap.open_capture(data)))
+        self.assertEqual(len(records), 1)
+        next_pos, timestamp, linktype, start, stop = records[0]
+        self.assertEqual(stop, next_pos - 4)
+        self.assertEqual(bytes(data[start:start + len(frame)]), frame)
+        # an interface that was never described
+        data = header + block(6, struct.pack("<IIIII", 1, 0, 0, len(frame), len(frame)) + frame)
+        with self.assertRaises(ValueError):
+            list(rtcp_pcap.iter_frames(data, *rtcp_pcap.open_capture(data)))
+
+    def test_split(self):
+        for data in (pcap(self.frames * 10), pcapng(self.frames * 10)):
+            path = self.write(data)
+            chunks = rtcp_pcap.split_capture(path, 4)
+            self.assertEqual(len(chunks), 4)
+            summary = collections.Counter()
+            for fmt, start, end in chunks:
+                summary.update(rtcp_pcap._summarize_chunk((path, fmt, start, end, None)))
+            expected = rtcp_pcap.summarize(rtcp_pcap.iter_rtcp(path), collections.Counter())
+            self.assertEqual(summary, expected)
+            self.assertEqual(summary["RtcpRrPacket"], 10)
+            self.assertEqual(summary["RtcpByePacket"], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
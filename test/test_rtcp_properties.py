@@ -0,0 +1,114 @@
+"""
+Property-based round-trip tests for the RTCP codec in src/lib/rtcp
+"""
+import os
+import sys
+
+import pytest
+
+hypothesis = pytest.importorskip("hypothesis")
+from hypothesis import given, strategies as st
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.lib import rtcp
+
+uint8 = st.integers(0, 0xFF)
+uint32 = st.integers(0, 0xFFFFFFFF)
+ssrcs = st.lists(uint32, max_size=31)
+
+receiver_infos = st.builds(
+    rtcp.RtcpReceiverInfo,
+    ssrc=uint32,
+    fraction_lost=uint8,
+    packets_lost=st.integers(rtcp.PACKETS_LOST_MIN, rtcp.PACKETS_LOST_MAX),
+    highest_sequence=uint32,
+    jitter=uint32,
+    lsr=uint32,
+    dlsr=uint32,
+)
+reports = st.lists(receiver_infos, max_size=31)
+
+rr_packets = st.builds(rtcp.RtcpRrPacket, ssrc=uint32, reports=reports)
+sr_packets = st.builds(
+    rtcp.RtcpSrPacket,
+    ssrc=uint32,
+    sender_info=st.builds(
+        rtcp.RtcpSenderInfo,
+        ntp_timestamp=st.integers(0, 0xFFFFFFFFFFFFFFFF),
+        rtp_timestamp=uint32,
+        packet_count=uint32,
+        octet_count=uint32,
+    ),
+    reports=reports,
+)
+sdes_packets = st.builds(
+    rtcp.RtcpSdesPacket,
+    chunks=st.lists(
+        st.builds(
+            rtcp.RtcpSourceInfo,
+            ssrc=uint32,
+            items=st.lists(st.tuples(st.integers(1, 255), st.binary(max_size=255)), max_size=4),
+        ),
+        max_size=31,
+    ),
+)
+bye_packets = st.builds(rtcp.RtcpByePacket, sources=ssrcs, reason=st.binary(max_size=255))
+nack_packets = st.builds(
+    rtcp.RtcpRtpfbPacket,
+    fmt=st.just(rtcp.RTCP_RTPFB_NACK),
+    ssrc=uint32,
+    media_ssrc=uint32,
+    lost=st.lists(st.integers(0, 0xFFFF), unique=True, max_size=64).map(sorted),
+)
+word_aligned = st.binary(max_size=64).map(lambda b: b + b"\x00" * (-len(b) % 4))
+rtpfb_packets = st.builds(
+    rtcp.RtcpRtpfbPacket,
+    fmt=st.integers(2, 31),
+    ssrc=uint32,
+    media_ssrc=uint32,
+    fci=word_aligned,
+)
+psfb_packets = st.builds(
+    rtcp.RtcpPsfbPacket, fmt=st.integers(0, 31), ssrc=uint32, media_ssrc=uint32, fci=word_aligned
+)
+packets = st.one_of(
+    rr_packets, sr_packets, sdes_packets, bye_packets, nack_packets, rtpfb_packets, psfb_packets
+)
+
+
+@given(packets)
+def test_packet_round_trip(packet):
+    data = bytes(packet)
+    assert len(data) == packet.packed_size()
+    assert rtcp.RtcpPacket.parse(data) == [packet]
+
+
+@given(st.lists(packets, max_size=8))
+def test_compound_round_trip(compound):
+    builder = rtcp.RtcpCompoundBuilder(size=4)
+    builder.add(*compound)
+    data = bytes(builder)
+    assert data == b"".join(bytes(packet) for packet in compound)
+    assert rtcp.RtcpPacket.parse(data) == compound
+    assert rtcp.RtcpPacket.parse(data, lazy=True) == compound
+
+
+@given(st.lists(st.one_of(rr_packets, sr_packets, bye_packets), max_size=8))
+def test_report_blocks_match_scalar_path(compound):
+    np = pytest.importorskip("numpy")
+    data = b"".join(bytes(packet) for packet in compound)
+    expected = [r for p in compound if hasattr(p, "reports") for r in p.reports]
+    blocks = rtcp.RtcpPacket.parse_report_blocks(data)
+    assert [rtcp.RtcpReceiverInfo(*block) for block in blocks.tolist()] == expected
+
+
+@given(rr_packets, st.integers(0, 0xFFFF))
+def test_lazy_view_round_trip(packet, packets_lost):
+    data = bytes(packet)
+    view, = rtcp.RtcpPacket.parse(data, lazy=True)
+    assert bytes(view) == data
+    if view.reports:
+        view.reports[-1].packets_lost = -packets_lost
+        packet.reports[-1].packets_lost = -packets_lost
+        assert bytes(view) == bytes(packet)
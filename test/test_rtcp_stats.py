@@ -0,0 +1,63 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
+
+import aiortc_rtcp_packet as aio
+from rtcp_stats import RingBuffer, RtcpStatsTracker, ntp_middle32
+
+
+def rr(ssrc, packets_lost, highest_sequence, jitter, lsr=0, dlsr=0):
+    report = aio.RtcpReceiverInfo(
+        ssrc=ssrc, fraction_lost=0, packets_lost=packets_lost,
+        highest_sequence=highest_sequence, jitter=jitter, lsr=lsr, dlsr=dlsr)
+    return aio.RtcpRrPacket(ssrc=1, reports=[report])
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_window(self):
+        ring = RingBuffer(3, ordered=True)
+        for value in [5, 1, 9, 7]:
+            ring.append(value)
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(ring.total, 17)
+        self.assertEqual(ring.latest(), 7)
+        self.assertEqual(ring.percentile(0), 1)
+        self.assertEqual(ring.percentile(0.5), 7)
+        self.assertEqual(ring.percentile(1), 9)
+
+
+class RtcpStatsTrackerTest(unittest.TestCase):
+    def test_loss_and_jitter(self):
+        tracker = RtcpStatsTracker(window=4)
+        for i, (lost, jitter) in enumerate([(0, 10), (5, 30), (10, 20), (10, 40)]):
+            tracker.ingest([rr(42, lost, 1000 + 100 * i, jitter)], arrival_time=i)
+        self.assertIn(42, tracker)
+        self.assertAlmostEqual(tracker.loss_rate(42), 10 / 300)
+        self.assertEqual(tracker.jitter_percentile(42, 0.5), 30)
+        self.assertEqual(tracker.jitter_percentile(42, 0.99), 40)
+        self.assertIsNone(tracker.loss_rate(43))
+
+        self.assertEqual(tracker.expire(timeout=10, now=20), 1)
+        self.assertEqual(len(tracker), 0)
+
+    def test_rtt(self):
+        tracker = RtcpStatsTracker()
+        sent = 1600000000.0
+        lsr = ntp_middle32(sent)
+        dlsr = int(0.5 * 65536)
+        packets = aio.RtcpPacket.parse(bytes(rr(42, 0, 1, 0, lsr=lsr, dlsr=dlsr)))
+        tracker.ingest(packets, arrival_time=sent + 0.75)
+        self.assertAlmostEqual(tracker.rtt(42), 0.25, places=3)
+
+    def test_lsr_dlsr(self):
+        tracker = RtcpStatsTracker()
+        sr = aio.RtcpSrPacket(ssrc=7, sender_info=aio.RtcpSenderInfo(0x0123456789ABCDEF, 0, 0, 0))
+        tracker.ingest([sr], arrival_time=100.0)
+        self.assertEqual(tracker.lsr_dlsr(7, now=101.0), (0x456789AB, 65536))
+        self.assertEqual(tracker.lsr_dlsr(8), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
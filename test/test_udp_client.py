@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
+
+import udp_client
+import udp_server
+
+
+class ProbeStatsTest(unittest.TestCase):
+
+    def test_counters(self):
+        stats = udp_client.ProbeStats(5)
+        stats.sent = 5
+        stats.reply(0, 0, 1000000)
+        stats.reply(2, 0, 3000000)
+        stats.reply(1, 0, 2000000)  # overtaken by 2
+        stats.reply(1, 0, 2000000)
+        stats.expire(4)  # 3 has not come back
+        stats.reply(3, 0, 2000000)
+        stats.expire(5)
+        self.assertEqual((stats.received, stats.duplicates, stats.reordered), (4, 1, 1))
+        self.assertEqual((stats.lost, stats.late, stats.expired), (1, 1, 5))
+        self.assertEqual(stats.take_histogram().summary()["max"], 3000)
+
+    def test_jitter(self):
+        # RFC 3550: J += (|D| - J) / 16 for every pair of consecutive replies
+        stats = udp_client.ProbeStats(3)
+        stats.reply(0, 0, 1600)
+        stats.reply(1, 0, 3200)
+        self.assertEqual(stats.jitter, 100)
+        stats.reply(2, 0, 3200)
+        self.assertEqual(stats.jitter, 93.75)
+
+
+class ProbeTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_probe_responder(self):
+        transport, responder = await udp_server.start_responder("127.0.0.1", 0)
+        try:
+            port = transport.get_extra_info("sockname")[1]
+            stats, histogram = await udp_client.probe("127.0.0.1", port, 500, 5000, timeout=0.5, report=False)
+        finally:
+            transport.close()
+        self.assertEqual((stats.sent, stats.received, stats.lost, stats.duplicates), (500, 500, 0, 0))
+        self.assertEqual(histogram.count, 500)
+        self.assertEqual(responder.stats.replied, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import socket
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "example"))
+
+import udp_server
+
+
+class ProbeResponderTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.transport, self.responder = await udp_server.start_responder("127.0.0.1", 0, batch=8, max_size=64)
+        self.address = self.transport.get_extra_info("sockname")
+        self.client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.client.setblocking(False)
+
+    async def asyncTearDown(self):
+        self.client.close()
+        self.transport.close()
+
+    async def receive(self, count):
+        loop = asyncio.get_running_loop()
+        replies = []
+        while len(replies) < count:
+            replies.append(await asyncio.wait_for(loop.sock_recv(self.client, 2048), 5))
+        return replies
+
+    async def test_echo_burst(self):
+        # more than one batch is queued before the responder gets to run
+        probes = [b"probe %d" % i for i in range(50)]
+        for probe in probes:
+            self.client.sendto(probe, self.address)
+        self.assertEqual(sorted(await self.receive(len(probes))), sorted(probes))
+        stats = self.responder.stats
+        self.assertEqual((stats.received, stats.replied, stats.send_drops), (50, 50, 0))
+
+    async def test_truncated(self):
+        self.client.sendto(b"first", self.address)
+        self.client.sendto(b"x" * 100, self.address)
+        self.client.sendto(b"last", self.address)
+        self.assertEqual(await self.receive(2), [b"first", b"last"])
+        self.assertEqual(self.responder.stats.truncated, 1)
+
+    async def test_truncated_first(self):
+        # the oversized datagram is the one the transport reads
+        self.client.sendto(b"x" * 100, self.address)
+        await asyncio.sleep(0.05)
+        self.client.sendto(b"last", self.address)
+        self.assertEqual(await self.receive(1), [b"last"])
+        self.assertEqual(self.responder.stats.truncated, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()